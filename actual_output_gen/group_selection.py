@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import heapq
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+STRATA_FIELDS = ("difficulty", "skill", "mix")
+SCORES = ("uniform", "balance")
+
+
+def classify(single_data: Dict[str, Any]) -> bool:
+    """True if @Expected and @Actual of the record are the same (incorrect code passes)."""
+    expected_actual = single_data['input_expected_actual']
+    expected_actual = expected_actual.split('] @Expected =')[1]
+    expected, actual = expected_actual.split(' @Actual = ', 1)
+    expected = expected.strip()[1:-1].split(', ')
+    actual = actual.strip()[1:-1].split(', ')
+    return expected == actual
+
+
+def group_key(single_data: Dict[str, Any]) -> str:
+    return f"{single_data['pid']}_{single_data['code_index']}"
+
+
+def _skill(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return "|".join(sorted(str(v) for v in value)) or "none"
+    return str(value) if value not in (None, "") else "unknown"
+
+
+@dataclass
+class GroupStats:
+    """Compact per-(pid, code_index) summary kept during the first pass."""
+    passed: int = 0
+    failed: int = 0
+    difficulty: str = "unknown"
+    skill: str = "unknown"
+
+    def mix(self) -> str:
+        total = self.passed + self.failed
+        fail_ratio = self.failed / total if total else 0.0
+        if fail_ratio < 1 / 3:
+            return "mostly_pass"
+        if fail_ratio > 2 / 3:
+            return "mostly_fail"
+        return "balanced"
+
+    def score(self, kind: str) -> float:
+        if kind == "balance":
+            total = self.passed + self.failed
+            # 1.0 for one-sided groups, up to 2.0 for an even pass/fail split
+            return 1.0 + (2 * min(self.passed, self.failed) / total if total else 0.0)
+        return 1.0
+
+
+def collect_group_stats(records: Iterable[Dict[str, Any]], default_difficulty: str = "unknown"
+                        ) -> Tuple[Dict[str, GroupStats], int]:
+    """First pass: pass/fail counts and strata labels per group, without keeping records."""
+    stats: Dict[str, GroupStats] = {}
+    n_records = 0
+    for single_data in records:
+        n_records += 1
+        key = group_key(single_data)
+        entry = stats.get(key)
+        if entry is None:
+            entry = stats[key] = GroupStats(
+                difficulty=str(single_data.get('difficulty') or default_difficulty),
+                skill=_skill(single_data.get('skill_types')),
+            )
+        elif entry.difficulty == default_difficulty and single_data.get('difficulty'):
+            entry.difficulty = str(single_data['difficulty'])
+        if classify(single_data):
+            entry.passed += 1
+        else:
+            entry.failed += 1
+    return stats, n_records
+
+
+def _uniform(seed: int, key: str) -> float:
+    """Deterministic U(0, 1) per (seed, group) - independent of upstream record order."""
+    digest = hashlib.blake2b(f"{seed}:{key}".encode(), digest_size=8).digest()
+    return (int.from_bytes(digest, "big") + 0.5) / 2 ** 64
+
+
+@dataclass
+class StratifiedReservoir:
+    """
+    Weighted reservoir sampling (Efraimidis-Spirakis A-Res) per stratum.
+
+    Each stratum keeps at most `capacity` candidates in a min-heap keyed by
+    u ** (1 / weight), so memory is bounded by #strata * capacity regardless of
+    how many groups are offered.
+    """
+    capacity: int
+    seed: int = 42
+    heaps: Dict[Tuple[str, ...], List[Tuple[float, str]]] = field(default_factory=dict)
+    sizes: Dict[Tuple[str, ...], int] = field(default_factory=dict)
+
+    def offer(self, stratum: Tuple[str, ...], key: str, weight: float = 1.0) -> None:
+        self.sizes[stratum] = self.sizes.get(stratum, 0) + 1
+        priority = _uniform(self.seed, key) ** (1.0 / weight)
+        heap = self.heaps.setdefault(stratum, [])
+        if len(heap) < self.capacity:
+            heapq.heappush(heap, (priority, key))
+        elif priority > heap[0][0]:
+            heapq.heapreplace(heap, (priority, key))
+
+    def allocate(self, target: int) -> Dict[Tuple[str, ...], int]:
+        """Proportional allocation of `target` over strata (largest remainder)."""
+        total = sum(self.sizes.values())
+        if total <= target:
+            return dict(self.sizes)
+        quotas = {s: target * n / total for s, n in self.sizes.items()}
+        alloc = {s: min(self.sizes[s], math.floor(q)) for s, q in quotas.items()}
+        left = target - sum(alloc.values())
+        for s in sorted(quotas, key=lambda s: (quotas[s] - alloc[s], s), reverse=True):
+            if left <= 0:
+                break
+            if alloc[s] < self.sizes[s]:
+                alloc[s] += 1
+                left -= 1
+        return alloc
+
+    def sample(self, target: int) -> List[str]:
+        """Selected group keys, highest priority first inside each stratum, strata sorted."""
+        chosen: List[str] = []
+        for stratum, k in sorted(self.allocate(target).items()):
+            chosen.extend(key for _, key in heapq.nlargest(k, self.heaps.get(stratum, [])))
+        return chosen
+
+
+def select_groups(stats: Dict[str, GroupStats], target: int, *, seed: int = 42,
+                  min_pass: int = 3, min_fail: int = 3,
+                  strata: Sequence[str] = STRATA_FIELDS, score: str = "balance"
+                  ) -> Tuple[List[str], Dict[Tuple[str, ...], int]]:
+    """
+    Keep groups with both outcomes and at least `min_pass` / `min_fail` tests,
+    then draw `target` of them stratified by `strata`. Returns the selected keys
+    and the number of eligible groups per stratum.
+    """
+    reservoir = StratifiedReservoir(capacity=target, seed=seed)
+    for key, entry in stats.items():
+        if entry.passed < max(1, min_pass) or entry.failed < max(1, min_fail):
+            continue
+        labels = {"difficulty": entry.difficulty, "skill": entry.skill, "mix": entry.mix()}
+        reservoir.offer(tuple(labels[f] for f in strata), key, entry.score(score))
+    return reservoir.sample(target), dict(reservoir.sizes)
+
+
+def gather_groups(records: Iterable[Dict[str, Any]], selected: Sequence[str]
+                  ) -> Iterator[List[Dict[str, Any]]]:
+    """Second pass: collect only the selected groups and yield them in selection order."""
+    wanted = {key: [] for key in selected}
+    for single_data in records:
+        bucket: Optional[List[Dict[str, Any]]] = wanted.get(group_key(single_data))
+        if bucket is not None:
+            single_data['true_false'] = 'True' if classify(single_data) else 'False'
+            bucket.append(single_data)
+    for key in selected:
+        yield wanted[key]
@@ -1,32 +1,10 @@
 import os
-import copy
-import json
-import random
+import sys
 import argparse
-import gzip
 from tqdm import tqdm
-from transformers import RobertaTokenizer
-
-def read_jsonl_to_list(jsonl_file):
-    data_list = []
-    with open(jsonl_file, 'r') as file:
-        for line in file:
-            data_list.append(json.loads(line))
-    return data_list
-    
-def save_dict_list_to_jsonl_gz(data_list, filename):
-    with gzip.open(filename, 'wt', encoding='utf-8') as file:
-        for entry in data_list:
-            json_line = json.dumps(entry)
-            file.write(json_line + '\n')
-            
-def read_jsonl_gz_to_list(jsonl_file):
-    """Read a gzipped JSONL file and return a list of dictionaries."""
-    data_list = []
-    with gzip.open(jsonl_file, 'rt', encoding='utf-8') as file:
-        for line in file:
-            data_list.append(json.loads(line))
-    return data_list
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipeline_utils.jsonl_io import JsonlWriter, iter_jsonl
 
 def parse_trace_string(trace_string):
     """
@@ -66,6 +44,51 @@ def parse_trace_string(trace_string):
     return False
 
 
+def parse_trace_steps(trace_string):
+    """
+    Single-pass version of parse_trace_string + the step cleaning loop.
+    Input = trace string (Formatted as "[1: {a: 20, b: 40} | 2: {a: 20, b: 40, c: 60} | 4: ]")
+    Output = list of steps with non-empty variable data (e.g. ["1: {a: 20, b: 40}", "2: {...}"]),
+             or None when parse_trace_string would return False
+    """
+    if trace_string == '[]' or not trace_string.startswith('['):
+        return None
+
+    steps = []
+    valid = False
+    for item in trace_string[1:-1].split(' | '):
+        key, sep, value = item.partition(':')
+        if not sep:
+            # parse_trace_string fails on a malformed step seen before the first valid one
+            if not valid:
+                return None
+            continue
+        if not valid and '{' in value and '}' in value:
+            for pair in value.strip().strip('{}').split(' , '):
+                pair = pair.strip()
+                if pair and ':' not in pair:
+                    return None
+            valid = True
+        if value.strip() != '':
+            steps.append(item)
+
+    return steps if valid else None
+
+
+def clean_record(single_data):
+    """
+    Rewrite only the trace part of input_expected_actual_trace.
+    Returns False if the record has no useful trace data.
+    """
+    target_data = single_data['input_expected_actual_trace']
+    head, sep, trace_data = target_data.rpartition('] @Trace = ')
+    steps = parse_trace_steps(trace_data.strip())
+    if steps is None:
+        return False
+    single_data['input_expected_actual_trace'] = head + sep + '[' + ' | '.join(steps) + ']'
+    return True
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--depth', type = str, default = 'all')
@@ -78,69 +101,40 @@ def main():
     print(f'{data_type} data filtering started')
     single_case_data_path = os.path.join(base_path, f'./python_data/{data_type}_filtered_single_tc.jsonl.gz')
     all_cases_data_path = os.path.join(base_path, f'./python_data/{data_type}_filtered_all_tc.jsonl.gz')
-    
-    # Loading Trace added python data path
-    path_dict = {
-        'single' : single_case_data_path,
-        'all' : all_cases_data_path
+
+    # save_actual_output writes the same records for --mode single / all, so both
+    # variants are produced from one read of whichever file exists.
+    source_path = all_cases_data_path if os.path.exists(all_cases_data_path) else single_case_data_path
+    if not os.path.exists(source_path):
+        print(f"No File {all_cases_data_path} / {single_case_data_path}")
+        return
+
+    out_path = {
+        d_t: os.path.join(base_path, f'./python_data/python_{data_type}_final_filtered_{d_t}.jsonl.gz')
+        for d_t in ('single', 'all')
     }
-    
-    for d_t, single_path in tqdm(path_dict.items(), desc = 'single / all', leave = True):
-        try:
-            # Loading Trace added python data
-            json_data = read_jsonl_gz_to_list(single_path)
-        except FileNotFoundError:
-            print(f"No File {single_case_data_path}")
-            continue
 
-        save_list = []
-        final_data_list = []
-        
-        for single_data in tqdm(json_data, desc = f'{d_t}', leave = True):
-            
-            # Parse expected / actual / trace data
-            target_data = single_data['input_expected_actual_trace']
-            input_data = target_data.split('@Input = [')[-1].split('] @Expected = [')[0].strip()
-            expected_data = target_data.split('@Expected = [')[-1].split('] @Actual = [')[0].strip()
-            actual_data = target_data.split('] @Actual = [')[-1].split(']')[0].strip()
-            trace_data = target_data.split('] @Trace = ')[-1].strip()
-    
-            # Check whether each trace data has useful information
-            if parse_trace_string(trace_data):
-                # Find trace part and preprocess data
-                whole_trace_part = trace_data
-                whole_trace_parsed = whole_trace_part[1:-1].split(' | ')
-
-                temp_list = []
-                
-                for parsed_data in whole_trace_parsed:
-                    try:
-                        line_number = parsed_data.split(':', 1)[0].strip()
-                        variable_data = parsed_data.split(':', 1)[1].strip()
-                        if variable_data == '':
-                            continue
-                    except IndexError:
-                        continue
-                    temp_list.append(parsed_data)
-                
-                updated_trace_part = '[' + ' | '.join(temp_list) + ']'
-                
-                # Choose data only if actual result and expected result are different
-                if d_t == 'single':  
-                    save_key = f"{single_data['pid']}_{single_data['code_index']}"
-                    if save_key in save_list:   
-                        continue
-                    else:
-                        single_data['input_expected_actual_trace'] = single_data['input_expected_actual_trace'].replace(whole_trace_part, updated_trace_part)
-                        final_data_list.append(single_data)
-                        save_list.append(save_key)
-                else:
-                    single_data['input_expected_actual_trace'] = single_data['input_expected_actual_trace'].replace(whole_trace_part, updated_trace_part)
-                    final_data_list.append(single_data)
-            
-        tqdm.write(f'{d_t} data length = {len(json_data)}')
-        tqdm.write(f'filtered {d_t} data length = {len(final_data_list)}')
-        save_dict_list_to_jsonl_gz(final_data_list, os.path.join(base_path, f'./python_data/python_{data_type}_final_filtered_{d_t}.jsonl.gz'))
+    save_keys = set()
+    data_length = 0
+    with JsonlWriter(out_path['single']) as single_writer, JsonlWriter(out_path['all']) as all_writer:
+        for single_data in tqdm(iter_jsonl(source_path), desc = 'single / all', leave = True):
+            data_length += 1
+
+            # Check whether each trace data has useful information and drop empty steps
+            if not clean_record(single_data):
+                continue
+
+            all_writer.write(single_data)
+
+            # Keep a single test case per (pid, code_index)
+            save_key = (single_data['pid'], single_data['code_index'])
+            if save_key not in save_keys:
+                save_keys.add(save_key)
+                single_writer.write(single_data)
+
+    tqdm.write(f'data length = {data_length} ({os.path.basename(source_path)})')
+    tqdm.write(f'filtered single data length = {single_writer.count}')
+    tqdm.write(f'filtered all data length = {all_writer.count}')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,26 +1,11 @@
-import json
 import os
-import copy
-import gzip
+import sys
 import argparse
 from tqdm import tqdm
 
-def read_jsonl_gz(filename):
-    with gzip.open(filename, 'rt', encoding='utf-8') as file:
-        return [json.loads(line) for line in file]
-            
-def save_dict_list_to_jsonl_gz(data_list, filename):
-    with gzip.open(filename, 'wt', encoding='utf-8') as file:
-        for entry in data_list:
-            json_line = json.dumps(entry)
-            file.write(json_line + '\n')
-            
-def save_list_to_jsonl(data_list, jsonl_file):
-    # Open and write the JSONL file
-    with open(jsonl_file, 'w') as file:
-        for value in data_list:
-            # Write each JSON object to a new line
-            file.write(json.dumps(value) + '\n')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipeline_utils.jsonl_io import JsonlWriter, iter_jsonl
+from group_selection import SCORES, STRATA_FIELDS, collect_group_stats, gather_groups, select_groups
             
 def main():
     parser = argparse.ArgumentParser()
@@ -28,63 +13,42 @@ def main():
     parser.add_argument("--level", default = 'very_hard', type=str)
     parser.add_argument('--incor_pass', default = 3, type = int)
     parser.add_argument('--incor_fail', default = 3, type = int)
+    parser.add_argument('--target', default = 200, type = int, help = 'number of (pid, code_index) groups to keep')
+    parser.add_argument('--seed', default = 42, type = int)
+    parser.add_argument('--strata', default = ','.join(STRATA_FIELDS),
+                        help = f'comma separated subset of {",".join(STRATA_FIELDS)} (empty = no stratification)')
+    parser.add_argument('--score', default = 'balance', choices = SCORES,
+                        help = 'sampling weight per group: uniform or favour balanced pass/fail mixes')
     args = parser.parse_args()
-    
-    incor_pass = args.incor_pass
-    incor_fail = args.incor_fail
+
+    strata = [s for s in args.strata.split(',') if s]
+    unknown = set(strata) - set(STRATA_FIELDS)
+    if unknown:
+        parser.error(f'unknown strata: {sorted(unknown)}')
     
     raw_file = os.path.join(os.getcwd(), 'python_data', f'python_{args.level}_final_filtered_all.jsonl.gz')
-    raw_data_list = read_jsonl_gz(raw_file)
 
-    parse_by_key = {}
-    
-    for single_data in tqdm(raw_data_list, leave=True):
-        pid = single_data['pid']
-        code_index = single_data['code_index']
-        key = f'{pid}_{code_index}'
-    
-        if key not in parse_by_key:
-            parse_by_key[key] = []
-        
-        parse_by_key[key].append(single_data)
-        
-    target_data_list = []
-    for code_index, single_code in tqdm(enumerate(parse_by_key.values()), leave=True):
-        no_exist = False
-        yes_exist = False
-        correct_check = 0
-        incorrect_check = 0
-        for single_data in single_code:
-            expected_actual = single_data['input_expected_actual']
-            expected_actual = expected_actual.split('] @Expected =')[1]
-            expected, actual = expected_actual.split(' @Actual = ')
-            expected = expected.strip()
-            actual = actual.strip()
+    # 1st pass: per-group pass/fail counts only
+    stats, raw_count = collect_group_stats(tqdm(iter_jsonl(raw_file), leave=True, desc='stats'),
+                                           default_difficulty=args.level.upper())
+    selected, strata_sizes = select_groups(stats, args.target, seed=args.seed,
+                                           min_pass=args.incor_pass, min_fail=args.incor_fail,
+                                           strata=strata, score=args.score)
 
-            expected = expected[1:-1].split(', ')
-            actual = actual[1:-1].split(', ')
+    if len(selected) < args.target:
+        print(f'Warning: Data is less than {args.target}, only {len(selected)} found.')
+    print(f'Eligible groups: {sum(strata_sizes.values())} in {len(strata_sizes)} strata')
 
-            if expected == actual:
-                single_data['true_false'] = 'True'
-                no_exist = True
-                correct_check += 1
-            elif expected != actual:
-                single_data['true_false'] = 'False'
-                yes_exist = True
-                incorrect_check += 1
+    # 2nd pass: only the selected groups are materialised
+    out_path = os.path.join(os.getcwd(), f'{args.level}_data.jsonl.gz')
+    record_count = 0
+    with JsonlWriter(out_path) as writer:
+        for single_code in gather_groups(tqdm(iter_jsonl(raw_file), leave=True, desc='gather'), selected):
+            record_count += len(single_code)
+            writer.write(single_code)
         
-        if (no_exist and yes_exist) and incorrect_check >= args.incor_fail and correct_check >= args.incor_pass:
-            target_data_list.append(copy.deepcopy(single_code))
-            
-    if len(target_data_list) > 200:
-        target_data_list = target_data_list[:200]
-    elif len(target_data_list) < 200:
-        print(f'Warning: Data is less than 200, only {len(target_data_list)} found.')
-        
-    print(f'Before Data filtering: {len(raw_data_list)}')
-    print(f'After Data filtering: {len(target_data_list) * 10}')
-    
-    save_dict_list_to_jsonl_gz(target_data_list, os.path.join(os.getcwd(), f'{args.level}_data.jsonl.gz'))
+    print(f'Before Data filtering: {raw_count}')
+    print(f'After Data filtering: {record_count}')
     
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
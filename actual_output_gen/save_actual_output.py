@@ -1,35 +1,44 @@
 from __future__ import annotations
 
 import argparse
-import copy
-import gzip
-import json
+import codecs
+import hashlib
 import multiprocessing as mp
 import os
 import re
 import subprocess
+import sys
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterator, List, Tuple
 
 from tqdm import tqdm
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pipeline_utils.diagnostics import disabled_sink, get_sink, merge_diagnostics, summarize_diagnostics
+from pipeline_utils.jsonl_io import JsonlWriter, iter_jsonl
+from pipeline_utils.metrics import active_metrics, build_report, format_report, get_metrics, reset_metrics, stamped, timed_task
+from pipeline_utils.sampling_profiler import profile_path, summarize_profiles
+from pipeline_utils.test_cases import canonical_text
+
 BASE_CODE_DIR: Path = Path("./python_code")
 BASE_ERR_DIR: Path = Path("./python_error")
-BASE_CODE_DIR.mkdir(parents=True, exist_ok=True)
-BASE_ERR_DIR.mkdir(parents=True, exist_ok=True)
 
-def read_jsonl_gz(fn: Path) -> List[Dict[str, Any]]:
-    """gzip-압축 JSONL => List[dict]"""
-    with gzip.open(fn, "rt", encoding="utf-8") as f:
-        return [json.loads(line) for line in f]
+data_type: str = "hard"
+# main() 에서만 켜짐: run_python 을 import 해서 쓰는 쪽은 python_error/ 를 만들지 않는다
+diagnostics: bool = False
+# seconds between profiler samples; 0 runs submissions directly (set by --profile)
+profile_interval: float = 0.0
+PROFILER_SCRIPT: str = str(Path(__file__).resolve().parents[1] / "pipeline_utils" / "sampling_profiler.py")
+
 
+def _diag_stage() -> str:
+    return f"actual_output_{data_type}"
 
-def save_jsonl_gz(objs: List[Dict[str, Any]], fn: Path) -> None:
-    """List[dict] => gzip-압축 JSONL 저장"""
-    fn.parent.mkdir(parents=True, exist_ok=True)
-    with gzip.open(fn, "wt", encoding="utf-8") as f:
-        for obj in objs:
-            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+
+def _diag():
+    """현재 프로세스의 diagnostics sink (python_error/<stage>.<pid>.ndjson), main() 밖에서는 아무것도 쓰지 않음"""
+    return get_sink(BASE_ERR_DIR, _diag_stage()) if diagnostics else disabled_sink()
 
 
 def write_code_file(path: Path, code: str) -> None:
@@ -54,17 +63,28 @@ def _normalize_stdin(raw: str) -> str:
     return norm
 
 
-def run_python(file_path: str, stdin: str, timeout: int = 20) -> str:
+def run_python(file_path: str, stdin: str, timeout: int = 20, profile_out: str = None) -> str:
     """
     `python file_path` 를 실행하고 stdout(또는 stderr)을 문자열로 돌려준다.
     - stdin 은 trace 에서 추출한 뒤 _normalize_stdin() 으로 보정.
     - 예외 상황에서도 항상 str 반환 => 후속 로직 안전.
+    - profile_out 이 있으면 sampling profiler 로 감싸 실행하고 요약을 profile_out 에 저장
+      (timeout 직전에 스스로 멈추므로 timeout 된 프로그램도 요약이 남음).
     """
+    argv = ["python", file_path]
+    if profile_out is not None and profile_interval:
+        argv = ["python", PROFILER_SCRIPT, "run", "--out", profile_out,
+                "--interval", str(profile_interval), "--deadline", str(max(timeout - 0.5, 0.1)), file_path]
+
     # stdin = _normalize_stdin(stdin)
 
+    metrics = active_metrics()
+    metrics.add("subprocesses")
+    metrics.add("bytes_stdin", len(stdin.encode("utf-8", "surrogatepass")))
+    start = time.perf_counter()
     try:
         proc = subprocess.run(
-            ["python", file_path],
+            argv,
             input=stdin,
             text=True,
             capture_output=True,
@@ -73,29 +93,40 @@ def run_python(file_path: str, stdin: str, timeout: int = 20) -> str:
         )
         # stdout 이 비어 있으면 stderr 라도 돌려준다 (종종 print 가 아닌 예외 메시지만 있는 경우)
         output = proc.stdout if proc.stdout.strip() else proc.stderr
+        metrics.observe("subprocess", time.perf_counter() - start)
+        metrics.add("bytes_stdout", len(proc.stdout))
+        _diag().log(
+            "exec",
+            file=file_path,
+            elapsed=time.perf_counter() - start,
+            returncode=proc.returncode,
+            error_class=None if proc.returncode == 0 else "NonZeroExit",
+            stderr=proc.stderr[-500:] if proc.returncode != 0 else "",
+        )
         return output.rstrip("\n")
     except subprocess.TimeoutExpired as e:
-        return (e.stdout or "").rstrip("\n")
+        metrics.observe("subprocess", time.perf_counter() - start)
+        metrics.add("timeouts")
+        _diag().error("exec", e, file=file_path, elapsed=time.perf_counter() - start)
+        out = e.stdout or ""
+        # TimeoutExpired.stdout 는 text=True 여도 bytes 로 오는 경우가 있다
+        if isinstance(out, bytes):
+            out = out.decode("utf-8", "replace")
+        return out.rstrip("\n")
     except Exception as exc:
-        err_log = BASE_ERR_DIR / "exec_error.log"
-        print(f"Error executing {file_path}: {exc}", file=sys.stderr)
+        metrics.add("exec_errors")
+        _diag().error("exec", exc, file=file_path, elapsed=time.perf_counter() - start)
         return ""
 
-def process_sample(
-    args: Tuple[
-        Dict[str, Any],  
-        str,             
-        str,             
-        str,             
-        List[str],       
-    ]
+def build_record(
+    single: Dict[str, Any],
+    test_input: str,
+    header_str: str,
+    var_trace: str,
+    stmts: List[str],
+    actual_output: str,
 ) -> Dict[str, Any]:
-    single, test_input, header_str, var_trace, stmts = args
-
-    py_path = BASE_CODE_DIR / f"python_{single['pid']}_{single['code_index']}.py"
-    write_code_file(py_path, single["raw_incorrect"])
-
-    actual_output = run_python(str(py_path), test_input)
+    """실행 결과(actual_output)를 붙인 새 레코드 생성 (원본은 얕은 복사만)"""
     actual_output = actual_output.replace("\n", " ").replace("\t", " ").strip()
 
     exp_part = (
@@ -110,16 +141,103 @@ def process_sample(
 
     gold_lines = ", ".join(re.findall(r"^\d+", "\n".join(stmts), flags=re.M))
 
-    new_data = copy.deepcopy(single)
+    new_data = dict(single)
     new_data["input_expected_actual"] = io_full
     new_data["input_expected_actual_gold"] = f"{io_full} @Location = [{gold_lines}]"
     new_data["input_expected_actual_trace"] = f"{io_full} @Trace = {var_trace}"
 
-    with open(f'./python_error/{single["pid"]}.txt', "w", encoding='utf-8') as err_log_file:
-        err_log_file.write(f"INPUT:\n{repr(test_input)}\nOUTPUT:\n{repr(actual_output)}\n{repr(io_full)}\n{repr(new_data['input_expected_actual_trace'])}")
+    _diag().log(
+        "sample",
+        pid=single["pid"],
+        code_index=single.get("code_index"),
+        input=test_input,
+        actual=actual_output,
+        io=io_full,
+    )
     return new_data
 
 
+def process_sample(
+    args: Tuple[
+        Dict[str, Any],  
+        str,             
+        str,             
+        str,             
+        List[str],       
+    ]
+) -> Dict[str, Any]:
+    single, test_input, header_str, var_trace, stmts = args
+
+    py_path = BASE_CODE_DIR / f"python_{single['pid']}_{single['code_index']}.py"
+    write_code_file(py_path, single["raw_incorrect"])
+
+    profile_out = profile_path(f"{py_path}_{_digest(test_input)}") if profile_interval else None
+    actual_output = run_python(str(py_path), test_input, profile_out=profile_out)
+    return build_record(single, test_input, header_str, var_trace, stmts, actual_output)
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def run_unique(args: Tuple[str, str, str, str]) -> Tuple[str, str]:
+    """
+    grouped 모드용 worker: (code_hash, input_hash) 조합을 한 번만 실행.
+    코드 파일은 code_hash 로 이름을 지어 같은 코드는 한 번만 저장한다.
+    """
+    code_hash, input_hash, code, test_input = args
+    py_path = BASE_CODE_DIR / f"python_{code_hash}.py"
+    if not py_path.exists():
+        tmp_path = py_path.with_suffix(f".{os.getpid()}.tmp")
+        write_code_file(tmp_path, code)
+        os.replace(tmp_path, py_path)
+    profile_out = profile_path(str(BASE_CODE_DIR / f"python_{code_hash}_{input_hash}")) if profile_interval else None
+    return f"{code_hash}_{input_hash}", run_python(str(py_path), test_input, profile_out=profile_out)
+
+
+def collect_unique_runs(data_path: Path) -> Tuple[Dict[str, Tuple[str, str, str, str]], int, int]:
+    """
+    1st pass: (raw_incorrect, test_input) 중복 제거.
+    실행 key 는 실제로 stdin 에 넣는 문자열 그대로 (앞쪽 빈 줄 / 줄 끝 공백도 input(), split(' ') 결과를 바꾼다).
+    canonical_text 기준 개수는 공백만 다른 입력이 얼마나 되는지 보고용으로만 센다.
+    trace 문자열 등 무거운 필드는 들고 있지 않고 코드/입력만 보관한다.
+    """
+    unique: Dict[str, Tuple[str, str, str, str]] = {}
+    canonical = set()
+    code_hashes: Dict[str, str] = {}
+    n_records = 0
+    for rec in iter_jsonl(data_path):
+        n_records += 1
+        test_input = _split_trace(rec["trace_code"])[0]
+        code = rec["raw_incorrect"]
+        code_hash = code_hashes.setdefault(code, _digest(code))
+        input_hash = _digest(test_input)
+        key = f"{code_hash}_{input_hash}"
+        if key not in unique:
+            unique[key] = (code_hash, input_hash, code, test_input)
+            canonical.add((code_hash, _digest(canonical_text(test_input))))
+    return unique, n_records, len(canonical)
+
+
+def _split_trace(trace_str: str) -> Tuple[str, str, str]:
+    """trace_code => (input, header, var_trace)"""
+    # Input / Expected / Trace 분리
+    test_input = trace_str.split("# @Input = [", 1)[-1].split("] @Expected = [", 1)[0]
+    header_str = trace_str.split("] @Trace = ", 1)[0]
+    var_trace = trace_str.split("] @Trace = ", 1)[-1]
+    return test_input, header_str, var_trace
+
+
+def iter_tasks(
+    data_path: Path, counter: Dict[str, int]
+) -> Iterator[Tuple[Dict[str, Any], str, str, str, List[str]]]:
+    """Stream (sample, input, header, var_trace, statements) tuples from the trace file."""
+    for rec in iter_jsonl(data_path):
+        test_input, header_str, var_trace = _split_trace(rec["trace_code"])
+        counter["tasks"] += 1
+        yield rec, test_input, header_str, var_trace, rec["statement"]
+
+
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -132,48 +250,109 @@ def main() -> None:
         '--data_type',
         default='hard',
         type=str)
+    parser.add_argument(
+        "--data_path",
+        default=None,
+        help="입력 파일 (기본: ./python_data/<data_type>_filtered_tc_cov.jsonl.gz, "
+             "coverage 선택 후에는 <data_type>_filtered_tc_cov_selected.jsonl.gz)",
+    )
+    parser.add_argument(
+        "--exec_mode",
+        choices=("grouped", "per_sample"),
+        default="grouped",
+        help="grouped: 같은 (코드, 입력) 조합은 한 번만 실행 / per_sample: 레코드마다 실행",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="sampling profiler 로 실행하고 python_code/ 에 실행별 *.profile.json 요약 저장",
+    )
+    parser.add_argument("--profile_interval", default=5.0, type=float, help="sample 간격 (CPU ms)")
     args = parser.parse_args()
     
-    global data_type
+    global data_type, profile_interval, diagnostics
     data_type = args.data_type
+    diagnostics = True
+    BASE_CODE_DIR.mkdir(parents=True, exist_ok=True)
+    BASE_ERR_DIR.mkdir(parents=True, exist_ok=True)
+    profile_interval = args.profile_interval / 1000 if args.profile else 0.0
 
-    DATA_PATH: Path = Path(f"./python_data/{data_type}_filtered_tc_cov.jsonl.gz")
-
-    raw_records = read_jsonl_gz(DATA_PATH)
-    tasks: List[
-        Tuple[Dict[str, Any], str, str, str, List[str]]
-    ] = []  # (sample, input, header, var_trace, statements)
-
-    for rec in raw_records:
-        trace_str: str = rec["trace_code"]
-
-        # Input / Expected / Trace 분리
-        test_input = trace_str.split("# @Input = [", 1)[-1].split("] @Expected = [", 1)[0]
-        header_str = trace_str.split("] @Trace = ", 1)[0]
-        var_trace = trace_str.split("] @Trace = ", 1)[-1]
-
-        tasks.append((rec, test_input, header_str, var_trace, rec["statement"]))
-
-    cpu_cnt = max(1, min(32, os.cpu_count() or 1))
-    results: List[Dict[str, Any]] = []
-    with mp.Pool(cpu_cnt) as pool:
-        for item in tqdm(
-            pool.imap_unordered(process_sample, tasks, chunksize=16),
-            total=len(tasks),
-            ncols=70,
-            desc="Processing",
-        ):
-            results.append(item)
+    DATA_PATH: Path = Path(args.data_path or f"./python_data/{data_type}_filtered_tc_cov.jsonl.gz")
 
     out_name = (
         f"{data_type}_filtered_single_tc.jsonl.gz"
         if args.mode == "single"
         else f"{data_type}_filtered_all_tc.jsonl.gz"
     )
-    save_jsonl_gz(results, Path("./python_data") / out_name)
 
-    print(f"\nOriginal : {len(tasks):,}")
-    print(f"Saved    : {len(results):,}")
+    cpu_cnt = max(1, min(32, os.cpu_count() or 1))
+    counter = {"tasks": 0}
+    out_path = Path("./python_data") / out_name
+
+    stage_start = time.perf_counter()
+    reset_metrics(_diag_stage())
+    metrics = get_metrics(_diag_stage())
+    metrics.add("bytes_read", DATA_PATH.stat().st_size)
+
+    if args.exec_mode == "per_sample":
+        with mp.Pool(cpu_cnt) as pool, JsonlWriter(out_path) as writer:
+            for item in tqdm(
+                pool.imap_unordered(timed_task(process_sample, _diag_stage(), "task"),
+                                    stamped(iter_tasks(DATA_PATH, counter)), chunksize=16),
+                ncols=70,
+                desc="Processing",
+            ):
+                writer.write(item)
+            # clean worker exit so their metrics snapshots are flushed
+            pool.close()
+            pool.join()
+    else:
+        with metrics.timer("collect"):
+            unique, n_records, n_canonical = collect_unique_runs(DATA_PATH)
+        print(f"Unique (code, input) runs : {len(unique):,} / {n_records:,} records "
+              f"({n_canonical:,} if whitespace-only differences were merged)")
+
+        outputs: Dict[str, str] = {}
+        with mp.Pool(cpu_cnt) as pool:
+            for key, actual_output in tqdm(
+                pool.imap_unordered(timed_task(run_unique, _diag_stage(), "task"),
+                                    stamped(unique.values()), chunksize=4),
+                total=len(unique),
+                ncols=70,
+                desc="Executing",
+            ):
+                outputs[key] = actual_output
+            pool.close()
+            pool.join()
+        del unique
+
+        code_hashes: Dict[str, str] = {}
+        with metrics.timer("fan_out"), JsonlWriter(out_path) as writer:
+            for rec, test_input, header_str, var_trace, stmts in tqdm(
+                iter_tasks(DATA_PATH, counter), total=n_records, ncols=70, desc="Fan-out"
+            ):
+                code = rec["raw_incorrect"]
+                code_hash = code_hashes.setdefault(code, _digest(code))
+                actual_output = outputs[f"{code_hash}_{_digest(test_input)}"]
+                writer.write(build_record(rec, test_input, header_str, var_trace, stmts, actual_output))
+
+    print(f"\nOriginal : {counter['tasks']:,}")
+    print(f"Saved    : {writer.count:,}")
+
+    metrics.add("bytes_written", out_path.stat().st_size)
+    print(format_report(build_report(_diag_stage(), wall=time.perf_counter() - stage_start)))
+
+    if profile_interval:
+        profiles = summarize_profiles(str(BASE_CODE_DIR))
+        print(f"Profiles: {profiles['profiles']}  outcomes: {profiles['outcomes']}  flags: {profiles['flags']}")
+        for entry in profiles["costliest"][:10]:
+            print(f"  {entry['cpu']:8.2f}s cpu  {entry['outcome']:<16} {entry['path']}  hot: {entry['hot_line']}")
+
+    merged = merge_diagnostics(BASE_ERR_DIR, _diag_stage())
+    if merged is not None:
+        print(f"Diagnostics => {merged}")
+        for name, entry in sorted(summarize_diagnostics(merged).items()):
+            print(f"  {name:<16} {entry['count']:>8,}  {entry['elapsed']:10.1f}s")
 
 
 if __name__ == "__main__":
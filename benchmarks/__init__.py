@@ -0,0 +1 @@
+"""Offline benchmarks for the pipeline hot paths (see run_benchmarks.py)."""
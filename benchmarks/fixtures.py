@@ -0,0 +1,180 @@
+"""
+Synthetic competitive-programming fixtures for the benchmarks.
+
+Everything is generated from a seed, so two runs with the same scale and
+seed benchmark exactly the same inputs, and nothing is downloaded.
+"""
+from __future__ import annotations
+
+import random
+from typing import Dict, List, Tuple
+
+# Per-scale sizes; "small" is meant for quick checks, "large" for regression runs
+SCALES: Dict[str, Dict[str, int]] = {
+    "small": {
+        "n_correct": 20, "n_incorrect": 20,
+        "output_tokens": 20_000,
+        "loop_n": 200,
+        "big_output_lines": 20_000,
+        "trace_steps": 3_000, "trace_vars": 6,
+        "problems": 3, "tests": 6,
+        "subprocess_runs": 5,
+    },
+    "large": {
+        "n_correct": 150, "n_incorrect": 150,
+        "output_tokens": 200_000,
+        "loop_n": 2_000,
+        "big_output_lines": 200_000,
+        "trace_steps": 30_000, "trace_vars": 12,
+        "problems": 10, "tests": 12,
+        "subprocess_runs": 20,
+    },
+}
+
+# Templates of accepted solutions; {op} / {init} / {fmt} are mutated to produce near misses
+SOLUTION_TEMPLATES = [
+    """n = int(input())
+a = list(map(int, input().split()))
+s = {init}
+for x in a:
+    s = s {op} x
+print({fmt})""",
+    """n = int(input())
+a = list(map(int, input().split()))
+best = {init}
+for i in range(n):
+    for j in range(i, n):
+        best = max(best, sum(a[i:j + 1]) {op} 0)
+print({fmt})""",
+    """import sys
+input = sys.stdin.readline
+n = int(input())
+a = sorted(map(int, input().split()))
+cnt = {init}
+for i in range(1, n):
+    if a[i] {op} a[i - 1]:
+        cnt += 1
+print({fmt})""",
+]
+
+
+def _solution(rng: random.Random, template: str, correct: bool) -> str:
+    result = template.split(" = {init}")[0].rsplit("\n", 1)[-1]
+    op = "+" if correct else rng.choice(["-", "*", "^", "|"])
+    init = "0" if correct else rng.choice(["1", "-1", "n"])
+    fmt = result if correct else rng.choice([f"{result} + 1", f"{result} - 1", f"{result} * 2"])
+    code = template.format(op=op, init=init, fmt=fmt)
+    # cosmetic variation so solutions are not byte-identical
+    for _ in range(rng.randint(0, 3)):
+        code += f"\n# {rng.randint(0, 10 ** 6)}"
+    return code
+
+
+def solution_set(rng: random.Random, n_correct: int, n_incorrect: int) -> Dict[str, List[str]]:
+    """`{'correct': [...], 'incorrect': [...]}` as consumed by find_matching_pairs."""
+    return {
+        "correct": [_solution(rng, rng.choice(SOLUTION_TEMPLATES), True) for _ in range(n_correct)],
+        "incorrect": [_solution(rng, rng.choice(SOLUTION_TEMPLATES), False) for _ in range(n_incorrect)],
+    }
+
+
+def loop_program() -> str:
+    """Loop-heavy program: O(n^2) nested loops over a list read from stdin."""
+    return """n = int(input())
+a = list(map(int, input().split()))
+total = 0
+for i in range(n):
+    acc = 0
+    for j in range(i, n):
+        acc += a[j] * (i + 1)
+        if acc % 7 == 3:
+            total += 1
+print(total)"""
+
+
+def loop_input(rng: random.Random, n: int) -> str:
+    return f"{n}\n{' '.join(str(rng.randint(1, 10 ** 6)) for _ in range(n))}\n"
+
+
+def big_output_program(lines: int) -> str:
+    """Program printing `lines` lines (stdout volume through the pipe)."""
+    return f"""for i in range({lines}):
+    print(i, i * i, 'yes' if i % 2 else 'no')"""
+
+
+def output_pair(rng: random.Random, n_tokens: int, kind: str) -> Tuple[str, str]:
+    """(actual, expected) that compare equal, so compare_outputs walks every token."""
+    if kind == "int":
+        tokens = [str(rng.randint(-10 ** 9, 10 ** 9)) for _ in range(n_tokens)]
+        return " ".join(tokens), "\n".join(tokens)
+    if kind == "float":
+        values = [rng.uniform(-1e6, 1e6) for _ in range(n_tokens)]
+        return " ".join(f"{v:.9f}" for v in values), " ".join(f"{v:.7f}" for v in values)
+    tokens = [rng.choice(["YES", "no", "abc", str(rng.randint(0, 99)), f"{rng.random():.4f}"]) for _ in range(n_tokens)]
+    return " ".join(tokens), " ".join(t.lower() if t in ("YES", "NO") else t for t in tokens)
+
+
+def synthetic_trace(rng: random.Random, steps: int, n_vars: int) -> Tuple[Dict[str, dict], str]:
+    """
+    Tracer-format trace (`{order: {event, function, line, variables}}`) of a
+    program with a nested loop, plus its `incorrect_code` (`"1 stmt ||| 2 ..."`)
+    for loop detection.
+    """
+    code_lines = [
+        "n = int(input())",
+        "a = list(map(int, input().split()))",
+        "total = 0",
+        "for i in range(n):",
+        "    acc = 0",
+        "    for j in range(i, n):",
+        "        acc += a[j]",
+        "    total += acc",
+        "print(total)",
+    ]
+    incorrect_code = " ||| ".join(f"{k + 1} {line}" for k, line in enumerate(code_lines))
+    names = ["n", "a", "total", "i", "acc", "j"] + [f"v{k}" for k in range(max(0, n_vars - 6))]
+    variables: Dict[str, object] = {}
+    trace: Dict[str, dict] = {}
+    line_cycle = [5, 6, 7, 6, 7, 8, 4]
+    for order in range(1, steps + 1):
+        if order <= 3:
+            line = order
+        else:
+            line = line_cycle[(order - 4) % len(line_cycle)]
+        name = names[rng.randrange(len(names))]
+        variables = dict(variables)
+        variables[name] = rng.randint(0, 10 ** 6) if name != "a" else [rng.randint(0, 9) for _ in range(8)]
+        trace[str(order)] = {"event": "line", "function": "trace_func", "line": line, "variables": variables}
+    return trace, incorrect_code
+
+
+def raw_problem(rng: random.Random, pid: int, n_tests: int, n_correct: int = 4, n_incorrect: int = 4) -> dict:
+    """
+    One problem in the shape dataset_filter reads (`pid`, `code_pair`,
+    `test_case`, TACO fields), before find_matching_pairs has paired it.
+    Expected outputs come from the first template's accepted solution.
+    """
+    tests = []
+    for _ in range(n_tests):
+        n = rng.randint(1, 8)
+        a = [rng.randint(-5, 20) for _ in range(n)]
+        stdin = f"{n}\n{' '.join(map(str, a))}\n"
+        tests.append([stdin, f"{sum(a)}\n"])
+    template = SOLUTION_TEMPLATES[0]
+    correct = [template.format(op="+", init="0", fmt="s") + f"\n# {k}" for k in range(n_correct)]
+    # wrong only on some inputs, so pairs have both passing and failing tests
+    incorrect = [template.format(op="+", init="0", fmt=rng.choice(["s if n > 3 else s + 1", "s if n % 2 else -s"]))
+                 + f"\n# {k}" for k in range(n_incorrect)]
+    # duplicate a test (whitespace only) so test dedup has something to do
+    if tests:
+        tests.append([tests[0][0] + "\n", tests[0][1]])
+    return {
+        "pid": f"bench_{pid}",
+        "question": "Print the sum of the array.",
+        "correct": correct,
+        "incorrect": incorrect,
+        "test_case": tests,
+        "taco_input_output": '{"inputs": [], "outputs": []}',
+        "taco_difficulty": "EASY",
+        "taco_skill_types": "['Data structures']",
+    }
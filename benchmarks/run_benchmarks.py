@@ -0,0 +1,370 @@
+"""
+Offline benchmarks of the pipeline hot paths.
+
+    python benchmarks/run_benchmarks.py --scale small
+    python benchmarks/run_benchmarks.py --scale large --out base.json
+    python benchmarks/run_benchmarks.py --scale large --compare base.json --fail_above 1.2
+
+Each benchmark builds its synthetic fixture once (benchmarks/fixtures.py),
+runs `--warmup` untimed and `--repeat` timed iterations and records
+min / median / mean / stdev. Benchmarks whose module cannot be imported
+(missing optional dependency) are recorded as skipped. Results are written
+as JSON so runs can be compared against a baseline.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+for sub in ("", "code_pair_gen", "variable_trace", "actual_output_gen"):
+    path = str(ROOT / sub)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Nothing here may touch the Hub
+os.environ["HF_DATASETS_OFFLINE"] = "1"
+os.environ["HF_HUB_OFFLINE"] = "1"
+
+from benchmarks.fixtures import (SCALES, big_output_program, loop_input, loop_program, output_pair,  # noqa: E402
+                                 raw_problem, solution_set, synthetic_trace)
+
+# setup(scale, rng, workdir) -> (function to time, work items per call, extra metadata)
+Setup = Callable[[Dict[str, int], random.Random, Path], Tuple[Callable[[], Any], int, Dict[str, Any]]]
+BENCHMARKS: List[Tuple[str, Setup]] = []
+
+
+def benchmark(name: str) -> Callable[[Setup], Setup]:
+    def register(setup: Setup) -> Setup:
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+@contextlib.contextmanager
+def quiet_stdio():
+    """The traced / executed programs print; keep benchmark output readable."""
+    saved = sys.stdin, sys.stdout, sys.stderr
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        try:
+            yield
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = saved
+
+
+# ---- code_pair_gen ---------------------------------------------------------
+
+def _find_matching_pairs(n_correct: int, n_incorrect: int) -> Setup:
+    def setup(scale, rng, workdir):
+        from dataset_curation import find_matching_pairs
+        solutions = solution_set(rng, n_correct, n_incorrect)
+
+        def run():
+            return find_matching_pairs(dict(solutions))
+        return run, n_correct * n_incorrect, {"pairs_found": len(run()["code_pair"])}
+    return setup
+
+
+BENCHMARKS.append(("find_matching_pairs/small_set", _find_matching_pairs(8, 8)))
+
+
+@benchmark("find_matching_pairs/large_set")
+def _bench_pairs_large(scale, rng, workdir):
+    return _find_matching_pairs(scale["n_correct"], scale["n_incorrect"])(scale, rng, workdir)
+
+
+def _compare_outputs(kind: str) -> Setup:
+    def setup(scale, rng, workdir):
+        from dataset_filter import compare_outputs
+        actual, expected = output_pair(rng, scale["output_tokens"], kind)
+        assert compare_outputs(actual, expected)
+        return (lambda: compare_outputs(actual, expected)), scale["output_tokens"], {}
+    return setup
+
+
+for _kind in ("int", "float", "mixed"):
+    BENCHMARKS.append((f"compare_outputs/{_kind}", _compare_outputs(_kind)))
+
+
+# ---- variable_trace ----------------------------------------------------------
+
+def _trace_module():
+    import python_variable_trace as ptv
+    ptv.data_type = "bench"
+    return ptv
+
+
+@benchmark("trace_variable/loop_heavy")
+def _bench_trace_variable(scale, rng, workdir):
+    """The stage's per-test entry point (default 3000-event cap, JSON + gzip of the trace)."""
+    ptv = _trace_module()
+    read_line, fn = ptv.create_function_from_file(loop_program())
+    inputs = loop_input(rng, scale["loop_n"]).split("\n")
+    path = str(workdir / "trace_variable.json")
+
+    def run():
+        with quiet_stdio():
+            ptv.trace_variable(inputs, fn, path, read_line, [])
+    run()
+    with gzip.open(path + ".gz", "rt") as f:
+        events = len(json.load(f))
+    return run, events, {"events": events}
+
+
+@benchmark("tracer/long_trace")
+def _bench_tracer_long(scale, rng, workdir):
+    """Tracer.traceit over `trace_steps` events without the stage cap."""
+    ptv = _trace_module()
+    read_line, fn = ptv.create_function_from_file(loop_program())
+    stdin = loop_input(rng, scale["loop_n"])
+    path = str(workdir / "tracer_long.json")
+    events = {"n": 0}
+
+    def run():
+        tracer = ptv.Tracer(path=path, user_def_function=[], max_trace_order=scale["trace_steps"], timeout=None)
+        with quiet_stdio():
+            sys.stdin = io.StringIO(stdin)
+            try:
+                with tracer:
+                    fn()
+            except ptv.MaxTraceOrderExceededException:
+                pass
+        events["n"] = tracer.trace_order
+    run()
+    return run, events["n"], {"events": events["n"]}
+
+
+@benchmark("compress_trace_coverage/long_trace")
+def _bench_compress(scale, rng, workdir):
+    from python_gen_trace_added_data import compress_trace_coverage, detect_complete_loops
+    trace, code = synthetic_trace(rng, scale["trace_steps"], scale["trace_vars"])
+    loops = detect_complete_loops(code)
+    return (lambda: compress_trace_coverage(trace, loops)), scale["trace_steps"], {"loops": loops}
+
+
+# ---- subprocess execution ----------------------------------------------------
+
+def _run_python(tag: str, program: Callable[[Dict[str, int]], str],
+                stdin: Callable[[Dict[str, int], random.Random], str]) -> Setup:
+    def setup(scale, rng, workdir):
+        import save_actual_output
+        path = workdir / f"run_python_{tag}.py"
+        path.write_text(program(scale), encoding="utf-8")
+        data = stdin(scale, rng)
+        runs = scale["subprocess_runs"]
+
+        def run():
+            for _ in range(runs):
+                save_actual_output.run_python(str(path), data)
+        return run, runs, {}
+    return setup
+
+
+BENCHMARKS += [
+    ("run_python/startup", _run_python("startup", lambda s: "print(input())", lambda s, r: "hello\n")),
+    ("run_python/loop_heavy", _run_python("loop_heavy", lambda s: loop_program(), lambda s, r: loop_input(r, s["loop_n"]))),
+    ("run_python/big_output", _run_python("big_output", lambda s: big_output_program(s["big_output_lines"]), lambda s, r: "")),
+]
+
+
+# ---- end to end ---------------------------------------------------------------
+
+@benchmark("mini_pipeline/end_to_end")
+def _bench_mini_pipeline(scale, rng, workdir):
+    """
+    pairing -> test dedup + pair evaluation -> tracing -> trace compression
+    -> actual output, in process and single-threaded, on synthetic problems.
+    """
+    import dataset_curation
+    import dataset_filter
+    import python_gen_trace_added_data as gen_trace
+    import save_actual_output
+    from pipeline_utils.jsonl_io import JsonlWriter
+    ptv = _trace_module()
+
+    problems = [raw_problem(rng, pid, scale["tests"]) for pid in range(scale["problems"])]
+    dataset_filter.cp, dataset_filter.ip, dataset_filter.i_f = 2, 1, 1
+    tmp = workdir / "mini"
+    stage_time: Dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def stage(name):
+        start = time.perf_counter()
+        yield
+        stage_time[name] = stage_time.get(name, 0.0) + time.perf_counter() - start
+
+    def run():
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        records = 0
+        for pid, problem in enumerate(problems):
+            with stage("pairing"):
+                row = dataset_curation.find_matching_pairs(dict(problem))
+            with stage("evaluate"):
+                tests = dataset_filter.merged_tests(row)
+                item = None
+                for idx, (cor, inc) in enumerate(row["code_pair"]):
+                    _, _, cor_r, inc_r, _ = dataset_filter._evaluate_pair(
+                        (pid, idx, cor, inc, tests.inputs, tests.outputs, 10, str(tmp), None))
+                    if dataset_filter.meets_filter(cor_r, inc_r):
+                        item = dataset_filter.build_item(pid, idx, cor_r, inc_r, row, tests)
+                        break
+            if item is None:
+                continue
+            for case_index, stdin in enumerate(item["test_case"]["input"]):
+                path = str(tmp / f"trace_{pid}_{case_index}.json")
+                with stage("trace"):
+                    read_line, fn = ptv.create_function_from_file(item["raw_incorrect"])
+                    with quiet_stdio():
+                        ptv.trace_variable(stdin.split("\n"), fn, path, read_line, [])
+                with stage("compress"):
+                    coverage, compressed = gen_trace.compress_trace_coverage(
+                        gen_trace.open_gz(path + ".gz"), gen_trace.detect_complete_loops(item["incorrect_code"]))
+                with stage("actual_output"):
+                    code_path = tmp / f"incorrect_{pid}.py"
+                    code_path.write_text(item["raw_incorrect"], encoding="utf-8")
+                    actual = save_actual_output.run_python(str(code_path), stdin)
+                with stage("write"):
+                    with JsonlWriter(tmp / f"out_{pid}_{case_index}.jsonl.gz") as writer:
+                        writer.write(dict(item, coverage_data=coverage, trace=compressed, actual=actual))
+                records += 1
+        return records
+
+    stage_time.clear()
+    records = run()
+    first = dict(stage_time)
+    return run, scale["problems"], {"records": records, "stage_seconds_first_run": first}
+
+
+# ---- driver --------------------------------------------------------------------
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_one(name: str, setup: Setup, scale: Dict[str, int], seed: int, workdir: Path,
+            repeat: int, warmup: int) -> Dict[str, Any]:
+    # per-benchmark generator, so adding or filtering benchmarks never changes another fixture
+    rng = random.Random(f"{seed}:{name}")
+    try:
+        fn, items, meta = setup(scale, rng, workdir)
+    except ImportError as e:
+        return {"skipped": f"missing dependency: {e.name or e}"}
+
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    median = statistics.median(times)
+    return {
+        "repeat": repeat,
+        "min": min(times),
+        "median": median,
+        "mean": statistics.fmean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "items": items,
+        "us_per_item": 1e6 * median / items if items else None,
+        "meta": meta,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> List[Tuple[str, float]]:
+    """(name, new median / baseline median) for benchmarks present in both runs."""
+    ratios = []
+    for name, entry in results["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base or "median" not in entry or "median" not in base or not base["median"]:
+            continue
+        ratios.append((name, entry["median"] / base["median"]))
+    return ratios
+
+
+def main():
+    parser = argparse.ArgumentParser(description="offline benchmarks of the pipeline hot paths")
+    parser.add_argument("--scale", default="small", choices=sorted(SCALES))
+    parser.add_argument("--seed", default=0, type=int)
+    parser.add_argument("--repeat", default=5, type=int)
+    parser.add_argument("--warmup", default=1, type=int)
+    parser.add_argument("--filter", default=None, help="only benchmarks whose name contains this")
+    parser.add_argument("--out", default=None, help="result JSON (default: benchmarks/results/<scale>_<time>.json)")
+    parser.add_argument("--compare", default=None, help="baseline result JSON to compare medians against")
+    parser.add_argument("--fail_above", default=None, type=float,
+                        help="exit 1 if any median is slower than baseline by more than this ratio")
+    args = parser.parse_args()
+
+    scale = SCALES[args.scale]
+    selected = [(n, s) for n, s in BENCHMARKS if not args.filter or args.filter in n]
+    results: Dict[str, Any] = {
+        "scale": args.scale,
+        "seed": args.seed,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "git_revision": _git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "benchmarks": {},
+    }
+
+    workdir = Path(tempfile.mkdtemp(prefix="pipeline_bench_"))
+    cwd = os.getcwd()
+    # save_actual_output / the tracer create their working directories relative to cwd
+    os.chdir(workdir)
+    try:
+        for name, setup in selected:
+            entry = run_one(name, setup, scale, args.seed, workdir, args.repeat, args.warmup)
+            results["benchmarks"][name] = entry
+            if "skipped" in entry:
+                print(f"{name:<40} skipped ({entry['skipped']})")
+            else:
+                per_item = f"{entry['us_per_item']:12.2f} us/item" if entry["us_per_item"] is not None else ""
+                print(f"{name:<40} median {entry['median'] * 1000:10.2f} ms  "
+                      f"(min {entry['min'] * 1000:.2f} ms, n={entry['repeat']}) {per_item}", flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    out = Path(args.out) if args.out else ROOT / "benchmarks" / "results" / \
+        f"{args.scale}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Saved => {out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != args.scale:
+            print(f"warning: baseline scale {baseline.get('scale')} != {args.scale}")
+        worst = 0.0
+        for name, ratio in compare(results, baseline):
+            worst = max(worst, ratio)
+            flag = "  <-- slower" if args.fail_above and ratio > args.fail_above else ""
+            print(f"{name:<40} {ratio:6.2f}x baseline{flag}")
+        if args.fail_above and worst > args.fail_above:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-from datasets import load_dataset
 from tqdm import tqdm
 from multiprocessing import Pool
 import subprocess
@@ -10,9 +9,15 @@ import copy
 import argparse
 import os
 import autopep8
-import orjson
+import sys
 import multiprocessing as mp
 from black import FileMode, format_file_contents
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipeline_utils.hf_datasets import iter_language_solutions, load_local_dataset
+from pipeline_utils.jsonl_io import JsonlWriter
+
+LANGUAGE_IDS = {'cpp': 2, 'python': 3}
 THRESHOLD = 50          # 원하는 최대 거리
 
 _BLACK_MODE = FileMode(
@@ -36,12 +41,6 @@ def data_align(description, public_case, private_case, gen_case, solution, incor
         
     return data_dict
 
-def write_jsonl(path, iterator):
-    with open(path, 'wb') as f:
-        for obj in iterator:
-            f.write(orjson.dumps(obj))
-            f.write(b'\n')
-
 def remove_extra_newlines(text):
     return re.sub(r'\n\s*\n+', '\n', text)
 
@@ -187,13 +186,12 @@ def make_pair_dic(data_dict, code_type, jsonl_path):
             process_item, items, chunksize=64
         )
 
-        with open(jsonl_path, 'wb') as fp, tqdm(
+        with JsonlWriter(jsonl_path) as writer, tqdm(
             total=len(items), desc='matching-pairs'
         ) as pbar:
             for key, result in result_iter:
                 data_dict[str(key)] = result       
-                fp.write(orjson.dumps({str(key): result}))
-                fp.write(b'\n')
+                writer.write({str(key): result})
                 pbar.update()
 
     return data_dict       
@@ -201,27 +199,36 @@ def make_pair_dic(data_dict, code_type, jsonl_path):
 def process_solution_wrapper(args):
     return process_solution(*args)
 
-def process_with_multiprocessing(data, language, pool_size=100, tqdm_desc="Processing"):
+def process_with_multiprocessing(data, language, pool_size=100, tqdm_desc="Processing", total=None):
+    # `data` may be a lazy iterator (see iter_language_solutions), so tasks are streamed to the pool
     results = []
     with Pool(pool_size) as pool:
         for result in tqdm(pool.imap_unordered(
                 process_solution_wrapper, 
-                [(index, pair_data, language) for index, pair_data in enumerate(data)]
-            ), total=len(data), desc=tqdm_desc):
+                ((index, pair_data, language) for index, pair_data in enumerate(data))
+            ), total=total if total is not None else len(data), desc=tqdm_desc):
             results.append(result)
     return results
 
+
+def language_solutions(split_data, column, language):
+    """Only `language` solutions of `column`, read column-wise from the memory-mapped split"""
+    return iter_language_solutions(split_data, column, LANGUAGE_IDS[language])
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--language', type = str, help = 'cpp or python')
     parser.add_argument('--data_split', type = str, help = 'valid. test, train')
-    parser.parse_args()
+    parser.add_argument('--allow_download', action = 'store_true',
+                        help = 'allow fetching code_contests from the Hub (default: local cache only)')
     args = parser.parse_args()
     
     language = args.language
     data_split = args.data_split
 
-    ds = load_dataset("deepmind/code_contests")
+    # Only the requested split is opened; columns are read lazily from the Arrow cache
+    ds = {data_split: load_local_dataset("deepmind/code_contests", split=data_split,
+                                         offline=not args.allow_download)}
         
     # Choose data by data_split
     if data_split == 'test':
@@ -230,8 +237,8 @@ def main():
         private_case_test = ds['test']['private_tests']
         gen_case_test = ds['test']['generated_tests']
             
-        correct_results = process_with_multiprocessing(ds['test']['solutions'], language=language, tqdm_desc = 'Processing Correct data')
-        incorrect_results = process_with_multiprocessing(ds['test']['incorrect_solutions'], language=language, tqdm_desc = 'Processing Incorrect data')
+        correct_results = process_with_multiprocessing(language_solutions(ds['test'], 'solutions', language), language=language, tqdm_desc = 'Processing Correct data', total=len(ds['test']))
+        incorrect_results = process_with_multiprocessing(language_solutions(ds['test'], 'incorrect_solutions', language), language=language, tqdm_desc = 'Processing Incorrect data', total=len(ds['test']))
         
         # sorting by index
         correct_results.sort(key=lambda x: x[0])
@@ -274,8 +281,8 @@ def main():
         private_case_valid = ds['valid']['private_tests']
         gen_case_valid = ds['valid']['generated_tests']
             
-        correct_results = process_with_multiprocessing(ds['valid']['solutions'], language=language, tqdm_desc = 'Processing Correct data')
-        incorrect_results = process_with_multiprocessing(ds['valid']['incorrect_solutions'], language=language, tqdm_desc = 'Processing Incorrect data')
+        correct_results = process_with_multiprocessing(language_solutions(ds['valid'], 'solutions', language), language=language, tqdm_desc = 'Processing Correct data', total=len(ds['valid']))
+        incorrect_results = process_with_multiprocessing(language_solutions(ds['valid'], 'incorrect_solutions', language), language=language, tqdm_desc = 'Processing Incorrect data', total=len(ds['valid']))
         
         # sorting by index
         correct_results.sort(key=lambda x: x[0])
@@ -318,8 +325,8 @@ def main():
         private_case_train = ds['train']['private_tests']
         gen_case_train = ds['train']['generated_tests']
             
-        correct_results = process_with_multiprocessing(ds['train']['solutions'], language=language, tqdm_desc = 'Processing Correct data')
-        incorrect_results = process_with_multiprocessing(ds['train']['incorrect_solutions'], language=language, tqdm_desc = 'Processing Incorrect data')
+        correct_results = process_with_multiprocessing(language_solutions(ds['train'], 'solutions', language), language=language, tqdm_desc = 'Processing Correct data', total=len(ds['train']))
+        incorrect_results = process_with_multiprocessing(language_solutions(ds['train'], 'incorrect_solutions', language), language=language, tqdm_desc = 'Processing Incorrect data', total=len(ds['train']))
         
         # sorting by index
         correct_results.sort(key=lambda x: x[0])
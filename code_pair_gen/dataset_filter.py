@@ -1,20 +1,19 @@
 from __future__ import annotations
-import argparse, concurrent.futures as cf, gzip, json, os, sys, tempfile, uuid, multiprocessing as mp
+import argparse, concurrent.futures as cf, json, os, sys, tempfile, time, uuid, multiprocessing as mp
 from collections import deque
 from math import isclose
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from tqdm import tqdm
-import wandb  
 
-def read_jsonl_gz_to_dict_list(p: str) -> List[dict]:
-    with gzip.open(p, "rt", encoding="utf-8") as fh:
-        return [json.loads(l) for l in fh]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pipeline_utils.jsonl_io import read_jsonl, write_jsonl
+from pipeline_utils.metrics import active_metrics, build_report, format_report, get_metrics, reset_metrics, timed_task
+from pipeline_utils.test_cases import DedupReport, DedupedTests, dedup_tests
+from pipeline_utils.test_priority import Observation, TestPrior, TestPriorityIndex, run_minimized
 
 def save_jsonl_gz(data: List[dict], path: str):
-    with gzip.open(path, "wt", encoding="utf-8") as fh:
-        for row in data:
-            fh.write(json.dumps(row, ensure_ascii=False) + "\n")
-    print(f"\nSaved {len(data)} items => {path}", file=sys.stderr)
+    n = write_jsonl(path, data)
+    print(f"\nSaved {n} items => {path}", file=sys.stderr)
 
 def is_float(s: str) -> bool:
     try: 
@@ -38,40 +37,76 @@ def compare_outputs(a: str, e: str) -> bool:
             if x!=y: return False
     return True
 
+def log_wandb(report:dict, args:argparse.Namespace) -> None:
+    """Optional: log the stage report to an offline wandb run (`wandb sync` later to upload)."""
+    try:
+        import wandb
+    except ImportError:
+        print("[!] --wandb given but wandb is not installed; skipped", file=sys.stderr)
+        return
+    os.environ.setdefault("WANDB_MODE", "offline")
+    run = wandb.init(project="codecontest_taco", job_type="dataset_filter", config=vars(args))
+    flat = {f"counters/{k}": v for k, v in report["counters"].items()}
+    for name, t in report["timings"].items():
+        flat.update({f"timings/{name}/{k}": v for k, v in t.items()})
+    run.log(flat)
+    run.finish()
+
 def _run_python(pid:int, idx:int, src:str, stdin:str, limit:int, tmp:str)->str:
     import subprocess, textwrap
+    metrics = active_metrics()
+    metrics.add("subprocesses")
     fp = os.path.join(
         tmp,
         f"{pid}_{idx}_{uuid.uuid4().hex}.py"
         )
     with open(fp, "w", encoding="utf-8") as f:
         f.write(textwrap.dedent(src))
+    start = time.perf_counter()
     try:
         res=subprocess.run([sys.executable,fp],
                            input=stdin,text = True,
                            capture_output = True,
                            timeout = limit,
                            errors = "replace")
+        metrics.observe("subprocess", time.perf_counter() - start)
         return res.stdout
     except subprocess.TimeoutExpired as e:
+        metrics.observe("subprocess", time.perf_counter() - start)
+        metrics.add("timeouts")
         return e.stdout or ""
     finally:
         os.remove(fp)
 
-def _evaluate_pair(task:Tuple[int,int,str,str,List[str],List[str],int,str]
-                   )->Tuple[int,int,Dict[str,List[int]],Dict[str,List[int]]]:
-    pid, idx, cor, inc, ins, outs, lim, tmp=task
-    def collect(code:str):
+# (priors per test, cp, ip, i_f) - None runs every test on both programs
+MinimizePlan = Optional[Tuple[List[TestPrior],int,int,int]]
+
+def _evaluate_pair(task:Tuple[int,int,str,str,List[str],List[str],int,str,MinimizePlan]
+                   )->Tuple[int,int,Dict[str,List[int]],Dict[str,List[int]],List[Observation]]:
+    pid, idx, cor, inc, ins, outs, lim, tmp, plan=task
+    def passes(code:str, i:int) -> bool:
+        return compare_outputs(
+            _run_python(pid,idx,code,ins[i],lim,tmp).strip().replace("\\n"," ").replace("\\t"," "),
+            outs[i].strip().replace("\\n"," ").replace("\\t"," ")
+            )
+    if plan is not None:
+        priors, need_cp, need_ip, need_if = plan
+        cor_r, inc_r, obs = run_minimized(
+            len(ins), priors,
+            lambda program, i: passes(cor if program == "cor" else inc, i),
+            need_cp, need_ip, need_if)
+        return pid, idx, cor_r, inc_r, obs
+    obs:List[Observation] = []
+    def collect(code:str, program:str):
         p, f = [], []
-        for i, stdin in enumerate(ins):
-            ok = compare_outputs(
-                _run_python(pid,idx,code,stdin,lim,tmp).strip().replace("\\n"," ").replace("\\t"," "),
-                outs[i].strip().replace("\\n"," ").replace("\\t"," ")
-                )
+        for i in range(len(ins)):
+            start = time.perf_counter()
+            ok = passes(code, i)
+            obs.append((i, program, ok, time.perf_counter() - start))
             if ok:p.append(i)
             else: f.append(i)
         return {"pass":p,"fail":f}
-    return pid, idx, collect(cor), collect(inc)
+    return pid, idx, collect(cor, "cor"), collect(inc, "inc"), obs
 
 def meets_filter(cor: Dict[str,List[int]], 
                  inc: Dict[str,List[int]]) -> bool:
@@ -80,25 +115,33 @@ def meets_filter(cor: Dict[str,List[int]],
     cor_pass_incor_fail = set(inc["fail"])
     return len(correct_pass) >= cp and len(incorrect_pass) >= ip and len(cor_pass_incor_fail) >= i_f
 
+def merged_tests(row:dict) -> DedupedTests:
+    """DeepMind public/private/generated + TACO tests of one problem, deduplicated."""
+    t_io = json.loads(row["taco_input_output"])
+    if row["test_case"]:
+        ins,outs = zip(*row["test_case"])
+        return dedup_tests(list(ins)+t_io["inputs"], list(outs)+t_io["outputs"])
+    return dedup_tests(t_io["inputs"], t_io["outputs"])
+
 def build_item(pid:int, 
                idx:int, 
                cor_r:Dict, 
                inc_r:Dict, 
-               row:dict) -> dict:
-    t_io = json.loads(row["taco_input_output"])
-    if row["test_case"]:
-        ins,outs = zip(*row["test_case"])
-        all_in = list(ins)+t_io["inputs"]
-        all_out = list(outs)+t_io["outputs"]
-    else:
-        all_in, all_out = t_io["inputs"], t_io["outputs"]
+               row:dict,
+               tests:DedupedTests) -> dict:
+    all_in, all_out = tests.inputs, tests.outputs
 
     incor_pass = list(set(inc_r["pass"]))[:ip]
     common_fail = list(set(inc_r["fail"]))[:i_f]
+    chosen = common_fail + incor_pass
 
     tc={
-        "input":[all_in[i] for i in common_fail]+[all_in[i] for i in incor_pass],
-        "output":[all_out[i] for i in common_fail]+[all_out[i] for i in incor_pass]
+        "input":[all_in[i] for i in chosen],
+        "output":[all_out[i] for i in chosen],
+        # positions in the merged (DeepMind + TACO) test list that collapsed into each test
+        "origin":[tests.origin[i] for i in chosen],
+        # outcome of the incorrect program on each test
+        "incorrect_result":["fail"]*len(common_fail)+["pass"]*len(incor_pass),
         }
 
     cor_src, inc_src = row["code_pair"][idx]
@@ -120,6 +163,8 @@ def build_item(pid:int,
         "correct_code":" ||| ".join(cor_lines),
         "incorrect_code":" ||| ".join(inc_lines),
         "statement":mod,
+        "difficulty":row.get("taco_difficulty"),
+        "skill_types":row.get("taco_skill_types"),
     }
 
 def main()->None:
@@ -133,6 +178,12 @@ def main()->None:
     ap.add_argument('--cp', type=int, default=20)
     ap.add_argument('--ip', type=int, default=3)
     ap.add_argument('--i_f', type=int, default=3)
+    ap.add_argument('--test_index', default=None,
+                    help="persistent test prioritization index (default: <language>_data/test_priority.sqlite)")
+    ap.add_argument('--no_minimize', action='store_true',
+                    help="run every test on both programs instead of the greedy minimized subset")
+    ap.add_argument('--wandb', action='store_true',
+                    help="also log the run report to wandb (offline mode unless WANDB_MODE is set)")
     args=ap.parse_args()
 
     global cp
@@ -148,7 +199,12 @@ def main()->None:
         base,
         f"{args.language}_data/{args.language}_raw_deepmind_{args.threshold}_{args.level}.jsonl.gz"
         )
-    rows = read_jsonl_gz_to_dict_list(src)
+    stage = f"dataset_filter_{args.level}"
+    stage_start = time.perf_counter()
+    reset_metrics(stage)
+    metrics = get_metrics(stage)
+    metrics.add("bytes_read", os.path.getsize(src))
+    rows = read_jsonl(src)
     print(f"[✓] Loaded {len(rows)} raw problems from {src}")
     tmp_root = tempfile.mkdtemp(prefix="eval_tmp_")
 
@@ -156,15 +212,17 @@ def main()->None:
         pid:iter(enumerate(r["code_pair"])) for pid,r in enumerate(rows)
         }
     
-    io_cache = {}
+    io_cache:Dict[int,DedupedTests] = {}
+    dedup_report = DedupReport()
     
     for pid, r in enumerate(rows):
-        t = json.loads(r["taco_input_output"])
-        if r["test_case"]:
-            ins,outs=zip(*r["test_case"])
-            io_cache[pid] = (list(ins) + t["inputs"], list(outs) + t["outputs"])
-        else:
-            io_cache[pid] = (t["inputs"], t["outputs"])
+        io_cache[pid] = merged_tests(r)
+        dedup_report.add_problem(io_cache[pid])
+    print(f"[✓] Test dedup: {dedup_report.summary()}")
+
+    test_index = TestPriorityIndex(
+        args.test_index or os.path.join(base, f"{args.language}_data/test_priority.sqlite"))
+    executions = {"run": 0, "exhaustive": 0}
 
     rr_queue:deque[int]=deque(pid_iters.keys())
     inflight:set[int]=set()
@@ -184,10 +242,13 @@ def main()->None:
                     idx, (cor, inc) = next(pid_iters[pid])
             except StopIteration:
                 return
-            ins, outs = io_cache[pid]
+            tests = io_cache[pid]
+            plan = None if args.no_minimize else (
+                test_index.priors(rows[pid]["pid"], tests.hashes), cp, ip, i_f)
             tqdm.write(f"[SUBMIT] PID={pid:<4} idx={idx:<3} queued",file=sys.stderr)
-            f = pool.submit(_evaluate_pair, 
-                            (pid,idx,cor,inc,ins,outs,args.timeout,tmp_root)
+            # pools are terminated once enough pairs are found, so workers flush after every pair
+            f = pool.submit(timed_task(_evaluate_pair, stage, "pair", flush=True),
+                            (time.time(), (pid,idx,cor,inc,tests.inputs,tests.outputs,args.timeout,tmp_root,plan))
                             )
             fut_to_pid[f]=pid
             inflight.add(pid)
@@ -210,11 +271,15 @@ def main()->None:
                     pid=fut_to_pid.pop(fut)
                     inflight.discard(pid)
                     try:
-                        pid_, idx_, cor_r, inc_r = fut.result()
+                        pid_, idx_, cor_r, inc_r, obs = fut.result()
                     except Exception as e:
                         # tqdm.write(f"[!] Worker error PID={pid}: {e}",file=sys.stderr)
                         continue
 
+                    dedup_report.add_runs(io_cache[pid_], obs)
+                    test_index.record(rows[pid_]["pid"], io_cache[pid_].hashes, obs)
+                    executions["run"] += len(obs)
+                    executions["exhaustive"] += 2 * io_cache[pid_].n_unique
                     cor_p, cor_f = len(cor_r["pass"]), len(cor_r["fail"])
                     inc_p, inc_f = len(inc_r["pass"]), len(inc_r["fail"])
                     passed = meets_filter(cor_r,inc_r)
@@ -223,7 +288,7 @@ def main()->None:
                                f"{'PASS' if passed else 'fail'}",file=sys.stderr)
 
                     if passed:
-                        final_items.append(build_item(pid_,idx_,cor_r,inc_r,rows[pid_]))
+                        final_items.append(build_item(pid_,idx_,cor_r,inc_r,rows[pid_],io_cache[pid_]))
                         finished.add(pid_); bar.update(1)
                     else:
                         next_idx[pid_]+=1
@@ -242,8 +307,17 @@ def main()->None:
             for p in procs:
                 p.join()
 
+    test_index.close()
+    print(f"[✓] Test dedup: {dedup_report.summary()}", file=sys.stderr)
+    print(f"[✓] Executions: {executions['run']:,} run / {executions['exhaustive']:,} exhaustive", file=sys.stderr)
     out=os.path.join(base,f"{args.language}_data/{args.level}_filtered.jsonl.gz")
     save_jsonl_gz(final_items,out)
 
+    metrics.add("bytes_written", os.path.getsize(out))
+    report = build_report(stage, wall=time.perf_counter() - stage_start)
+    print(format_report(report), file=sys.stderr)
+    if args.wandb:
+        log_wandb(report, args)
+
 if __name__=="__main__":
     mp.freeze_support(); main()
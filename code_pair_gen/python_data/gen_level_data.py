@@ -1,56 +1,15 @@
-import json
-import gzip
+import os
+import sys
 import random
+from collections import Counter
+from contextlib import ExitStack
 
-THRESHOLD = 50
-
-def read_jsonl_gz_to_list(data_path):
-    """
-    Reads a gzipped JSONL file and returns a list of dictionaries.
-    """
-    data = []
-    with gzip.open(data_path, 'rt', encoding='utf-8') as f:
-        for line in f:
-            data.append(json.loads(line))
-    return data
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from pipeline_utils.jsonl_io import JsonlWriter, iter_jsonl, write_jsonl
 
-def save_dict_list_to_jsonl_gz(data, data_path):
-    """
-    Saves a list of dictionaries to a gzipped JSONL file.
-    """
-    with gzip.open(data_path, 'wt', encoding='utf-8') as f:
-        for item in data:
-            f.write(json.dumps(item, ensure_ascii=False) + '\n')
-
-single_data_path = f'./python_raw_deepmind_{THRESHOLD}.jsonl.gz'
-single_data = read_jsonl_gz_to_list(single_data_path)
-
-pid_list = []
-
-no_repeat_pid_dict = {}
-for s_data in single_data:
-    pid = s_data['pid']
-    problem_type = s_data['taco_difficulty']
-    if pid not in pid_list:
-        pid_list.append(pid)
-        if problem_type not in no_repeat_pid_dict:
-            no_repeat_pid_dict[problem_type] = []
-        no_repeat_pid_dict[problem_type].append(s_data)
-print(f'pid_list: {len(pid_list)}')
-print(f'no_repeat_pid_list: {len(no_repeat_pid_dict.keys())}')
-
-for key, value in no_repeat_pid_dict.items():
-    print(f'Problem Type: {key}, Data Size: {len(value)}')
-    skill_types_list = {}
-    for item in value:
-        if item['taco_skill_types'] not in skill_types_list:
-            skill_types_list[item['taco_skill_types']] = []
-        skill_types_list[item['taco_skill_types']].append(item['pid'])
-    print(f'Skill Types: {len(skill_types_list)}')
-    for skill_type, pids in skill_types_list.items():
-        print(f'Skill Type: {skill_type}, PIDs: {len(pids)}')
-    
-total_data = []
+THRESHOLD = 50
+SAMPLE_SIZE = 200
+SEED = 42  # For reproducibility
 
 """
 Very Hard 18
@@ -60,31 +19,93 @@ Medium 300
 Easy 182
 """
 
-random.seed(42)  # For reproducibility
-total_data.extend(random.sample(no_repeat_pid_dict['VERY_HARD'], 200))
-total_data.extend(random.sample(no_repeat_pid_dict['HARD'], 200))
-total_data.extend(random.sample(no_repeat_pid_dict['MEDIUM_HARD'], 200))
-total_data.extend(random.sample(no_repeat_pid_dict['MEDIUM'], 200))
-total_data.extend(random.sample(no_repeat_pid_dict['EASY'], 200))
+LEVEL_PATHS = {
+    'VERY_HARD': f'./python_raw_deepmind_{THRESHOLD}_very_hard.jsonl.gz',
+    'HARD': f'./python_raw_deepmind_{THRESHOLD}_hard.jsonl.gz',
+    'MEDIUM_HARD': f'./python_raw_deepmind_{THRESHOLD}_medium_hard.jsonl.gz',
+    'MEDIUM': f'./python_raw_deepmind_{THRESHOLD}_medium.jsonl.gz',
+    'EASY': f'./python_raw_deepmind_{THRESHOLD}_easy.jsonl.gz',
+}
+output_path = f'./python_raw_deepmind_{THRESHOLD}_sample_1000.jsonl.gz'
 
-print(f'Total Data Size: {len(total_data)}')
 
+class Reservoir:
+    """Algorithm R: uniform sample of `size` items from a stream of unknown length."""
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.items = []
+        self.seen = 0
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            j = self.rng.randrange(self.seen)
+            if j < self.size:
+                self.items[j] = item
+
+
+def partition_levels(single_data_path):
+    """
+    One pass over the TACO∩DeepMind intersection: dedup by pid, stream every
+    record into its level file and keep a fixed-size reservoir per level.
+    """
+    seen_pid = set()
+    skill_types = {level: Counter() for level in LEVEL_PATHS}
+    level_size = Counter()
+    # one generator per level so a reservoir's draws never depend on the other levels
+    reservoirs = {level: Reservoir(SAMPLE_SIZE, random.Random(f'{SEED}_{level}')) for level in LEVEL_PATHS}
+
+    with ExitStack() as stack:
+        writers = {level: stack.enter_context(JsonlWriter(path)) for level, path in LEVEL_PATHS.items()}
+        for s_data in iter_jsonl(single_data_path):
+            pid = s_data['pid']
+            if pid in seen_pid:
+                continue
+            seen_pid.add(pid)
+
+            problem_type = s_data['taco_difficulty']
+            level_size[problem_type] += 1
+            if problem_type not in writers:
+                continue
+            writers[problem_type].write(s_data)
+            skill_types[problem_type][s_data['taco_skill_types']] += 1
+            reservoirs[problem_type].add(s_data)
+
+    return seen_pid, level_size, skill_types, reservoirs
+
+
+def main():
+    single_data_path = f'./python_raw_deepmind_{THRESHOLD}.jsonl.gz'
+    seen_pid, level_size, skill_types, reservoirs = partition_levels(single_data_path)
+
+    print(f'pid_list: {len(seen_pid)}')
+    print(f'no_repeat_pid_list: {len(level_size)}')
+
+    for key, size in level_size.items():
+        print(f'Problem Type: {key}, Data Size: {size}')
+        if key not in skill_types:
+            continue
+        print(f'Skill Types: {len(skill_types[key])}')
+        for skill_type, n_pid in skill_types[key].items():
+            print(f'Skill Type: {skill_type}, PIDs: {n_pid}')
+
+    total_data = []
+    for level, reservoir in reservoirs.items():
+        if len(reservoir.items) < SAMPLE_SIZE:
+            print(f'Warning: {level} has only {len(reservoir.items)} problems (< {SAMPLE_SIZE})')
+        total_data.extend(reservoir.items)
+
+    print(f'Total Data Size: {len(total_data)}')
+    write_jsonl(output_path, total_data)
+
+    for level, path in LEVEL_PATHS.items():
+        print(f'Saved {level.lower().replace("_", " ")} data to {path}')
+    print(f'Saved sample data to {output_path}')
 
-very_hard_path = f'./python_raw_deepmind_{THRESHOLD}_very_hard.jsonl.gz'
-hard_path = f'./python_raw_deepmind_{THRESHOLD}_hard.jsonl.gz'
-medium_hard_path = f'./python_raw_deepmind_{THRESHOLD}_medium_hard.jsonl.gz'
-medium_path = f'./python_raw_deepmind_{THRESHOLD}_medium.jsonl.gz'
-easy_path = f'./python_raw_deepmind_{THRESHOLD}_easy.jsonl.gz'
-output_path = f'./python_raw_deepmind_{THRESHOLD}_sample_1000.jsonl.gz'
 
-save_dict_list_to_jsonl_gz(no_repeat_pid_dict['VERY_HARD'], very_hard_path)
-save_dict_list_to_jsonl_gz(no_repeat_pid_dict['HARD'], hard_path)
-save_dict_list_to_jsonl_gz(no_repeat_pid_dict['MEDIUM_HARD'], medium_hard_path)
-save_dict_list_to_jsonl_gz(no_repeat_pid_dict['MEDIUM'], medium_path)
-save_dict_list_to_jsonl_gz(no_repeat_pid_dict['EASY'], easy_path)
-save_dict_list_to_jsonl_gz(total_data, output_path)
-print(f'Saved very hard data to {very_hard_path}')
-print(f'Saved hard data to {hard_path}')
-print(f'Saved medium hard data to {medium_hard_path}')
-print(f'Saved medium data to {medium_path}')
-print(f'Saved easy data to {easy_path}')        
\ No newline at end of file
+if __name__ == '__main__':
+    main()
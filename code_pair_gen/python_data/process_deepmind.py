@@ -1,26 +1,24 @@
-import json
-import gzip
-import random
-
-def read_jsonl_to_list(file_path):
-    data_list = []
-    with open(file_path, 'r', encoding='utf-8') as file:
-        for line in file:
-            data_list.append(json.loads(line.strip()))
-    return data_list
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from pipeline_utils.jsonl_io import iter_jsonl, write_jsonl
+
 THRESHOLD = 50 
 
 data_type = ['test', 'train', 'valid']
-total_data = {}
-for dt in data_type:
-    data_path = f'python_{dt}_refine_{THRESHOLD}.jsonl'
-    data_list = read_jsonl_to_list(data_path)
-    for single_data in data_list:
-        for key, value in single_data.items():
-            total_data[f'{dt}_{key}'] = value
-
-final_data = []
-for key, value in total_data.items():
+
+
+def iter_pairs():
+    """Stream python_<split>_refine records => raw_deepmind_check records (pairs + merged test cases)"""
+    for dt in data_type:
+        data_path = f'python_{dt}_refine_{THRESHOLD}.jsonl'
+        for single_data in iter_jsonl(data_path):
+            for key, value in single_data.items():
+                yield from build_record(f'{dt}_{key}', value)
+
+
+def build_record(key, value):
     save_dict = {}
     if len(value['code_pair']) != 0:
         save_dict['pid'] = key
@@ -49,10 +47,9 @@ for key, value in total_data.items():
                 test_case_list.append((gen_s_in, gen_s_out))
                 
         save_dict['test_case'] = test_case_list
-        final_data.append(save_dict)
+        yield save_dict
+
 
-with gzip.open('raw_deepmind_check.jsonl.gz', 'wt', encoding='utf-8') as f:
-    for item in final_data:
-        f.write(json.dumps(item, ensure_ascii=False) + '\n')
-print(f'Total data saved: {len(final_data)}')
-print(f'Saved to raw_deepmind_check.jsonl.gz')
\ No newline at end of file
+n_saved = write_jsonl('raw_deepmind_check.jsonl.gz', iter_pairs())
+print(f'Total data saved: {n_saved}')
+print(f'Saved to raw_deepmind_check.jsonl.gz')
@@ -1,87 +1,15 @@
-from datasets import load_dataset
-import gzip as gz
+import os
+import sys
 import json
+import argparse
 from tqdm import tqdm
-import numpy as np
-import matplotlib.pyplot as plt
 
-def read_jsonl_gz_to_list(data_path):
-    """
-    Reads a gzipped JSONL file and returns a list of dictionaries.
-    """
-    import gzip
-    data = []
-    with gzip.open(data_path, 'rt', encoding='utf-8') as f:
-        for line in f:
-            data.append(json.loads(line))
-    return data
-
-def read_json_to_list(data_path):
-    """
-    Reads a JSON file and returns a list of dictionaries.
-    """
-    with open(data_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return data
-
-def save_dict_list_to_jsonl_gz(data, data_path):
-    """
-    Saves a list of dictionaries to a gzipped JSONL file.
-    """
-    with gz.open(data_path, 'wt', encoding='utf-8') as f:
-        for item in data:
-            f.write(json.dumps(item, ensure_ascii=False) + '\n')
-
-def read_jsonl_gz_to_list(data_path):
-    """
-    Reads a gzipped JSONL file and returns a list of dictionaries.
-    """
-    data = []
-    with gz.open(data_path, 'rt', encoding='utf-8') as f:
-        for line in f:
-            data.append(json.loads(line))
-    return data
-
-total_data = {}
-dataset = load_dataset("deepmind/code_contests")
-dt = ['train', 'valid', 'test']
-target_data = 0
-for d in dt:
-    data_type = dataset[d]
-    code_contests_data = {}
-    dummy_description = None
-    for index, single_data in tqdm(enumerate(data_type)):
-        source = single_data['source']
-        assert type(source) == int, f"Source should be an integer, got {type(source)}"
-        if (source == 2) or (source == 1) :
-            target_data += 1
-            save_dict = {
-                'name': single_data['name'],
-                'description': single_data['description'],
-                'source': single_data['source'],
-                'difficulty': single_data['difficulty'],
-                'cf_contest_id': single_data['cf_contest_id'],
-                'cf_index': single_data['cf_index'],
-                'p_index': f'{d}_{index}',
-                'incorrect_length': single_data['incorrect_solutions']['language'].count(3),
-                'correct_length': single_data['solutions']['language'].count(3),
-            }
-            if source == 2:
-                code_contests_data[f'{single_data["cf_contest_id"]}_{single_data["cf_index"]}'] = save_dict
-            elif source == 1:
-                code_contests_data[single_data['name'].lower().strip()] = save_dict
-                
-    # Save Codeforces data to a JSON file
-    with open(f'codeforces_{d}.json', 'w', encoding='utf-8') as f:
-        json.dump(code_contests_data, f, ensure_ascii=False, indent=4)
-    print(f"Processed {d} data: {len(code_contests_data)} entries")
-    for key, value in code_contests_data.items():
-        if key in total_data.keys():
-            raise ValueError(f"Duplicate key found: {key}")
-        total_data[key] = value
-print(len(total_data.keys()))
-print(f"Total target data: {target_data}")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from pipeline_utils.hash_join import KeyIndex, SpilledIndex, hash_join
+from pipeline_utils.hf_datasets import load_local_dataset
+from pipeline_utils.jsonl_io import JsonlWriter, iter_jsonl
 
+THRESHOLD = 50
 
 """
 남겨야 할 데이터
@@ -91,95 +19,184 @@ difficulty
 cf_contest_id
 cf_index
 위 4가지 데이터를 따로 저장해서 code contest matching information 생성
-"""
 
-"""
 TACO 데이터셋에서 필요한 정보를 불러옴,
 URL을 바탕으로 어떤 index에 해당하는 것인지 파악해야 함.
 """
 
-taco_test_path = 'taco_test.jsonl.gz'
-taco_train_path = 'taco_train.jsonl.gz'
-taco_test_data = read_jsonl_gz_to_list(taco_test_path)
-taco_train_data = read_jsonl_gz_to_list(taco_train_path)
-taco_data = taco_test_data + taco_train_data
-print(len(taco_data))
-print(len(taco_test_data))
-print(len(taco_train_data))
-
-code_contest_dict = {}
-
-for single_taco in taco_data:
+# DeepMind columns needed for the join key (solutions are only read for --plot)
+KEY_COLUMNS = ['name', 'source', 'cf_contest_id', 'cf_index']
+LENGTH_COLUMNS = ['solutions', 'incorrect_solutions']
+
+# TACO fields copied onto raw_deepmind_check records (taco field -> output field)
+TACO_FIELDS = {
+    'skill_types': 'taco_skill_types',
+    'difficulty': 'taco_difficulty',
+    'tags': 'taco_tags',
+    'input_output': 'taco_input_output',
+    'question': 'question',
+}
+
+
+def deepmind_join_key(row):
+    """code_contests row => join key (None for sources other than CodeChef(1) / Codeforces(2))"""
+    source = row['source']
+    assert type(source) == int, f"Source should be an integer, got {type(source)}"
+    if source == 2:
+        return f'{row["cf_contest_id"]}_{row["cf_index"]}'
+    elif source == 1:
+        return row['name'].lower().strip()
+    return None
+
+
+def taco_join_key(single_taco):
+    """TACO record => join key parsed from its URL"""
+    url = single_taco['url']
     if single_taco['dataset'] == 'codeforces':
-        url = single_taco['url']
         url = url.split('/')
-        level = url[-1]
-        cid = url[-2]
-        key = f'{cid}_{level}'
-    else:
-        url = single_taco['url']
-        problem_id = url.split('problems/')[-1]
-        key = problem_id.lower().strip()
-
-    if key in total_data.keys():
-        pid = total_data[key]['p_index']
-        code_contest_dict[pid] = {
-            'taco_question': single_taco['question'],
-            'taco_tags': single_taco['tags'],
-            'taco_skill_types': single_taco['skill_types'],
-            'taco_input_output': single_taco['input_output'],
-            'taco_difficulty': single_taco['difficulty'],
-            'incorrect_length': total_data[key]['incorrect_length'],
-            'correct_length': total_data[key]['correct_length']
-        }
-        
-print(len(code_contest_dict.keys()))
-
-diff_dict = {}
-for single_code in code_contest_dict.values():
-    if single_code['taco_difficulty'] not in diff_dict:
-        diff_dict[single_code['taco_difficulty']] = {
-            'incorrect_length': [],
-            'correct_length': []
-        }
-    diff_dict[single_code['taco_difficulty']]['incorrect_length'].append(single_code['incorrect_length'])
-    diff_dict[single_code['taco_difficulty']]['correct_length'].append(single_code['correct_length'])
-    
-print(f"Total Code Contest PIDs: {len(code_contest_dict.keys())}")
-print(f'plotting diff_dict: {diff_dict.keys()}')
-
-
-# Plotting the difficulty distribution
-for difficulty, lengths in diff_dict.items():
-    plt.figure()
-    plt.title(f"Difficulty: {difficulty}")
-    plt.boxplot([lengths['incorrect_length'], lengths['correct_length']], labels=['Incorrect', 'Correct'])
-    plt.ylabel("Length")
-    plt.savefig(f"boxplot_{difficulty}.png")
-    plt.close()
-
-total_data_path = 'raw_deepmind_check.jsonl.gz'
-
-our_single_data = read_jsonl_gz_to_list(total_data_path)
-single_data = []
-
-for ss_data in our_single_data:
-    pid = ss_data['pid']
-    if pid in code_contest_dict.keys():
-        ss_data['taco_skill_types'] = code_contest_dict[pid]['taco_skill_types']
-        ss_data['taco_difficulty'] = code_contest_dict[pid]['taco_difficulty']
-        ss_data['taco_tags'] = code_contest_dict[pid]['taco_tags']
-        ss_data['taco_input_output'] = code_contest_dict[pid]['taco_input_output']
-        ss_data['question'] = code_contest_dict[pid]['taco_question']
-        single_data.append(ss_data)
-
-print(len(code_contest_dict.keys()))
-print(len(our_single_data))
-print(len(single_data))
+        return f'{url[-2]}_{url[-1]}'
+    return url.split('problems/')[-1].lower().strip()
 
-THRESHOLD = 50
 
-save_dict_list_to_jsonl_gz(single_data, f'./python_raw_deepmind_{THRESHOLD}.jsonl.gz')
-print(f"Data saved to python_raw_deepmind_{THRESHOLD}.jsonl.gz")
-print("Code contest matching information generation completed.")
+def build_deepmind_index(with_lengths=False, dump_index=False, offline=True):
+    """
+    Stream the three code_contests splits over projected columns and keep
+    only join key -> p_index (plus python solution counts when plotting).
+    Keys repeated inside a split keep the last row; keys repeated across
+    splits are an error, as before.
+    """
+    dataset = load_local_dataset("deepmind/code_contests", offline=offline)
+    columns = KEY_COLUMNS + (LENGTH_COLUMNS if with_lengths else [])
+    index = KeyIndex(unique=True)
+    target_data = 0
+
+    for d in ['train', 'valid', 'test']:
+        split_index = {}
+        for row_index, row in tqdm(enumerate(dataset[d].select_columns(columns)), desc=d):
+            key = deepmind_join_key(row)
+            if key is None:
+                continue
+            target_data += 1
+            value = {'p_index': f'{d}_{row_index}'}
+            if with_lengths:
+                value['incorrect_length'] = row['incorrect_solutions']['language'].count(3)
+                value['correct_length'] = row['solutions']['language'].count(3)
+            split_index[key] = value
 
+        if dump_index:
+            with open(f'codeforces_{d}.json', 'w', encoding='utf-8') as f:
+                json.dump(split_index, f, ensure_ascii=False, indent=4)
+        print(f"Processed {d} data: {len(split_index)} entries")
+        for key, value in split_index.items():
+            index.add(key, value)
+
+    print(len(index))
+    print(f"Total target data: {target_data}")
+    return index
+
+
+def build_taco_enrichment(index, taco_paths, spill_dir='.'):
+    """
+    Enrichment fields of matched TACO problems, keyed by DeepMind pid (p_index).
+    A later TACO record for the same pid wins.
+
+    The first pass keeps only pid -> position of the winning TACO record;
+    the second pass streams TACO again and spills the fields of those
+    records (input_output and question are the largest fields in TACO)
+    to a SpilledIndex, so memory scales with the number of pids.
+    """
+    winner = KeyIndex(unique=False)
+    lengths = {}
+
+    def locate(located, value):
+        position, single_taco = located
+        return value, position, single_taco['difficulty']
+
+    for path_index, path in enumerate(taco_paths):
+        located = (((path_index, record_index), single_taco)
+                   for record_index, single_taco in enumerate(iter_jsonl(path)))
+        for value, position, difficulty in hash_join(located, index, lambda r: taco_join_key(r[1]), locate):
+            winner.add(value['p_index'], position)
+            if 'correct_length' in value:
+                lengths[value['p_index']] = (difficulty, value['incorrect_length'], value['correct_length'])
+
+    wanted = {position: pid for pid, position in winner.items()}
+    taco_by_pid = SpilledIndex(directory=spill_dir)
+    for path_index, path in enumerate(taco_paths):
+        if path_index not in {p for p, _ in wanted}:
+            continue
+        for record_index, single_taco in enumerate(iter_jsonl(path)):
+            pid = wanted.get((path_index, record_index))
+            if pid is not None:
+                taco_by_pid.add(pid, {out: single_taco[src] for src, out in TACO_FIELDS.items()})
+    return taco_by_pid, lengths
+
+
+def plot_lengths(lengths):
+    """Optional side output: python solution count boxplots per TACO difficulty."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    diff_dict = {}
+    for difficulty, incorrect_length, correct_length in lengths.values():
+        entry = diff_dict.setdefault(difficulty, {'incorrect_length': [], 'correct_length': []})
+        entry['incorrect_length'].append(incorrect_length)
+        entry['correct_length'].append(correct_length)
+    print(f'plotting diff_dict: {diff_dict.keys()}')
+
+    # Plotting the difficulty distribution
+    for difficulty, lengths in diff_dict.items():
+        plt.figure()
+        plt.title(f"Difficulty: {difficulty}")
+        plt.boxplot([lengths['incorrect_length'], lengths['correct_length']], labels=['Incorrect', 'Correct'])
+        plt.ylabel("Length")
+        plt.savefig(f"boxplot_{difficulty}.png")
+        plt.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--plot', action='store_true', help='also save boxplot_<difficulty>.png (needs matplotlib)')
+    parser.add_argument('--dump_index', action='store_true', help='also save codeforces_<split>.json key indexes')
+    parser.add_argument('--allow_download', action='store_true',
+                        help='allow fetching code_contests from the Hub (default: local cache only)')
+    args = parser.parse_args()
+
+    index = build_deepmind_index(with_lengths=args.plot, dump_index=args.dump_index,
+                                 offline=not args.allow_download)
+
+    taco_by_pid, lengths = build_taco_enrichment(index, ['taco_test.jsonl.gz', 'taco_train.jsonl.gz'])
+    del index
+    print(f"Total Code Contest PIDs: {len(taco_by_pid)}")
+
+    if args.plot:
+        plot_lengths(lengths)
+
+    # Probe raw_deepmind_check once and enrich matched records on the fly
+    our_single_count = 0
+
+    def count(records):
+        nonlocal our_single_count
+        for record in records:
+            our_single_count += 1
+            yield record
+
+    def enrich(ss_data, fields):
+        ss_data.update(fields)
+        return ss_data
+
+    output_path = f'./python_raw_deepmind_{THRESHOLD}.jsonl.gz'
+    with taco_by_pid, JsonlWriter(output_path) as writer:
+        writer.write_many(hash_join(count(iter_jsonl('raw_deepmind_check.jsonl.gz')),
+                                    taco_by_pid, lambda r: r['pid'], enrich))
+
+    print(len(taco_by_pid))
+    print(our_single_count)
+    print(writer.count)
+    print(f"Data saved to python_raw_deepmind_{THRESHOLD}.jsonl.gz")
+    print("Code contest matching information generation completed.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,28 @@
-from datasets import load_dataset
+import os
+import sys
 import ast
 import json
-import copy
-import gzip
+import argparse
+from collections import Counter
 from typing import List, Any
 
-YOUR_HF_TOKEN = 'xxxx'  # Replace with your Hugging Face token
-taco = load_dataset('BAAI/TACO', token=YOUR_HF_TOKEN)
-train_data = taco['train']
-test_data = taco['test']
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from pipeline_utils.hf_datasets import filter_by_column, iter_projected, load_local_dataset
+from pipeline_utils.jsonl_io import write_jsonl
+
+YOUR_HF_TOKEN = None  # Hugging Face token, or set HF_TOKEN
+
+TARGET_SOURCES = ('codechef', 'codeforces')
+# Columns written to taco_<split>.jsonl.gz ('solutions' only with --with_solutions)
+TACO_COLUMNS = ['source', 'question', 'tags', 'skill_types', 'url', 'input_output', 'difficulty']
+
 
 def save_list_to_jsonl_gz(data_list, file_path):
     """
     Saves a list of dictionaries to a gzipped JSONL file.
     """
-    with gzip.open(file_path, 'wt', encoding='utf-8') as f:
-        for item in data_list:
-            f.write(json.dumps(item, ensure_ascii=False) + '\n')
-    print(f"Saved {len(data_list)} items to {file_path}")
+    n = write_jsonl(file_path, data_list)
+    print(f"Saved {n} items to {file_path}")
 
 def str_list_to_list(list_str: str) -> List[Any]:
     try:
@@ -27,76 +32,44 @@ def str_list_to_list(list_str: str) -> List[Any]:
         raise ValueError("주어진 문자열이 리스트 리터럴이 아닙니다.")
     except (SyntaxError, ValueError) as e:
         raise ValueError(f"리스트 변환 실패: {e}") from None
-    
-test_data_list = []
-train_data_list = []
-
-code_contest_count = 0
-proper_count = 0
-
-difficulty_dict = {}
-codechef_count = 0
-codeforces_count = 0
-for single_data in test_data:
-    source = single_data['source']
-    if source.strip() == 'codechef':
-        codechef_count += 1
-    elif source.strip() == 'codeforces':
-        codeforces_count += 1
-    else:
-        continue
-    
-    if single_data['difficulty'] not in difficulty_dict:
-        difficulty_dict[single_data['difficulty']] = 0
-    difficulty_dict[single_data['difficulty']] += 1
-
-    save_dict = {
-        'dataset' : source.strip(),
-        'question': single_data['question'], 
-        'tags': single_data['tags'], 
-        'skill_types': single_data['skill_types'], 
-        'url': single_data['url'], 
-        'input_output': single_data['input_output'], 
-        'solutions': single_data['solutions'], 
-        'difficulty': single_data['difficulty']
-    }
-    test_data_list.append(copy.deepcopy(save_dict))
-            
-for single_data in train_data:
-    source = single_data['source']
-    if source.strip() == 'codechef':
-        codechef_count += 1
-    elif source.strip() == 'codeforces':
-        codeforces_count += 1
-    else:
-        continue
-    
-    if single_data['difficulty'] not in difficulty_dict:
-        difficulty_dict[single_data['difficulty']] = 0
-    difficulty_dict[single_data['difficulty']] += 1
-    save_dict = {
-        'dataset' : source.strip(),
-        'question': single_data['question'], 
-        'tags': single_data['tags'], 
-        'skill_types': single_data['skill_types'], 
-        'url': single_data['url'], 
-        'input_output': single_data['input_output'], 
-        'solutions': single_data['solutions'], 
-        'difficulty': single_data['difficulty']
-    }
-    train_data_list.append(copy.deepcopy(save_dict))
-
-print(f'Codechef Count: {codechef_count}')
-print(f'Codeforces Count: {codeforces_count}')
-
-print(len(test_data_list))
-print(len(train_data_list))
-
-print(json.dumps(difficulty_dict, indent=4, ensure_ascii=False))
-total_key = 0
-for value in difficulty_dict.values():
-    total_key += value
-print(f'Total Codeforces Questions: {total_key}')
-
-save_list_to_jsonl_gz(test_data_list, 'taco_test.jsonl.gz')
-save_list_to_jsonl_gz(train_data_list, 'taco_train.jsonl.gz')
+
+
+def iter_taco_records(split_data, columns):
+    """Projected rows => taco_<split>.jsonl.gz records (same layout as before)"""
+    for single_data in iter_projected(split_data, columns):
+        save_dict = {'dataset': single_data.pop('source').strip()}
+        save_dict.update(single_data)
+        yield save_dict
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--allow_download', action='store_true',
+                        help='allow fetching BAAI/TACO from the Hub (default: local cache only)')
+    parser.add_argument('--with_solutions', action='store_true',
+                        help='also copy the (large) solutions column into the output')
+    args = parser.parse_args()
+
+    taco = load_local_dataset('BAAI/TACO', offline=not args.allow_download, token=YOUR_HF_TOKEN)
+    columns = TACO_COLUMNS + (['solutions'] if args.with_solutions else [])
+
+    source_count = Counter()
+    difficulty_dict = Counter()
+    for split, out_path in (('test', 'taco_test.jsonl.gz'), ('train', 'taco_train.jsonl.gz')):
+        # Only the source column is decoded to filter; heavy columns stay memory-mapped
+        split_data = filter_by_column(taco[split], 'source', lambda source: source.strip() in TARGET_SOURCES)
+        source_count.update(s.strip() for s in split_data['source'])
+        difficulty_dict.update(split_data['difficulty'])
+        print(len(split_data))
+        save_list_to_jsonl_gz(iter_taco_records(split_data, columns), out_path)
+
+    print(f'Codechef Count: {source_count["codechef"]}')
+    print(f'Codeforces Count: {source_count["codeforces"]}')
+
+    print(json.dumps(difficulty_dict, indent=4, ensure_ascii=False))
+    total_key = sum(difficulty_dict.values())
+    print(f'Total Codeforces Questions: {total_key}')
+
+
+if __name__ == '__main__':
+    main()
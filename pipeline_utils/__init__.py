@@ -0,0 +1 @@
+"""Helpers shared by the code_pair_gen / variable_trace / actual_output_gen stages."""
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import heapq
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple, Union
+
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+    def _loads(line: str) -> Any:
+        return orjson.loads(line)
+except ImportError:  # pragma: no cover
+    import json
+
+    def _dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, default=str)
+
+    def _loads(line: str) -> Any:
+        return json.loads(line)
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+DEFAULT_MAX_BYTES = 32 << 20      # per file
+DEFAULT_BACKUPS = 3               # rotated files kept per worker
+DEFAULT_FIELD_CHARS = 2000        # long strings (inputs, outputs, traces) are cut to this
+
+
+class DiagnosticsSink:
+    """
+    Per-process, append-only NDJSON log with size-based rotation.
+
+    Every worker writes to its own `<stage>.<os pid>.ndjson` file, so there is no
+    locking and no per-event open()/mkdir(); the handle stays open for the whole
+    process and is line-buffered, so events survive Pool.terminate(). Once the
+    file grows past `max_bytes` it is rotated to `.1`, `.2`, ... and only
+    `backups` old files are kept, which caps disk usage per worker at roughly
+    `max_bytes * (backups + 1)`. Call `merge_diagnostics` at the end of a
+    run to combine the worker files into one time-ordered log.
+
+    A sink without a directory is disabled: it writes nothing (see `disabled_sink`).
+    """
+
+    def __init__(self, directory: Optional[PathLike], stage: str,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 backups: int = DEFAULT_BACKUPS,
+                 field_chars: int = DEFAULT_FIELD_CHARS) -> None:
+        self.directory = Path(directory) if directory is not None else None
+        self.stage = stage
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.field_chars = field_chars
+        self.pid = os.getpid()
+        self.path = self.directory / f"{stage}.{self.pid}.ndjson" if self.directory is not None else None
+        self._fh: Optional[TextIO] = None
+        self._size = 0
+
+    def _open(self) -> TextIO:
+        if self._fh is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._size = self._fh.tell()
+        return self._fh
+
+    def _rotate(self) -> None:
+        self._fh.close()
+        self._fh = None
+        for i in range(self.backups, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if i == self.backups and src.exists():
+                src.unlink()
+            elif src.exists():
+                src.rename(self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups > 0:
+            self.path.rename(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+    def _clip(self, value: Any) -> Any:
+        if isinstance(value, str) and len(value) > self.field_chars:
+            return value[:self.field_chars] + f"...<{len(value) - self.field_chars} chars>"
+        return value
+
+    def log(self, event: str, **fields: Any) -> None:
+        """Append one `{"ts", "stage", "worker", "event", ...fields}` line."""
+        if self.directory is None:
+            return
+        record: Dict[str, Any] = {
+            "ts": time.time(),
+            "stage": self.stage,
+            "worker": self.pid,
+            "event": event,
+        }
+        for key, value in fields.items():
+            record[key] = self._clip(value)
+        line = _dumps(record) + "\n"
+
+        fh = self._open()
+        fh.write(line)
+        self._size += len(line.encode("utf-8", "surrogatepass"))
+        if self._size >= self.max_bytes:
+            self._rotate()
+
+    def error(self, event: str, exc: BaseException, **fields: Any) -> None:
+        """Log an exception with its class name and message."""
+        self.log(event, error_class=type(exc).__name__, error=str(exc), **fields)
+
+    def flush(self) -> None:
+        if self._fh is not None:
+            self._fh.flush()
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+_SINKS: Dict[Tuple[int, str, str], DiagnosticsSink] = {}
+_disabled = DiagnosticsSink(None, "disabled")
+
+
+def get_sink(directory: PathLike, stage: str, **kwargs: Any) -> DiagnosticsSink:
+    """
+    Return the sink of the current process for `stage`.
+
+    Keyed on os.getpid() so forked Pool workers never reuse (and interleave
+    writes into) a handle inherited from the parent.
+    """
+    key = (os.getpid(), os.fspath(directory), stage)
+    sink = _SINKS.get(key)
+    if sink is None:
+        sink = _SINKS[key] = DiagnosticsSink(directory, stage, **kwargs)
+    return sink
+
+
+def disabled_sink() -> DiagnosticsSink:
+    """A sink that writes nothing, for helpers called outside of their stage's run."""
+    return _disabled
+
+
+def flush_sinks() -> None:
+    """Flush all sinks opened in this process (call before merging)."""
+    pid = os.getpid()
+    for (owner, _, _), sink in _SINKS.items():
+        if owner == pid:
+            sink.flush()
+
+
+def _worker_files(directory: Path, stage: str) -> List[List[Path]]:
+    """Group `<stage>.<pid>.ndjson[.N]` files per worker, oldest file first."""
+    groups: Dict[str, List[Tuple[int, Path]]] = {}
+    for path in directory.glob(f"{stage}.*.ndjson*"):
+        head, _, rest = path.name.partition(".ndjson")
+        worker = head[len(stage) + 1:]
+        if not worker.isdigit():
+            continue
+        order = int(rest[1:]) if rest.startswith(".") and rest[1:].isdigit() else 0
+        groups.setdefault(worker, []).append((order, path))
+    return [[p for _, p in sorted(files, reverse=True)] for files in groups.values()]
+
+
+def _iter_worker(paths: List[Path]) -> Iterator[Tuple[float, str]]:
+    for path in paths:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                try:
+                    ts = float(_loads(line)["ts"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                yield ts, line
+
+
+def merge_diagnostics(directory: PathLike, stage: str,
+                      out_path: Optional[PathLike] = None,
+                      remove: bool = True) -> Optional[Path]:
+    """
+    Merge every worker log of `stage` into `<directory>/<stage>.ndjson`,
+    replacing the merged log of an earlier run.
+
+    Each worker file is already in time order, so a k-way heap merge keeps the
+    result ordered without loading it into memory. Worker files are removed
+    afterwards unless `remove=False`. Returns the merged path, or None if no
+    worker wrote anything.
+    """
+    flush_sinks()
+    directory = Path(directory)
+    groups = _worker_files(directory, stage)
+    if not groups:
+        return None
+
+    out = Path(out_path) if out_path is not None else directory / f"{stage}.ndjson"
+    # a fresh file per run: appending would mix earlier runs into summarize_diagnostics
+    tmp = out.with_name(f"{out.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        for _, line in heapq.merge(*(_iter_worker(g) for g in groups), key=lambda x: x[0]):
+            fh.write(line)
+    os.replace(tmp, out)
+
+    if remove:
+        for group in groups:
+            for path in group:
+                path.unlink()
+    return out
+
+
+def summarize_diagnostics(path: PathLike) -> Dict[str, Dict[str, Any]]:
+    """Count events / error classes and total elapsed time in a merged log."""
+    summary: Dict[str, Dict[str, Any]] = {}
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            rec = _loads(line)
+            name = rec.get("error_class") or rec.get("event", "?")
+            entry = summary.setdefault(name, {"count": 0, "elapsed": 0.0})
+            entry["count"] += 1
+            entry["elapsed"] += float(rec.get("elapsed", 0.0) or 0.0)
+    return summary
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from typing import Any, Callable, Dict, Generic, Hashable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def _loads(line: bytes) -> Any:
+        return orjson.loads(line)
+except ImportError:  # pragma: no cover
+    import json
+
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    def _loads(line: bytes) -> Any:
+        return json.loads(line)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+R = TypeVar("R")
+
+
+class DuplicateKeyError(ValueError):
+    """Raised when the build side of a join has the same key twice."""
+
+
+class KeyIndex(Generic[K, V]):
+    """
+    Build side of a hash join: join key -> small value.
+
+    Callers are expected to project each build row down to what the join
+    actually needs (usually an id) before inserting, so memory scales with the
+    number of keys and not with the payload of the rows.
+    """
+
+    def __init__(self, unique: bool = True) -> None:
+        self.unique = unique
+        self._index: Dict[K, V] = {}
+
+    @classmethod
+    def build(cls, rows: Iterable[Any], key_fn: Callable[[Any], Optional[K]],
+              value_fn: Callable[[Any], V], unique: bool = True) -> "KeyIndex[K, V]":
+        index: KeyIndex[K, V] = cls(unique)
+        for row in rows:
+            key = key_fn(row)
+            if key is not None:
+                index.add(key, value_fn(row))
+        return index
+
+    def add(self, key: K, value: V) -> None:
+        if self.unique and key in self._index:
+            raise DuplicateKeyError(f"Duplicate key found: {key}")
+        self._index[key] = value
+
+    def get(self, key: K) -> Optional[V]:
+        return self._index.get(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def items(self) -> Iterable[Tuple[K, V]]:
+        return self._index.items()
+
+
+class SpilledIndex(Generic[K, V]):
+    """
+    Build side of a hash join whose values are too large to keep in memory:
+    values are appended as JSON lines to a temporary file and only
+    key -> file offset stays in memory. `get` reads the value back, so it can
+    be probed by `hash_join` like a KeyIndex. A later `add` for the same key
+    wins. Use it as a context manager to remove the file.
+    """
+
+    def __init__(self, directory: Optional[str] = None) -> None:
+        fd, self.path = tempfile.mkstemp(prefix="spill_", suffix=".jsonl", dir=directory)
+        self._fh = os.fdopen(fd, "w+b")
+        self._offsets: Dict[K, int] = {}
+
+    def add(self, key: K, value: V) -> None:
+        self._fh.seek(0, os.SEEK_END)
+        self._offsets[key] = self._fh.tell()
+        self._fh.write(_dumps(value) + b"\n")
+
+    def get(self, key: K) -> Optional[V]:
+        offset = self._offsets.get(key)
+        if offset is None:
+            return None
+        self._fh.seek(offset)
+        return _loads(self._fh.readline())
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def close(self) -> None:
+        if not self._fh.closed:
+            self._fh.close()
+            os.remove(self.path)
+
+    def __enter__(self) -> "SpilledIndex[K, V]":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def hash_join(probe: Iterable[Any], index: KeyIndex[K, V], key_fn: Callable[[Any], Optional[K]],
+              merge_fn: Callable[[Any, V], R]) -> Iterator[R]:
+    """
+    Stream the probe side once and yield `merge_fn(row, value)` for every row
+    whose key is in `index` (inner join). Rows without a match are skipped.
+    """
+    for row in probe:
+        key = key_fn(row)
+        if key is None:
+            continue
+        value = index.get(key)
+        if value is not None:
+            yield merge_fn(row, value)
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+
+def load_local_dataset(name: str, *, offline: bool = True, token: Optional[str] = None, **kwargs: Any):
+    """
+    `datasets.load_dataset` against the local HF cache.
+
+    With `offline=True` no request is sent to the Hub; the Arrow files already
+    in the cache are memory-mapped, so nothing is copied into Python objects
+    until a column is actually read. Pass `offline=False` (or run once with it)
+    to populate the cache.
+    """
+    if offline:
+        os.environ["HF_DATASETS_OFFLINE"] = "1"
+        os.environ["HF_HUB_OFFLINE"] = "1"
+    import datasets
+
+    if offline:
+        # The env var is only read when `datasets` is first imported
+        datasets.config.HF_DATASETS_OFFLINE = True
+    if token is None:
+        token = os.environ.get("HF_TOKEN")
+    if token:
+        kwargs["token"] = token
+    return datasets.load_dataset(name, **kwargs)
+
+
+def filter_by_column(dataset, column: str, predicate: Callable[[Any], bool], **kwargs: Any):
+    """Filter rows by decoding only `column` (heavy columns are never touched)."""
+    return dataset.filter(predicate, input_columns=[column], **kwargs)
+
+
+def iter_projected(dataset, columns: Sequence[str], batch_size: int = 512) -> Iterator[Dict[str, Any]]:
+    """Yield rows restricted to `columns`, decoded batch by batch from Arrow."""
+    projected = dataset.select_columns(list(columns))
+    for batch in projected.iter(batch_size=batch_size):
+        for values in zip(*(batch[c] for c in columns)):
+            yield dict(zip(columns, values))
+
+
+def iter_language_solutions(dataset, column: str, language_id: int,
+                            batch_size: int = 256) -> Iterator[Dict[str, List[Any]]]:
+    """
+    Yield one `{'language': [...], 'solution': [...]}` per row of a code_contests
+    solutions column, keeping only solutions written in `language_id`.
+    Rows stay aligned with the dataset index (rows without a match yield empty lists).
+    """
+    for row in iter_projected(dataset, [column], batch_size=batch_size):
+        sols = row[column]
+        keep = [s for lang, s in zip(sols["language"], sols["solution"]) if lang == language_id]
+        yield {"language": [language_id] * len(keep), "solution": keep}
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import gzip
+import io
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+try:
+    import orjson
+
+    def _loads(line: bytes) -> Any:
+        return orjson.loads(line)
+
+    def _dumps(obj: Any) -> bytes:
+        # OPT_NON_STR_KEYS keeps int-keyed dicts (e.g. trace steps) writable like json.dumps
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:  # pragma: no cover - orjson is listed with the pipeline deps
+    import json
+
+    def _loads(line: bytes) -> Any:
+        return json.loads(line)
+
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+# Optional multi-threaded codecs. Both fall back to the stdlib single-threaded gzip.
+try:
+    from isal import igzip_threaded
+except ImportError:
+    igzip_threaded = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+_READ_BUFFER = 1 << 20
+_DEFAULT_THREADS = max(1, min(8, os.cpu_count() or 1))
+
+
+def _open_binary(path: PathLike, mode: str, threads: int) -> io.BufferedIOBase:
+    """Open `path` as a binary stream, picking the codec from the file extension."""
+    name = os.fspath(path)
+    if name.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to open {name}")
+        if mode == "rb":
+            dctx = zstandard.ZstdDecompressor()
+            return io.BufferedReader(dctx.stream_reader(open(name, "rb"), closefd=True), _READ_BUFFER)
+        cctx = zstandard.ZstdCompressor(level=3, threads=threads)
+        return cctx.stream_writer(open(name, "wb"), closefd=True)
+    if name.endswith(".gz"):
+        if igzip_threaded is not None and threads > 1:
+            return igzip_threaded.open(name, mode, threads=threads)
+        if mode == "rb":
+            return io.BufferedReader(gzip.open(name, "rb"), _READ_BUFFER)
+        # compresslevel 6 matches `gzip -6`; level 9 (the stdlib default) is several times slower
+        return gzip.open(name, "wb", compresslevel=6)
+    return open(name, mode, buffering=_READ_BUFFER)
+
+
+def iter_jsonl(path: PathLike, threads: int = _DEFAULT_THREADS) -> Iterator[Dict[str, Any]]:
+    """Yield one record per line of a (.gz / .zst / plain) JSONL file."""
+    with _open_binary(path, "rb", threads) as fh:
+        for line in fh:
+            if line.strip():
+                yield _loads(line)
+
+
+def read_jsonl(path: PathLike, threads: int = _DEFAULT_THREADS) -> List[Dict[str, Any]]:
+    """Load a whole JSONL file. Only for stages that need random access to the rows."""
+    return list(iter_jsonl(path, threads))
+
+
+class JsonlWriter:
+    """Append records to a (.gz / .zst / plain) JSONL file one at a time.
+
+    >>> with JsonlWriter("out.jsonl.gz") as w:
+    ...     for rec in records:
+    ...         w.write(rec)
+    """
+
+    def __init__(self, path: PathLike, threads: int = _DEFAULT_THREADS) -> None:
+        self.path = Path(path)
+        self.threads = threads
+        self.count = 0
+        self._fh: Optional[io.BufferedIOBase] = None
+
+    def __enter__(self) -> "JsonlWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = _open_binary(self.path, "wb", self.threads)
+        return self
+
+    def write(self, obj: Any) -> None:
+        self._fh.write(_dumps(obj) + b"\n")
+        self.count += 1
+
+    def write_many(self, objs: Iterable[Any]) -> int:
+        for obj in objs:
+            self.write(obj)
+        return self.count
+
+    def __exit__(self, *exc: Any) -> None:
+        self._fh.close()
+        self._fh = None
+
+
+def write_jsonl(path: PathLike, objs: Iterable[Any], threads: int = _DEFAULT_THREADS) -> int:
+    """Stream `objs` into `path` and return the number of records written."""
+    with JsonlWriter(path, threads) as writer:
+        return writer.write_many(objs)
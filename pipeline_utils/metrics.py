@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import atexit
+import glob
+import json
+import os
+import sys
+import time
+from multiprocessing import util as mp_util
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+# debuggingbook lives under variable_trace/; its Timer has no dependencies
+_BOOK_ROOT = str(Path(__file__).resolve().parents[1] / "variable_trace")
+if _BOOK_ROOT not in sys.path:
+    sys.path.append(_BOOK_ROOT)
+from debuggingbook.Timer import Timer  # noqa: E402
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+# Overridable from the environment so run_pipeline.py can collect every stage in one place
+METRICS_DIR_ENV = "PIPELINE_METRICS_DIR"
+METRICS_EXPORT_ENV = "PIPELINE_METRICS_EXPORT"
+DEFAULT_DIR = "./python_metrics"
+FLUSH_INTERVAL = 2.0  # seconds between snapshot rewrites in a worker
+
+
+def metrics_dir() -> Path:
+    return Path(os.environ.get(METRICS_DIR_ENV) or DEFAULT_DIR)
+
+
+def child_cpu() -> float:
+    """CPU seconds of all waited-for subprocesses of this process."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class PhaseTimer(Timer):
+    """`Timer` that also measures process CPU time and reports both on exit."""
+
+    def __init__(self, metrics: "StageMetrics", name: str) -> None:
+        super().__init__()
+        self.metrics = metrics
+        self.name = name
+        self.start_cpu = time.process_time()
+
+    def __enter__(self) -> Any:
+        self.start_cpu = time.process_time()
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_value, tb) -> None:
+        super().__exit__(exc_type, exc_value, tb)
+        self.metrics.observe(self.name, self.elapsed_time(), time.process_time() - self.start_cpu)
+
+
+class StageMetrics:
+    """
+    Per-process counters and timings of one stage.
+
+    `timer(name)` accumulates wall / CPU seconds of a phase, `observe` adds
+    an externally measured duration (e.g. queue wait) and `add` bumps a
+    counter (subprocesses, timeouts, bytes_read, bytes_written, ...). Each
+    process periodically rewrites its own `<stage>.<pid>.metrics.json`
+    snapshot, so nothing is sent through Pool IPC; `build_report` sums the
+    snapshots at the end of the stage.
+    """
+
+    def __init__(self, directory: Optional[PathLike], stage: str) -> None:
+        # directory=None: a disabled instance that counts but never writes
+        self.directory = Path(directory) if directory is not None else None
+        self.stage = stage
+        self.pid = os.getpid()
+        self.path = self.directory / f"{stage}.{self.pid}.metrics.json" if self.directory else None
+        self.counters: Dict[str, float] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.started = time.time()
+        self.child_cpu_start = child_cpu()
+        self._last_flush = time.monotonic()
+
+    def add(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name: str, wall: float, cpu: float = 0.0) -> None:
+        entry = self.timings.get(name)
+        if entry is None:
+            entry = self.timings[name] = {"count": 0, "wall": 0.0, "cpu": 0.0, "max": 0.0}
+        entry["count"] += 1
+        entry["wall"] += wall
+        entry["cpu"] += cpu
+        if wall > entry["max"]:
+            entry["max"] = wall
+        self._maybe_flush()
+
+    def timer(self, name: str) -> PhaseTimer:
+        return PhaseTimer(self, name)
+
+    def _maybe_flush(self) -> None:
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if self.directory is None:
+            return
+        snapshot = {
+            "stage": self.stage,
+            "pid": self.pid,
+            "started": self.started,
+            "updated": time.time(),
+            "child_cpu": child_cpu() - self.child_cpu_start,
+            "counters": self.counters,
+            "timings": self.timings,
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, self.path)
+
+
+_metrics: Dict[Tuple[int, str, str], StageMetrics] = {}
+_active: Optional[StageMetrics] = None
+_disabled = StageMetrics(None, "disabled")
+
+
+def get_metrics(stage: str, directory: Optional[PathLike] = None) -> StageMetrics:
+    """Cached StageMetrics of this process (one per os pid, so safe after fork)."""
+    directory = Path(directory) if directory is not None else metrics_dir()
+    key = (os.getpid(), str(directory), stage)
+    metrics = _metrics.get(key)
+    if metrics is None:
+        metrics = _metrics[key] = StageMetrics(directory, stage)
+        # Pool workers skip atexit; Finalize hooks run on their clean shutdown
+        mp_util.Finalize(metrics, metrics.flush, exitpriority=10)
+        atexit.register(metrics.flush)
+    return metrics
+
+
+def active_metrics() -> StageMetrics:
+    """
+    Metrics of the `timed_task` running in this process, for helpers that do
+    not know their stage (a disabled instance outside of a timed task).
+    """
+    return _active if _active is not None else _disabled
+
+
+def reset_metrics(stage: str, directory: Optional[PathLike] = None) -> None:
+    """Drop snapshots of an earlier run of `stage` (call once in the main process)."""
+    directory = Path(directory) if directory is not None else metrics_dir()
+    for path in glob.glob(str(directory / f"{glob.escape(stage)}.*.metrics.json")):
+        os.remove(path)
+
+
+class timed_task:
+    """
+    Picklable wrapper for Pool workers: unpacks `(enqueued_at, item)` from
+    `stamped`, records the queue wait and times `fn(item)` as `phase`.
+    With `flush=True` the snapshot is written after every task, for pools
+    that are terminated rather than closed (use it for long tasks only).
+    """
+
+    def __init__(self, fn: Callable[[Any], Any], stage: str, phase: str,
+                 directory: Optional[PathLike] = None, flush: bool = False) -> None:
+        self.fn = fn
+        self.stage = stage
+        self.phase = phase
+        self.directory = str(directory if directory is not None else metrics_dir())
+        self.flush = flush
+
+    def __call__(self, stamped: Tuple[float, Any]) -> Any:
+        global _active
+        enqueued, item = stamped
+        metrics = get_metrics(self.stage, self.directory)
+        metrics.observe("queue_wait", max(0.0, time.time() - enqueued))
+        _active = metrics
+        try:
+            with metrics.timer(self.phase):
+                return self.fn(item)
+        finally:
+            _active = None
+            if self.flush:
+                metrics.flush()
+
+
+def stamped(items: Iterable[Any]) -> Iterator[Tuple[float, Any]]:
+    """Pair each task with the time it is handed to the pool (see timed_task)."""
+    for item in items:
+        yield time.time(), item
+
+
+def build_report(stage: str, directory: Optional[PathLike] = None, wall: Optional[float] = None,
+                 export: Optional[PathLike] = None) -> Dict[str, Any]:
+    """
+    Sum the per-process snapshots of `stage` into `<stage>.report.json`.
+    With `export` (or $PIPELINE_METRICS_EXPORT) the report is also appended
+    as one line to that local NDJSON metrics file.
+    """
+    directory = Path(directory) if directory is not None else metrics_dir()
+    for metrics in list(_metrics.values()):
+        if metrics.pid == os.getpid() and metrics.stage == stage:
+            metrics.flush()
+
+    report: Dict[str, Any] = {"stage": stage, "processes": 0, "wall": wall, "child_cpu": 0.0,
+                              "counters": {}, "timings": {}, "finished": time.time()}
+    for path in sorted(glob.glob(str(directory / f"{glob.escape(stage)}.*.metrics.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        report["processes"] += 1
+        report["child_cpu"] += snapshot.get("child_cpu", 0.0)
+        for name, value in snapshot["counters"].items():
+            report["counters"][name] = report["counters"].get(name, 0) + value
+        for name, entry in snapshot["timings"].items():
+            total = report["timings"].setdefault(name, {"count": 0, "wall": 0.0, "cpu": 0.0, "max": 0.0})
+            total["count"] += entry["count"]
+            total["wall"] += entry["wall"]
+            total["cpu"] += entry["cpu"]
+            total["max"] = max(total["max"], entry["max"])
+
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / f"{stage}.report.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    export = export or os.environ.get(METRICS_EXPORT_ENV)
+    if export:
+        with open(export, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report, sort_keys=True) + "\n")
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Summary table of one stage report."""
+    lines = [f"[{report['stage']}] {report['processes']} processes"
+             + (f", wall {report['wall']:.1f}s" if report.get("wall") is not None else "")
+             + f", child process cpu {report['child_cpu']:.1f}s"]
+    lines.append(f"  {'phase':<20} {'count':>10} {'wall(s)':>10} {'cpu(s)':>10} {'mean(ms)':>10} {'max(s)':>8}")
+    for name, t in sorted(report["timings"].items(), key=lambda kv: -kv[1]["wall"]):
+        mean = 1000 * t["wall"] / t["count"] if t["count"] else 0.0
+        lines.append(f"  {name:<20} {t['count']:>10,} {t['wall']:>10.1f} {t['cpu']:>10.1f} "
+                     f"{mean:>10.2f} {t['max']:>8.2f}")
+    for name, value in sorted(report["counters"].items()):
+        shown = f"{value / (1 << 20):,.1f} MiB" if name.startswith("bytes_") else f"{value:,.0f}"
+        lines.append(f"  {name:<20} {shown:>10}")
+    return "\n".join(lines)
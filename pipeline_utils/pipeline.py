@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import ast
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+PathLike = Union[str, Path]
+
+# Bump when the fingerprint layout changes so old state never matches
+STATE_VERSION = 2
+
+
+@dataclass
+class Stage:
+    """
+    One pipeline step.
+
+    Either `argv` (run as a subprocess in `cwd`) or `fn` (called in-process)
+    is set. `inputs` / `outputs` are files or directories, relative to the
+    pipeline root. Dependencies between stages are derived from them: a stage
+    depends on every stage that produces one of its inputs. `code` lists the
+    source files whose content is part of the fingerprint, together with the
+    local modules they import (see `ImportScanner`); `params` any extra
+    setting that changes the outputs but is not visible in `argv`.
+    """
+    name: str
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    cwd: str = "."
+    argv: Optional[List[str]] = None
+    fn: Optional[Callable[[Path], None]] = None
+    code: List[str] = field(default_factory=list)
+    params: Dict[str, object] = field(default_factory=dict)
+
+
+def copy_file(src: str, dst: str) -> Callable[[Path], None]:
+    """Stage body replacing the manual `cp` between stage directories."""
+    def run(root: Path) -> None:
+        target = root / dst
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(root / src, target)
+    return run
+
+
+class FileHasher:
+    """
+    Content digests with a (size, mtime_ns) cache, so unchanged multi-GB
+    inputs are hashed only once across runs. Directories hash to the digest
+    of their sorted (relative path, file digest) list.
+    """
+
+    def __init__(self, root: Path, cache: Optional[Dict[str, List]] = None) -> None:
+        self.root = root
+        self.cache: Dict[str, List] = cache or {}
+
+    def file_digest(self, path: Path) -> str:
+        st = path.stat()
+        key = str(path.relative_to(self.root))
+        cached = self.cache.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.cache[key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def digest(self, rel: str) -> Optional[str]:
+        """None if `rel` does not exist."""
+        path = self.root / rel
+        if path.is_file():
+            return self.file_digest(path)
+        if not path.is_dir():
+            return None
+        h = hashlib.blake2b(digest_size=16)
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                child = Path(dirpath) / name
+                h.update(str(child.relative_to(path)).encode("utf-8", "surrogateescape"))
+                h.update(self.file_digest(child).encode())
+        return h.hexdigest()
+
+
+class ImportScanner:
+    """
+    Local modules a source file imports, transitively. A module is local if
+    it resolves to a file under the pipeline root from the importing file's
+    directory, the stage's `cwd`, the directory of another `code` entry or
+    the root itself (`pipeline_utils.*`). Every import in the file counts,
+    including ones inside functions and `__main__` blocks, so the closure
+    may be larger than what a run executes but never misses a module.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.parsed: Dict[Path, List[Tuple[int, str, List[str]]]] = {}
+
+    def _imports(self, path: Path) -> List[Tuple[int, str, List[str]]]:
+        """(relative level, module, imported names) of every import statement in `path`"""
+        if path not in self.parsed:
+            try:
+                tree = ast.parse(path.read_bytes(), str(path))
+            except (SyntaxError, ValueError, OSError):
+                tree = ast.Module(body=[], type_ignores=[])
+            found = []
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Import):
+                    found += [(0, alias.name, []) for alias in node.names]
+                elif isinstance(node, ast.ImportFrom):
+                    found.append((node.level, node.module or "", [alias.name for alias in node.names]))
+            self.parsed[path] = found
+        return self.parsed[path]
+
+    def _resolve(self, base: Path, module: str) -> List[Path]:
+        """`module` and the `__init__.py` of every package on the way to it; empty if not local"""
+        parts = module.split(".") if module else []
+        target = base.joinpath(*parts)
+        for candidate in (target.with_suffix(".py"), target / "__init__.py"):
+            if candidate.is_file() and _contains(str(self.root), str(candidate)):
+                packages = [base.joinpath(*parts[:i], "__init__.py") for i in range(1, len(parts))]
+                return [candidate] + [init for init in packages if init.is_file()]
+        return []
+
+    def closure(self, files: Iterable[str], cwd: str = ".") -> List[str]:
+        """Root-relative paths of the local modules `files` import, directly or not (sorted)."""
+        files = [self.root / rel for rel in files if rel.endswith(".py")]
+        search = {self.root, self.root / cwd} | {path.parent for path in files}
+        seen: Set[Path] = set()
+        todo = [path for path in files if path.is_file()]
+        while todo:
+            path = todo.pop()
+            for level, module, names in self._imports(path):
+                if level:
+                    bases = [path.parents[level - 1]]
+                else:
+                    bases = [path.parent] + sorted(search)
+                for base in bases:
+                    # `from pkg import mod` may import a submodule rather than a name
+                    found = self._resolve(base, module)
+                    for name in names:
+                        found += self._resolve(base, f"{module}.{name}" if module else name)
+                    if found:
+                        for dep in found:
+                            if dep not in seen:
+                                seen.add(dep)
+                                todo.append(dep)
+                        break
+        return sorted(str(dep.relative_to(self.root)) for dep in seen - set(files))
+
+
+def _contains(parent: str, child: str) -> bool:
+    parent_parts = Path(os.path.normpath(parent)).parts
+    return Path(os.path.normpath(child)).parts[:len(parent_parts)] == parent_parts
+
+
+class Pipeline:
+    """
+    Stage DAG with content-hash based skipping.
+
+    A stage is up to date when its fingerprint (argv, params, code and input
+    digests) equals the one recorded after its last successful run and its
+    outputs still have the recorded digests. Because a stage's input digests
+    are its producers' output digests, a producer that reruns but writes
+    identical files does not invalidate anything downstream.
+    State is kept in a JSON file next to the pipeline root.
+    """
+
+    def __init__(self, root: PathLike, stages: Sequence[Stage], state_path: Optional[PathLike] = None,
+                 log_dir: Optional[PathLike] = None) -> None:
+        self.root = Path(root).resolve()
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"duplicate stage name {stage.name!r}")
+            self.stages[stage.name] = stage
+        self.state_path = Path(state_path) if state_path else self.root / ".pipeline_state.json"
+        self.log_dir = Path(log_dir) if log_dir else self.root / "pipeline_logs"
+        self.deps = self._resolve_deps()
+        self.imports = ImportScanner(self.root)
+
+    # ---- graph -------------------------------------------------------------
+
+    def _resolve_deps(self) -> Dict[str, Set[str]]:
+        producer: Dict[str, str] = {}
+        for stage in self.stages.values():
+            for out in stage.outputs:
+                if out in producer:
+                    raise ValueError(f"{out!r} is produced by both {producer[out]!r} and {stage.name!r}")
+                producer[out] = stage.name
+
+        deps: Dict[str, Set[str]] = {}
+        for stage in self.stages.values():
+            deps[stage.name] = {
+                name for inp in stage.inputs for out, name in producer.items()
+                if name != stage.name and (_contains(out, inp) or _contains(inp, out))
+            }
+        self._check_acyclic(deps)
+        return deps
+
+    @staticmethod
+    def _check_acyclic(deps: Dict[str, Set[str]]) -> None:
+        state: Dict[str, int] = {}
+
+        def visit(name: str, chain: List[str]) -> None:
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError("cycle: " + " -> ".join(chain + [name]))
+            state[name] = 1
+            for dep in deps[name]:
+                visit(dep, chain + [name])
+            state[name] = 2
+
+        for name in deps:
+            visit(name, [])
+
+    def select(self, targets: Optional[Iterable[str]] = None) -> Set[str]:
+        """`targets` (exact names or name prefixes) plus everything they depend on."""
+        if not targets:
+            return set(self.stages)
+        wanted: Set[str] = set()
+        for target in targets:
+            matched = [n for n in self.stages if n == target or n.startswith(target)]
+            if not matched:
+                raise KeyError(f"unknown stage {target!r}")
+            wanted.update(matched)
+        todo = list(wanted)
+        while todo:
+            for dep in self.deps[todo.pop()]:
+                if dep not in wanted:
+                    wanted.add(dep)
+                    todo.append(dep)
+        return wanted
+
+    # ---- state -------------------------------------------------------------
+
+    def _load_state(self) -> Dict:
+        if self.state_path.exists():
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") == STATE_VERSION:
+                return state
+        return {"version": STATE_VERSION, "stages": {}, "files": {}}
+
+    def _save_state(self, state: Dict) -> None:
+        tmp = self.state_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.state_path)
+
+    def fingerprint(self, stage: Stage, hasher: FileHasher) -> Tuple[Optional[str], List[str]]:
+        """(fingerprint, missing inputs); the fingerprint is None when inputs are missing."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(json.dumps({"argv": stage.argv, "cwd": stage.cwd, "params": stage.params,
+                             "fn": getattr(stage.fn, "__qualname__", None)},
+                            sort_keys=True, default=str).encode())
+        missing = []
+        code = list(stage.code)
+        code += [rel for rel in self.imports.closure(stage.code, stage.cwd) if rel not in code]
+        for rel in code + list(stage.inputs):
+            digest = hasher.digest(rel)
+            if digest is None:
+                missing.append(rel)
+                continue
+            h.update(rel.encode())
+            h.update(digest.encode())
+        return (None if missing else h.hexdigest()), missing
+
+    def _outputs_intact(self, stage: Stage, recorded: Dict, hasher: FileHasher) -> bool:
+        outputs = recorded.get("outputs", {})
+        return all(outputs.get(rel) is not None and hasher.digest(rel) == outputs[rel]
+                   for rel in stage.outputs)
+
+    # ---- execution ---------------------------------------------------------
+
+    def _execute(self, stage: Stage) -> Tuple[bool, float]:
+        start = time.perf_counter()
+        if stage.fn is not None:
+            stage.fn(self.root)
+            return True, time.perf_counter() - start
+
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        with open(self.log_dir / f"{stage.name}.log", "w", encoding="utf-8") as log:
+            log.write("$ (cd {}) {}\n".format(stage.cwd, " ".join(stage.argv)))
+            log.flush()
+            proc = subprocess.run(stage.argv, cwd=self.root / stage.cwd, stdout=log,
+                                  stderr=subprocess.STDOUT, env=env)
+        return proc.returncode == 0, time.perf_counter() - start
+
+    def run(self, targets: Optional[Iterable[str]] = None, jobs: int = 1, force: Iterable[str] = (),
+            dry_run: bool = False) -> bool:
+        """
+        Run the selected stages in dependency order, `jobs` at a time.
+        `force` names (or name prefixes) are rerun even when up to date.
+        Returns False if any stage failed or could not run.
+        """
+        wanted = self.select(targets)
+        forced = {n for n in wanted for f in force if n == f or n.startswith(f)}
+        state = self._load_state()
+        hasher = FileHasher(self.root, state["files"])
+
+        pending = set(wanted)
+        done: Set[str] = set()
+        failed: Set[str] = set()
+        running: Dict[Future, Tuple[str, str]] = {}
+        ok = True
+
+        def ready(name: str) -> bool:
+            return all(dep in done or dep not in wanted for dep in self.deps[name])
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            while pending or running:
+                for name in sorted(pending):
+                    if any(dep in failed for dep in self.deps[name]):
+                        print(f"[skip-failed] {name}")
+                        pending.discard(name)
+                        failed.add(name)
+                        continue
+                    if not ready(name) or len(running) >= max(1, jobs):
+                        continue
+                    pending.discard(name)
+                    stage = self.stages[name]
+                    fp, missing = self.fingerprint(stage, hasher)
+                    if fp is None:
+                        if dry_run:
+                            # inputs of a stage that would run first are not there yet
+                            print(f"[would run] {name}")
+                            done.add(name)
+                            continue
+                        print(f"[missing] {name}: " + ", ".join(missing))
+                        failed.add(name)
+                        ok = False
+                        continue
+                    recorded = state["stages"].get(name, {})
+                    if (name not in forced and recorded.get("fingerprint") == fp
+                            and self._outputs_intact(stage, recorded, hasher)):
+                        print(f"[up-to-date] {name}")
+                        done.add(name)
+                        continue
+                    if dry_run:
+                        print(f"[would run] {name}")
+                        done.add(name)
+                        continue
+                    print(f"[run] {name}", flush=True)
+                    running[pool.submit(self._execute, stage)] = (name, fp)
+
+                if not running:
+                    continue
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, fp = running.pop(future)
+                    try:
+                        success, elapsed = future.result()
+                    except Exception as e:
+                        success, elapsed = False, 0.0
+                        print(f"[error] {name}: {e!r}", file=sys.stderr)
+                    if not success:
+                        print(f"[failed] {name} (see {self.log_dir / (name + '.log')})")
+                        failed.add(name)
+                        ok = False
+                        continue
+                    stage = self.stages[name]
+                    state["stages"][name] = {
+                        "fingerprint": fp,
+                        "outputs": {rel: hasher.digest(rel) for rel in stage.outputs},
+                        "elapsed": round(elapsed, 3),
+                        "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    }
+                    self._save_state(state)
+                    print(f"[done] {name} ({elapsed:.1f}s)", flush=True)
+                    done.add(name)
+
+        if not dry_run:
+            self._save_state(state)
+        return ok
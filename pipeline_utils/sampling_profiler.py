@@ -0,0 +1,262 @@
+"""
+Low-overhead sampling profiler for traced / executed submissions.
+
+A SIGPROF interval timer interrupts the program every `interval` seconds
+of CPU time and the handler attributes one sample to the innermost frame
+that belongs to the profiled program (so time spent inside the Tracer's
+own traceit is charged to the program line that caused it). Per-line
+samples are aggregated the way debuggingbook's PerformanceDebugger
+aggregates metrics: `metric((function, line))`, `all_metrics(function)`,
+`total(function)`, `maximum(function)`.
+
+This file only uses the standard library so it can also wrap a
+subprocess (see `run`):
+
+    python sampling_profiler.py run --out prog.profile.json --deadline 19.5 prog.py < input.txt
+    python sampling_profiler.py summarize <directory>
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import runpy
+import signal
+import sys
+import time
+import traceback
+from types import CodeType, FrameType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Location = Tuple[str, int]
+
+DEFAULT_INTERVAL = 0.005
+# Flags written into the summary; thresholds are deliberately coarse
+DEEP_RECURSION_DEPTH = 200
+HOT_LINE_SHARE = 0.5
+HOT_LINE_MIN_SAMPLES = 200
+
+
+class DeadlineExceeded(BaseException):
+    """Raised in the profiled program when `run --deadline` expires (BaseException: not caught by `except Exception`)."""
+
+
+class SamplingProfiler:
+    """
+    `with SamplingProfiler(target) as profiler: ...`
+
+    `target(code)` decides which code objects belong to the profiled program;
+    `line_offset` is added to reported line numbers (e.g. -1 for the
+    `def trace_func():` wrapper python_variable_trace puts around a program).
+    Only usable from the main thread; ITIMER_PROF does not clash with the
+    SIGALRM used by the Tracer timeout.
+    """
+
+    def __init__(self, target: Callable[[CodeType], bool], interval: float = DEFAULT_INTERVAL,
+                 line_offset: int = 0) -> None:
+        self.target = target
+        self.interval = interval
+        self.line_offset = line_offset
+        self.samples: Dict[Location, int] = {}
+        self.cumulative: Dict[Location, int] = {}
+        self.n_samples = 0
+        self.outside = 0          # samples with no program frame on the stack
+        self.max_depth = 0        # deepest stack of program frames seen
+        self.wall = 0.0
+        self.cpu = 0.0
+        self._previous_handler: Any = None
+
+    def _handler(self, signum: int, frame: Optional[FrameType]) -> None:
+        self.n_samples += 1
+        innermost: Optional[Location] = None
+        seen = set()
+        depth = 0
+        while frame is not None:
+            code = frame.f_code
+            if self.target(code):
+                location = (code.co_name, frame.f_lineno + self.line_offset)
+                depth += 1
+                if innermost is None:
+                    innermost = location
+                if location not in seen:
+                    seen.add(location)
+                    self.cumulative[location] = self.cumulative.get(location, 0) + 1
+            frame = frame.f_back
+        if innermost is None:
+            self.outside += 1
+            return
+        self.samples[innermost] = self.samples.get(innermost, 0) + 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._previous_handler = signal.signal(signal.SIGPROF, self._handler)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, tb: Any) -> None:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        self.wall = time.perf_counter() - self._start_wall
+        self.cpu = time.process_time() - self._start_cpu
+
+    # ---- PerformanceDebugger-style metric aggregation ----------------------
+
+    def metric(self, location: Location) -> Optional[float]:
+        """Seconds (samples x interval) spent with `location` innermost."""
+        if location in self.samples:
+            return self.samples[location] * self.interval
+        return None
+
+    def all_metrics(self, func: str) -> List[float]:
+        return [n * self.interval for (func_name, _), n in self.samples.items() if func_name == func]
+
+    def total(self, func: str) -> float:
+        return sum(self.all_metrics(func))
+
+    def maximum(self, func: str) -> float:
+        return max(self.all_metrics(func), default=0.0)
+
+    # ---- summary -------------------------------------------------------------
+
+    def summary(self, top: int = 10, **extra: Any) -> Dict[str, Any]:
+        program_samples = self.n_samples - self.outside
+        hot = sorted(self.samples.items(), key=lambda kv: -kv[1])[:top]
+        flags = []
+        if self.max_depth >= DEEP_RECURSION_DEPTH:
+            flags.append("deep_recursion")
+        if hot and hot[0][1] >= HOT_LINE_MIN_SAMPLES and hot[0][1] >= HOT_LINE_SHARE * max(program_samples, 1):
+            flags.append("hot_line")
+        summary = {
+            "interval": self.interval,
+            "samples": self.n_samples,
+            "program_samples": program_samples,
+            "wall": round(self.wall, 4),
+            "cpu": round(self.cpu, 4),
+            "max_depth": self.max_depth,
+            "flags": flags,
+            "hot_lines": [
+                {"function": func, "line": line, "self": n,
+                 "cumulative": self.cumulative.get((func, line), n),
+                 "share": round(n / program_samples, 4) if program_samples else 0.0}
+                for (func, line), n in hot
+            ],
+        }
+        summary.update(extra)
+        return summary
+
+    def save(self, path: str, **extra: Any) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.summary(**extra), f)
+        os.replace(tmp, path)
+
+
+def profile_path(path: str) -> str:
+    """Summary file saved beside a trace / code file."""
+    return f"{path}.profile.json"
+
+
+def summarize_profiles(directory: str, top: int = 20) -> Dict[str, Any]:
+    """Aggregate every *.profile.json under `directory`: outcome / flag counts and the costliest programs."""
+    outcomes: Dict[str, int] = {}
+    flags: Dict[str, int] = {}
+    costly: List[Tuple[float, str, Dict[str, Any]]] = []
+    n = 0
+    for path in glob.iglob(os.path.join(directory, "**", "*.profile.json"), recursive=True):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            continue
+        n += 1
+        outcome = entry.get("outcome", "unknown")
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        for flag in entry.get("flags", []):
+            flags[flag] = flags.get(flag, 0) + 1
+        costly.append((entry.get("cpu", 0.0), path, entry))
+    costly.sort(key=lambda item: -item[0])
+    return {
+        "profiles": n,
+        "outcomes": outcomes,
+        "flags": flags,
+        "costliest": [
+            {"path": path, "cpu": cpu, "outcome": entry.get("outcome"), "flags": entry.get("flags", []),
+             "hot_line": (entry.get("hot_lines") or [None])[0]}
+            for cpu, path, entry in costly[:top]
+        ],
+    }
+
+
+def _print_program_traceback(script: str) -> None:
+    """Traceback as `python script` would print it (without runpy / profiler frames)."""
+    exc_type, exc_value, tb = sys.exc_info()
+    while tb is not None and tb.tb_frame.f_code.co_filename != script:
+        tb = tb.tb_next
+    traceback.print_exception(exc_type, exc_value, tb)
+
+
+def _run(args: argparse.Namespace) -> int:
+    """Run `args.script` like `python script`, profiling it and saving the summary on any exit."""
+    # absolute, like `python script` reports it in code filenames and tracebacks
+    script = os.path.abspath(args.script)
+    sys.argv = [script]
+    sys.path[0] = os.path.dirname(script)
+
+    def on_deadline(signum: int, frame: Optional[FrameType]) -> None:
+        raise DeadlineExceeded()
+
+    if args.deadline:
+        # ITIMER_REAL fires before the parent's subprocess timeout kills us, so the summary is still written
+        signal.signal(signal.SIGALRM, on_deadline)
+        signal.setitimer(signal.ITIMER_REAL, args.deadline)
+
+    profiler = SamplingProfiler(lambda code: code.co_filename == script, interval=args.interval)
+    outcome, status = "ok", 0
+    try:
+        with profiler:
+            runpy.run_path(script, run_name="__main__")
+    except DeadlineExceeded:
+        outcome, status = "timeout", 124
+    except SystemExit as e:
+        code = e.code
+        status = code if isinstance(code, int) else (0 if code is None else 1)
+        if code is not None and not isinstance(code, int):
+            print(code, file=sys.stderr)
+        outcome = "ok" if status == 0 else "exit"
+    except RecursionError:
+        _print_program_traceback(script)
+        outcome, status = "recursion_error", 1
+    except BaseException:
+        _print_program_traceback(script)
+        outcome, status = "error", 1
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        sys.stdout.flush()
+        profiler.save(args.out, outcome=outcome, program=args.script)
+    return status
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="sampling profiler for submissions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="run a script under the profiler")
+    run.add_argument("--out", required=True)
+    run.add_argument("--interval", type=float, default=DEFAULT_INTERVAL)
+    run.add_argument("--deadline", type=float, default=None, help="wall-clock seconds before giving up")
+    run.add_argument("script")
+    summarize = sub.add_parser("summarize", help="aggregate *.profile.json files")
+    summarize.add_argument("directory")
+    summarize.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        sys.exit(_run(args))
+    print(json.dumps(summarize_profiles(args.directory, args.top), indent=2))
+
+
+if __name__ == "__main__":
+    main()
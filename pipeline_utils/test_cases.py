@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+
+def canonical_text(text: str) -> str:
+    """
+    Canonical form of a test input / output: unix newlines, no trailing
+    whitespace on any line, no leading/trailing blank lines and exactly one
+    trailing newline. Spacing inside a line is kept as is.
+    Non-string tests (TACO call-based problems) are serialised as JSON.
+    """
+    if not isinstance(text, str):
+        return json.dumps(text, sort_keys=True)
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    lines = [line.rstrip() for line in lines]
+    while lines and not lines[-1]:
+        lines.pop()
+    start = 0
+    while start < len(lines) and not lines[start]:
+        start += 1
+    return "\n".join(lines[start:]) + "\n"
+
+
+def canonical_output(text: str) -> str:
+    """Outputs are compared token-wise (see compare_outputs), so whitespace runs collapse."""
+    if not isinstance(text, str):
+        return json.dumps(text, sort_keys=True)
+    return " ".join(text.split())
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+@dataclass
+class DedupedTests:
+    """Distinct (input, output) pairs of one problem plus where they came from."""
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    hashes: List[str] = field(default_factory=list)
+    # origin[i] = original indices (in merge order) that collapsed into test i
+    origin: List[List[int]] = field(default_factory=list)
+    n_original: int = 0
+
+    @property
+    def n_unique(self) -> int:
+        return len(self.inputs)
+
+    @property
+    def n_duplicates(self) -> int:
+        return self.n_original - self.n_unique
+
+
+def dedup_tests(inputs: Sequence[str], outputs: Sequence[str]) -> DedupedTests:
+    """
+    Collapse tests whose canonical input and canonical expected output match.
+    The first occurrence is kept verbatim (canonical forms are only used as the
+    key) and first-seen order is preserved. Same input with a different
+    expected output stays separate.
+    """
+    result = DedupedTests(n_original=len(inputs))
+    position: Dict[Tuple[str, str], int] = {}
+    for i, (stdin, expected) in enumerate(zip(inputs, outputs)):
+        c_in = canonical_text(stdin)
+        key = (content_hash(c_in), canonical_output(expected))
+        j = position.get(key)
+        if j is None:
+            position[key] = len(result.inputs)
+            result.inputs.append(stdin)
+            result.outputs.append(expected)
+            result.hashes.append(key[0])
+            result.origin.append([i])
+        else:
+            result.origin[j].append(i)
+    return result
+
+
+@dataclass
+class DedupReport:
+    """Running totals of how many executions dedup saved."""
+    problems: int = 0
+    original_tests: int = 0
+    unique_tests: int = 0
+    executions_saved: int = 0
+
+    def add_problem(self, tests: DedupedTests) -> None:
+        self.problems += 1
+        self.original_tests += tests.n_original
+        self.unique_tests += tests.n_unique
+
+    def add_runs(self, tests: DedupedTests, observations: Sequence[Tuple]) -> None:
+        """
+        Record one evaluation over `tests` from its `(test index, program, ...)`
+        observations: each run of a test saved one run per duplicate collapsed
+        into it. Tests the evaluation never ran saved nothing.
+        """
+        self.executions_saved += sum(len(tests.origin[obs[0]]) - 1 for obs in observations)
+
+    def summary(self) -> str:
+        dup = self.original_tests - self.unique_tests
+        ratio = dup / self.original_tests if self.original_tests else 0.0
+        return (f"tests {self.original_tests:,} -> {self.unique_tests:,} unique "
+                f"({dup:,} duplicates, {ratio:.1%}) over {self.problems:,} problems; "
+                f"executions saved: {self.executions_saved:,}")
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+PathLike = Union[str, Path]
+
+# Observation sent back by a worker: (test index, program, passed, elapsed seconds)
+# program is "cor" (correct solution) or "inc" (incorrect solution)
+Observation = Tuple[int, str, bool, float]
+
+
+@dataclass(frozen=True)
+class TestPrior:
+    """
+    Smoothed historical behaviour of one test of one problem. `p_split` is
+    the probability that the test discriminates a pair (the correct
+    solution passes and the incorrect one fails it).
+    """
+    p_cor_pass: float = 0.5
+    p_inc_pass: float = 0.5
+    p_inc_fail: float = 0.5
+    p_split: float = 0.25
+    cost: float = 1.0
+
+
+class TestPriorityIndex:
+    """
+    Persistent per-problem test statistics (SQLite, one row per problem x test).
+
+    Tests are keyed by the content hash from pipeline_utils.test_cases, and
+    problems by their dataset pid, so statistics carry over between runs and
+    levels. Only the main process reads or writes the database; workers get
+    plain `TestPrior` lists.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS test_stats (
+        problem    TEXT NOT NULL,
+        test       TEXT NOT NULL,
+        cor_runs   INTEGER NOT NULL DEFAULT 0,
+        cor_pass   INTEGER NOT NULL DEFAULT 0,
+        inc_runs   INTEGER NOT NULL DEFAULT 0,
+        inc_pass   INTEGER NOT NULL DEFAULT 0,
+        splits     INTEGER NOT NULL DEFAULT 0,
+        both_runs  INTEGER NOT NULL DEFAULT 0,
+        time_total REAL    NOT NULL DEFAULT 0,
+        time_runs  INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (problem, test)
+    )
+    """
+
+    def __init__(self, path: PathLike) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(self.SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(test_stats)")}
+        if "both_runs" not in columns:
+            # index written before both_runs existed; priors() bounds it below by splits
+            self._db.execute("ALTER TABLE test_stats ADD COLUMN both_runs INTEGER NOT NULL DEFAULT 0")
+        self._pending = 0
+
+    def priors(self, problem: str, tests: Sequence[str], default_cost: Optional[float] = None
+               ) -> List[TestPrior]:
+        """
+        Beta(1, 1)-smoothed pass/fail probabilities and mean runtime per test.
+        The split rate is smoothed towards `p_cor_pass * p_inc_fail`, so a test
+        whose two programs were never run together falls back to treating
+        them as independent.
+        """
+        rows = {
+            row[0]: row[1:]
+            for row in self._db.execute(
+                "SELECT test, cor_runs, cor_pass, inc_runs, inc_pass, splits, both_runs, time_total, time_runs "
+                "FROM test_stats WHERE problem = ?", (problem,))
+        }
+        if default_cost is None:
+            totals = [(r[6], r[7]) for r in rows.values() if r[7]]
+            default_cost = (sum(t for t, _ in totals) / sum(n for _, n in totals)) if totals else 1.0
+
+        priors = []
+        for test in tests:
+            row = rows.get(test)
+            if row is None:
+                priors.append(TestPrior(cost=default_cost))
+                continue
+            cor_runs, cor_pass, inc_runs, inc_pass, splits, both_runs, time_total, time_runs = row
+            p_cor_pass = (cor_pass + 1) / (cor_runs + 2)
+            p_inc_pass = (inc_pass + 1) / (inc_runs + 2)
+            independent = p_cor_pass * (1.0 - p_inc_pass)
+            priors.append(TestPrior(
+                p_cor_pass=p_cor_pass,
+                p_inc_pass=p_inc_pass,
+                p_inc_fail=1.0 - p_inc_pass,
+                p_split=(splits + 2 * independent) / (max(both_runs, splits) + 2),
+                cost=max(time_total / time_runs if time_runs else default_cost, 1e-3),
+            ))
+        return priors
+
+    def record(self, problem: str, tests: Sequence[str], observations: Sequence[Observation]) -> None:
+        """Fold one pair evaluation into the statistics."""
+        per_test: Dict[int, Dict[str, Tuple[bool, float]]] = {}
+        for index, program, passed, elapsed in observations:
+            per_test.setdefault(index, {})[program] = (passed, elapsed)
+
+        params = []
+        for index, seen in per_test.items():
+            cor = seen.get("cor")
+            inc = seen.get("inc")
+            both = cor is not None and inc is not None
+            split = int(both and cor[0] and not inc[0])
+            elapsed = [e for _, e in seen.values()]
+            params.append((
+                problem, tests[index],
+                int(cor is not None), int(bool(cor and cor[0])),
+                int(inc is not None), int(bool(inc and inc[0])),
+                split, int(both), sum(elapsed), len(elapsed),
+            ))
+        self._db.executemany(
+            """
+            INSERT INTO test_stats (problem, test, cor_runs, cor_pass, inc_runs, inc_pass,
+                                    splits, both_runs, time_total, time_runs)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (problem, test) DO UPDATE SET
+                cor_runs   = cor_runs   + excluded.cor_runs,
+                cor_pass   = cor_pass   + excluded.cor_pass,
+                inc_runs   = inc_runs   + excluded.inc_runs,
+                inc_pass   = inc_pass   + excluded.inc_pass,
+                splits     = splits     + excluded.splits,
+                both_runs  = both_runs  + excluded.both_runs,
+                time_total = time_total + excluded.time_total,
+                time_runs  = time_runs  + excluded.time_runs
+            """,
+            params,
+        )
+        self._pending += 1
+        if self._pending >= 64:
+            self.commit()
+
+    def commit(self) -> None:
+        self._db.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        self.commit()
+        self._db.close()
+
+
+def run_minimized(n_tests: int,
+                  priors: Sequence[TestPrior],
+                  run: Callable[[str, int], bool],
+                  cor_pass_needed: int,
+                  inc_pass_needed: int,
+                  inc_fail_needed: int,
+                  ) -> Tuple[Dict[str, List[int]], Dict[str, List[int]], List[Observation]]:
+    """
+    Greedy, adaptive test selection for one (correct, incorrect) pair.
+
+    At every step the test with the best expected contribution to the still
+    unmet requirements per second of runtime is run (set-cover greedy with
+    historical probabilities as weights). The incorrect-fail requirement is
+    weighted by how often the test split earlier pairs rather than by its
+    plain fail rate, so tests that fail every solution (typically a wrong
+    expected output) are tried after the discriminating ones. Only the
+    programs that still have an unmet requirement are executed, and the
+    loop stops as soon as all requirements are met or they can no longer be
+    met with the tests left, so the pass/fail decision is the same as
+    running everything.
+
+    `run(program, test_index)` executes "cor" or "inc" and returns whether it passed.
+    """
+    cor: Dict[str, List[int]] = {"pass": [], "fail": []}
+    inc: Dict[str, List[int]] = {"pass": [], "fail": []}
+    observations: List[Observation] = []
+    remaining = set(range(n_tests))
+
+    while remaining:
+        need_cp = max(0, cor_pass_needed - len(cor["pass"]))
+        need_ip = max(0, inc_pass_needed - len(inc["pass"]))
+        need_if = max(0, inc_fail_needed - len(inc["fail"]))
+        if not (need_cp or need_ip or need_if):
+            break
+        if need_cp > len(remaining) or need_ip > len(remaining) or need_if > len(remaining) \
+                or need_ip + need_if > len(remaining):
+            break
+
+        def score(i: int) -> Tuple[float, int]:
+            p = priors[i]
+            gain = ((need_cp > 0) * p.p_cor_pass
+                    + (need_ip > 0) * p.p_inc_pass
+                    + (need_if > 0) * p.p_split)
+            cost = p.cost * ((need_cp > 0) + (need_ip > 0 or need_if > 0))
+            return gain / cost, -i
+
+        test = max(remaining, key=score)
+        remaining.discard(test)
+
+        if need_cp:
+            start = time.perf_counter()
+            ok = run("cor", test)
+            observations.append((test, "cor", ok, time.perf_counter() - start))
+            cor["pass" if ok else "fail"].append(test)
+        if need_ip or need_if:
+            start = time.perf_counter()
+            ok = run("inc", test)
+            observations.append((test, "inc", ok, time.perf_counter() - start))
+            inc["pass" if ok else "fail"].append(test)
+
+    return cor, inc, observations
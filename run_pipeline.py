@@ -0,0 +1,272 @@
+"""
+README 의 1️⃣ ~ 3️⃣ 단계를 하나의 DAG 로 실행.
+각 stage 의 입력 / 파라미터 / 코드 hash 가 지난 실행과 같고 출력이 그대로면 건너뜀.
+"""
+
+import os
+import sys
+import argparse
+import importlib.util
+
+from pipeline_utils.metrics import METRICS_DIR_ENV, METRICS_EXPORT_ENV
+from pipeline_utils.pipeline import Pipeline, Stage, copy_file
+
+THRESHOLD = 50
+LEVELS = ['easy', 'medium', 'medium_hard', 'hard', 'very_hard']
+SPLITS = ['test', 'valid', 'train']
+
+CP = 'code_pair_gen'
+CP_DATA = 'code_pair_gen/python_data'
+VT = 'variable_trace'
+AO = 'actual_output_gen'
+
+
+def python(script, *args):
+    return [sys.executable, script] + [str(a) for a in args]
+
+
+def build_stages(args):
+    offline = [] if not args.allow_download else ['--allow_download']
+    stages = []
+
+    # 1️⃣ code pair
+    for split in SPLITS:
+        stages.append(Stage(
+            name=f'curation_{split}',
+            cwd=CP,
+            argv=python('dataset_curation.py', '--language', 'python', '--data_split', split, *offline),
+            outputs=[f'{CP_DATA}/python_{split}_refine_{THRESHOLD}.jsonl'],
+            code=[f'{CP}/dataset_curation.py'],
+        ))
+    stages.append(Stage(
+        name='process_taco',
+        cwd=CP_DATA,
+        argv=python('process_taco.py', *offline, *(['--with_solutions'] if args.with_solutions else [])),
+        outputs=[f'{CP_DATA}/taco_test.jsonl.gz', f'{CP_DATA}/taco_train.jsonl.gz'],
+        code=[f'{CP_DATA}/process_taco.py'],
+    ))
+    stages.append(Stage(
+        name='process_deepmind',
+        cwd=CP_DATA,
+        argv=python('process_deepmind.py'),
+        inputs=[f'{CP_DATA}/python_{split}_refine_{THRESHOLD}.jsonl' for split in SPLITS],
+        outputs=[f'{CP_DATA}/raw_deepmind_check.jsonl.gz'],
+        code=[f'{CP_DATA}/process_deepmind.py'],
+    ))
+    stages.append(Stage(
+        name='process_intersection',
+        cwd=CP_DATA,
+        argv=python('process_intersection.py', *offline),
+        inputs=[f'{CP_DATA}/taco_test.jsonl.gz', f'{CP_DATA}/taco_train.jsonl.gz',
+                f'{CP_DATA}/raw_deepmind_check.jsonl.gz'],
+        outputs=[f'{CP_DATA}/python_raw_deepmind_{THRESHOLD}.jsonl.gz'],
+        code=[f'{CP_DATA}/process_intersection.py', 'pipeline_utils/hash_join.py'],
+    ))
+    stages.append(Stage(
+        name='gen_level_data',
+        cwd=CP_DATA,
+        argv=python('gen_level_data.py'),
+        inputs=[f'{CP_DATA}/python_raw_deepmind_{THRESHOLD}.jsonl.gz'],
+        outputs=[f'{CP_DATA}/python_raw_deepmind_{THRESHOLD}_{level}.jsonl.gz' for level in LEVELS]
+                + [f'{CP_DATA}/python_raw_deepmind_{THRESHOLD}_sample_1000.jsonl.gz'],
+        code=[f'{CP_DATA}/gen_level_data.py'],
+    ))
+
+    for level in args.levels:
+        filter_args = ['--threshold', THRESHOLD, '--level', level,
+                       '--cp', args.cp, '--ip', args.ip, '--i_f', args.i_f]
+        if args.no_minimize:
+            filter_args.append('--no_minimize')
+        stages.append(Stage(
+            name=f'dataset_filter_{level}',
+            cwd=CP,
+            argv=python('dataset_filter.py', *filter_args),
+            inputs=[f'{CP_DATA}/python_raw_deepmind_{THRESHOLD}_{level}.jsonl.gz'],
+            outputs=[f'{CP_DATA}/{level}_filtered.jsonl.gz'],
+            code=[f'{CP}/dataset_filter.py', 'pipeline_utils/test_cases.py', 'pipeline_utils/test_priority.py'],
+        ))
+
+        # 2️⃣ variable trace
+        if args.reduce_inputs:
+            # the reduced records take the place of the copy, so every later stage traces the short inputs
+            stages.append(Stage(
+                name=f'reduce_inputs_{level}',
+                cwd=VT,
+                argv=python('python_reduce_inputs.py', '--level', level,
+                            '--data_path', f'../{CP_DATA}/{level}_filtered.jsonl.gz',
+                            '--out', f'./python_data/{level}_filtered.jsonl.gz',
+                            '--timeout', args.reduce_timeout, '--max_tests', args.reduce_max_tests),
+                inputs=[f'{CP_DATA}/{level}_filtered.jsonl.gz'],
+                outputs=[f'{VT}/python_data/{level}_filtered.jsonl.gz',
+                         f'{VT}/python_data/{level}_filtered.summary.json'],
+                code=[f'{VT}/python_reduce_inputs.py', f'{VT}/debuggingbook/DeltaDebugger.py', f'{CP}/dataset_filter.py'],
+            ))
+        else:
+            stages.append(Stage(
+                name=f'copy_filtered_{level}',
+                fn=copy_file(f'{CP_DATA}/{level}_filtered.jsonl.gz', f'{VT}/python_data/{level}_filtered.jsonl.gz'),
+                inputs=[f'{CP_DATA}/{level}_filtered.jsonl.gz'],
+                outputs=[f'{VT}/python_data/{level}_filtered.jsonl.gz'],
+            ))
+        stages.append(Stage(
+            name=f'variable_trace_{level}',
+            cwd=VT,
+            argv=python('python_variable_trace.py', '--data_type', level),
+            inputs=[f'{VT}/python_data/{level}_filtered.jsonl.gz'],
+            outputs=[f'{VT}/python_trace/{level}'],
+            code=[f'{VT}/python_variable_trace.py'],
+        ))
+        stages.append(Stage(
+            name=f'trace_added_{level}',
+            cwd=VT,
+            argv=python('python_gen_trace_added_data.py', '--level', level),
+            inputs=[f'{VT}/python_data/{level}_filtered.jsonl.gz', f'{VT}/python_trace/{level}'],
+            outputs=[f'{VT}/python_data/{level}_filtered_tc_cov.jsonl.gz'],
+            code=[f'{VT}/python_gen_trace_added_data.py'],
+        ))
+        if args.sbfl:
+            # localization baseline only; nothing downstream reads it
+            ext = 'parquet' if importlib.util.find_spec('pyarrow') else 'npz'
+            stages.append(Stage(
+                name=f'sbfl_{level}',
+                cwd=VT,
+                argv=python('python_sbfl.py', '--level', level, '--metrics', args.sbfl_metrics,
+                            '--out', f'./python_sbfl/{level}_sbfl.{ext}'),
+                inputs=[f'{VT}/python_data/{level}_filtered.jsonl.gz'],
+                outputs=[f'{VT}/python_sbfl/{level}_sbfl.{ext}', f'{VT}/python_sbfl/{level}_sbfl.summary.json'],
+                code=[f'{VT}/python_sbfl.py', f'{VT}/debuggingbook/StatisticalDebugger.py'],
+            ))
+        if args.slice:
+            # gold locations from dynamic backward slices, next to the diff lines; nothing downstream reads it yet
+            stages.append(Stage(
+                name=f'slice_{level}',
+                cwd=VT,
+                argv=python('python_slice.py', '--level', level, '--timeout', args.slice_timeout,
+                            '--memory_mb', args.slice_memory_mb),
+                inputs=[f'{VT}/python_data/{level}_filtered.jsonl.gz'],
+                outputs=[f'{VT}/python_data/{level}_filtered_sliced.jsonl.gz',
+                         f'{VT}/python_data/{level}_filtered_sliced.summary.json'],
+                code=[f'{VT}/python_slice.py', f'{VT}/python_sbfl.py', f'{VT}/debuggingbook/Slicer.py',
+                      f'{VT}/debuggingbook/StackInspector.py'],
+            ))
+        if args.repair:
+            # APR benchmark over the incorrect programs; nothing downstream reads it
+            stages.append(Stage(
+                name=f'repair_{level}',
+                cwd=VT,
+                argv=python('python_repair.py', '--level', level, '--budget', args.repair_budget,
+                            '--test_timeout', args.repair_test_timeout),
+                inputs=[f'{VT}/python_data/{level}_filtered.jsonl.gz'],
+                outputs=[f'{VT}/python_repair/{level}_repair.jsonl.gz', f'{VT}/python_repair/{level}_repair.summary.json'],
+                code=[f'{VT}/python_repair.py', f'{VT}/python_slice.py', f'{VT}/debuggingbook/Repairer.py',
+                      f'{VT}/debuggingbook/StatisticalDebugger.py', f'{CP}/dataset_filter.py'],
+            ))
+        tc_cov = f'{level}_filtered_tc_cov.jsonl.gz'
+        if args.select_coverage:
+            stages.append(Stage(
+                name=f'select_coverage_{level}',
+                cwd=VT,
+                argv=python('python_select_coverage.py', '--level', level, '--k', args.k,
+                            '--min_pass', args.min_pass, '--min_fail', args.min_fail),
+                inputs=[f'{VT}/python_data/{tc_cov}'],
+                outputs=[f'{VT}/python_data/{level}_filtered_tc_cov_selected.jsonl.gz'],
+                code=[f'{VT}/python_select_coverage.py'],
+            ))
+            tc_cov = f'{level}_filtered_tc_cov_selected.jsonl.gz'
+
+        # 3️⃣ actual output & final
+        stages.append(Stage(
+            name=f'copy_tc_cov_{level}',
+            fn=copy_file(f'{VT}/python_data/{tc_cov}', f'{AO}/python_data/{tc_cov}'),
+            inputs=[f'{VT}/python_data/{tc_cov}'],
+            outputs=[f'{AO}/python_data/{tc_cov}'],
+        ))
+        stages.append(Stage(
+            name=f'actual_output_{level}',
+            cwd=AO,
+            argv=python('save_actual_output.py', '--data_type', level, '--data_path', f'./python_data/{tc_cov}',
+                        '--exec_mode', args.exec_mode),
+            inputs=[f'{AO}/python_data/{tc_cov}'],
+            outputs=[f'{AO}/python_data/{level}_filtered_all_tc.jsonl.gz'],
+            code=[f'{AO}/save_actual_output.py'],
+        ))
+        stages.append(Stage(
+            name=f'data_filter_{level}',
+            cwd=AO,
+            argv=python('python_data_filter.py', '--data_type', level),
+            inputs=[f'{AO}/python_data/{level}_filtered_all_tc.jsonl.gz'],
+            outputs=[f'{AO}/python_data/python_{level}_final_filtered_{d_t}.jsonl.gz' for d_t in ('single', 'all')],
+            code=[f'{AO}/python_data_filter.py'],
+        ))
+        stages.append(Stage(
+            name=f'gen_final_{level}',
+            cwd=AO,
+            argv=python('python_gen_final.py', '--level', level, '--target', args.target, '--seed', args.seed,
+                        '--strata', args.strata, '--score', args.score),
+            inputs=[f'{AO}/python_data/python_{level}_final_filtered_all.jsonl.gz'],
+            outputs=[f'{AO}/{level}_data.jsonl.gz'],
+            code=[f'{AO}/python_gen_final.py', f'{AO}/group_selection.py'],
+        ))
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='code pair -> variable trace -> actual output 전체 파이프라인')
+    parser.add_argument('targets', nargs='*',
+                        help='실행할 stage 이름 또는 prefix (예: gen_final_hard, dataset_filter_). 기본: 전체')
+    parser.add_argument('--levels', default=','.join(LEVELS), type=lambda s: [x for x in s.split(',') if x])
+    parser.add_argument('--jobs', default=1, type=int, help='동시에 실행할 stage 수 (level 별 stage 는 서로 독립)')
+    parser.add_argument('--force', action='append', default=[], help='up-to-date 여도 다시 실행할 stage (prefix 가능)')
+    parser.add_argument('--dry_run', action='store_true', help='실행될 stage 만 출력')
+    parser.add_argument('--list', action='store_true', help='stage 와 의존 관계 출력')
+    parser.add_argument('--state', default=None, help='stage 상태 파일 (기본: ./.pipeline_state.json)')
+    parser.add_argument('--metrics_file', default=None,
+                        help='stage 별 run report 를 한 줄씩 추가할 로컬 NDJSON 파일 (report 자체는 pipeline_metrics/ 에 저장)')
+    # stage parameters
+    parser.add_argument('--allow_download', action='store_true')
+    parser.add_argument('--with_solutions', action='store_true')
+    parser.add_argument('--cp', default=20, type=int)
+    parser.add_argument('--ip', default=3, type=int)
+    parser.add_argument('--i_f', default=3, type=int)
+    parser.add_argument('--no_minimize', action='store_true')
+    parser.add_argument('--select_coverage', action='store_true', help='python_select_coverage.py 단계 포함')
+    parser.add_argument('--k', default=6, type=int)
+    parser.add_argument('--min_pass', default=1, type=int)
+    parser.add_argument('--min_fail', default=1, type=int)
+    parser.add_argument('--reduce_inputs', action='store_true', help='python_reduce_inputs.py (failing input delta debugging) 로 copy_filtered 대체')
+    parser.add_argument('--reduce_timeout', default=5, type=float)
+    parser.add_argument('--reduce_max_tests', default=500, type=int)
+    parser.add_argument('--sbfl', action='store_true', help='python_sbfl.py (fault localization baseline) 단계 포함')
+    parser.add_argument('--sbfl_metrics', default='ochiai,tarantula')
+    parser.add_argument('--slice', action='store_true', help='python_slice.py (backward slice gold location) 단계 포함')
+    parser.add_argument('--slice_timeout', default=30, type=float)
+    parser.add_argument('--slice_memory_mb', default=2048, type=int)
+    parser.add_argument('--repair', action='store_true', help='python_repair.py (automated program repair benchmark) 단계 포함')
+    parser.add_argument('--repair_budget', default=60, type=float)
+    parser.add_argument('--repair_test_timeout', default=2, type=float)
+    parser.add_argument('--exec_mode', default='grouped', choices=('grouped', 'per_sample'))
+    parser.add_argument('--target', default=200, type=int)
+    parser.add_argument('--seed', default=42, type=int)
+    parser.add_argument('--strata', default='difficulty,skill,mix')
+    parser.add_argument('--score', default='balance', choices=('uniform', 'balance'))
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    # every stage writes its <stage>.report.json into one directory
+    os.environ[METRICS_DIR_ENV] = os.path.join(root, 'pipeline_metrics')
+    if args.metrics_file:
+        os.environ[METRICS_EXPORT_ENV] = os.path.abspath(args.metrics_file)
+    pipeline = Pipeline(root, build_stages(args), state_path=args.state)
+
+    if args.list:
+        for name, stage in pipeline.stages.items():
+            deps = ', '.join(sorted(pipeline.deps[name])) or '-'
+            print(f'{name:<28} <- {deps}')
+        return
+
+    ok = pipeline.run(args.targets, jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
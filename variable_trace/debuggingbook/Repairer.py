@@ -1514,11 +1514,17 @@ class Repairer(Repairer):
         population += offspring
 
         # Keep the fitter part of the population
+        self.evaluate(offspring)
         population.sort(key=self.fitness_key, reverse=True)
         population = population[:n]
 
         return population
 
+    def evaluate(self, trees: List[ast.AST]) -> None:
+        """Compute (and cache) the fitness of `trees`. To be overloaded in subclasses."""
+        for tree in trees:
+            self.fitness(tree)
+
 class Repairer(Repairer):
     def fitness_key(self, tree: ast.AST) -> Tuple[float, int]:
         """Key to be used for sorting the population"""
@@ -1920,6 +1926,563 @@ if __name__ == '__main__':
 if __name__ == '__main__':
     fitness
 
+## Parallel Fitness Evaluation
+## ---------------------------
+
+if __name__ == '__main__':
+    print('\n## Parallel Fitness Evaluation')
+
+
+
+import marshal
+import multiprocessing
+import os
+import signal
+
+from types import CodeType, FrameType
+
+class TestTimeoutError(BaseException):
+    """A test ran out of time (BaseException: not caught by `except Exception`)"""
+
+class Repairer(Repairer):
+    def __init__(self, *args: Any,
+                 workers: int = 1,
+                 test_timeout: Optional[float] = None,
+                 **kwargs: Any) -> None:
+        """Constructor. Other arguments are as in `Repairer.__init__()`.
+`workers`: processes evaluating a generation (default: 1, in this process).
+`test_timeout`: if given, seconds after which a test counts as failed."""
+        super().__init__(*args, **kwargs)
+        self.workers = workers
+        self.test_timeout = test_timeout
+        self.code_cache: Dict[str, Optional[CodeType]] = {}
+        self.fitness_bounds: Dict[str, float] = {}
+        self.best_fitness = 0.0
+        self.pool: Optional[Any] = None
+
+class Repairer(Repairer):
+    def tree_key(self, tree: ast.AST) -> str:
+        """Key identifying `tree` in the fitness and code caches"""
+        return cast(str, ast.dump(tree))
+
+    def compile_tree(self, key: str, tree: ast.AST) -> Optional[CodeType]:
+        """Compile `tree` (with `tree_key()` `key`) once; None if it does not compile"""
+        if key not in self.code_cache:
+            try:
+                code: Optional[CodeType] = \
+                    compile(cast(ast.Module, tree), '<Repairer>', 'exec')
+            except ValueError:  # Compilation error
+                code = None
+            self.code_cache[key] = code
+        return self.code_cache[key]
+
+    def record_fitness(self, key: str, fitness: float) -> float:
+        self.fitness_cache[key] = fitness
+        self.fitness_bounds.pop(key, None)
+        self.best_fitness = max(self.best_fitness, fitness)
+        return fitness
+
+    def ranking_fitness(self, tree: ast.AST) -> float:
+        """The fitness of `tree` if known; if its tests were cut short,
+the upper bound it was pruned with (which is below the best fitness)"""
+        key = self.tree_key(tree)
+        if key in self.fitness_cache:
+            return self.fitness_cache[key]
+        if key in self.fitness_bounds:
+            return self.fitness_bounds[key]
+        return self.fitness(tree)
+
+    def fitness_key(self, tree: ast.AST) -> Tuple[float, int]:
+        """Key to be used for sorting the population"""
+        tree_size = len([node for node in ast.walk(tree)])
+        return (self.ranking_fitness(tree), -tree_size)
+
+class Repairer(Repairer):
+    def call_test(self, collector: Any) -> None:
+        """Run the test of `collector`, raising `TestTimeoutError` after `test_timeout` seconds"""
+        function = self.debugger.function()
+        assert function is not None
+
+        if self.test_timeout is None:
+            function(**collector.args())
+            return
+
+        def timeout_handler(signum: int, frame: Optional[FrameType]) -> None:
+            raise TestTimeoutError()
+
+        previous_handler = signal.signal(signal.SIGALRM, timeout_handler)
+        signal.setitimer(signal.ITIMER_REAL, self.test_timeout)
+        try:
+            function(**collector.args())
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+    def run_test(self, collector: Any) -> bool:
+        """Run the test of `collector`; return True if it passed"""
+        try:
+            self.call_test(collector)
+        except (Exception, TestTimeoutError):
+            return False
+        return True
+
+    def run_test_set(self, test_set: str, validate: bool = False) -> int:
+        """As `Repairer.run_test_set()`, but with `test_timeout` per test"""
+        passed = 0
+        for c in self.debugger.collectors[test_set]:
+            try:
+                self.call_test(c)
+            except (Exception, TestTimeoutError) as err:
+                if validate and test_set == self.debugger.PASS:
+                    raise err.__class__(
+                        f"{c.id()} should have passed, but failed")
+                continue
+
+            passed += 1
+            if validate and test_set == self.debugger.FAIL:
+                raise FailureNotReproducedError(
+                    f"{c.id()} should have failed, but passed")
+
+        return passed
+
+    def run_tests_bounded(self, threshold: Optional[float] = None) -> Tuple[float, bool]:
+        """
+        Run failing, then passing tests, returning (weighted fitness, True).
+        If `threshold` is given, stop as soon as the fitness can no longer
+        reach it, returning (the still smaller upper bound, False) instead.
+        """
+        test_sets = [self.debugger.FAIL, self.debugger.PASS]
+        passed = {test_set: 0 for test_set in test_sets}
+        remaining = {test_set: len(self.debugger.collectors[test_set])
+                     for test_set in test_sets}
+
+        def fitness_if_passing(remaining: Dict[str, int]) -> float:
+            # Same expression as run_tests(), such that we get the same floats
+            fitness = 0.0
+            for test_set in [self.debugger.PASS, self.debugger.FAIL]:
+                ratio = ((passed[test_set] + remaining[test_set]) /
+                         len(self.debugger.collectors[test_set]))
+                fitness += self.weight(test_set) * ratio
+            return fitness
+
+        for test_set in test_sets:
+            for c in self.debugger.collectors[test_set]:
+                remaining[test_set] -= 1
+                if self.run_test(c):
+                    passed[test_set] += 1
+                elif threshold is not None:
+                    upper_bound = fitness_if_passing(remaining)
+                    if upper_bound < threshold:
+                        return upper_bound, False
+
+        return fitness_if_passing(remaining), True
+
+class Repairer(Repairer):
+    def run_candidate(self, names: List[str], code: CodeType,
+                      threshold: Optional[float] = None) -> Tuple[float, bool]:
+        """Define `names` by executing `code`; run tests as in `run_tests_bounded()`"""
+        # Save defs
+        original_defs: Dict[str, Any] = {}
+        for name in names:
+            if name in self.globals:
+                original_defs[name] = self.globals[name]
+            else:
+                warnings.warn(f"Couldn't find definition of {repr(name)}")
+
+        assert original_defs, f"Couldn't find any definition"
+
+        function = self.debugger.function()
+        assert function is not None
+        assert hasattr(function, '__globals__')
+
+        try:
+            # Execute new code, defining new functions in `self.globals`
+            exec(code, self.globals)
+            for name in original_defs:
+                function.__globals__[name] = self.globals[name]  # type: ignore
+
+            return self.run_tests_bounded(threshold)
+
+        finally:
+            # Restore definitions
+            for name in original_defs:
+                function.__globals__[name] = original_defs[name]  # type: ignore
+                self.globals[name] = original_defs[name]
+
+class Repairer(Repairer):
+    def fitness(self, tree: ast.AST) -> float:
+        """Test `tree`, returning its fitness"""
+        key = self.tree_key(tree)
+        if key in self.fitness_cache:
+            return self.fitness_cache[key]
+
+        if self.log >= 3:
+            print("Repair candidate:")
+            print_content(ast.unparse(tree), '.py')
+            print()
+
+        code = self.compile_tree(key, tree)
+        if code is None:
+            fitness = 0.0
+        else:
+            fitness, _ = self.run_candidate(self.toplevel_defs(tree), code)
+
+        if self.log >= 3:
+            print(f"Fitness = {fitness}")
+
+        return self.record_fitness(key, fitness)
+
+# The repairer whose candidates pool workers evaluate; set before forking
+_evaluating_repairer: Optional[Repairer] = None
+
+def _evaluate_candidate(args: Tuple[List[str], bytes, float]) -> Tuple[float, bool]:
+    names, code_bytes, threshold = args
+    assert _evaluating_repairer is not None
+    try:
+        return _evaluating_repairer.run_candidate(names, marshal.loads(code_bytes), threshold)
+    except Exception:
+        return 0.0, True  # e.g., defining the candidate failed
+
+class Repairer(Repairer):
+    def evaluate(self, trees: List[ast.AST]) -> None:
+        """
+        Compute the fitness of `trees` not seen before, each compiled once.
+        A candidate is cut short as soon as it can no longer reach the best
+        fitness so far; only its upper bound is known then. Such candidates
+        are ranked by that bound (see `ranking_fitness()`), so their order
+        among the losing candidates may differ from the serial `Repairer`;
+        `fitness()` still computes their exact fitness when asked.
+        With a pool (see `repair()`), candidates are evaluated in parallel.
+        """
+        candidates: Dict[str, Tuple[List[str], CodeType]] = {}
+        for tree in trees:
+            key = self.tree_key(tree)
+            if key in self.fitness_cache or key in self.fitness_bounds or key in candidates:
+                continue
+            code = self.compile_tree(key, tree)
+            if code is None:
+                self.record_fitness(key, 0.0)
+            else:
+                candidates[key] = (self.toplevel_defs(tree), code)
+
+        threshold = self.best_fitness
+        if self.pool is None:
+            results = [self.run_candidate(names, code, threshold)
+                       for names, code in candidates.values()]
+        else:
+            results = self.pool.map(
+                _evaluate_candidate,
+                [(names, marshal.dumps(code), threshold)
+                 for names, code in candidates.values()],
+                chunksize=1)
+
+        for key, (fitness, exact) in zip(candidates, results):
+            if exact:
+                self.record_fitness(key, fitness)
+            else:
+                self.fitness_bounds[key] = fitness
+
+class Repairer(Repairer):
+    def repair(self, *args: Any, **kwargs: Any) -> Tuple[ast.AST, float]:
+        """Repair as above, evaluating generations with `workers` processes"""
+        if self.workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            return super().repair(*args, **kwargs)
+
+        # Workers are forked with (a copy of) this repairer,
+        # its tests, and its globals
+        global _evaluating_repairer
+        _evaluating_repairer = self
+        with multiprocessing.get_context('fork').Pool(self.workers) as pool:
+            self.pool = pool
+            try:
+                return super().repair(*args, **kwargs)
+            finally:
+                self.pool = None
+                _evaluating_repairer = None
+
+if __name__ == '__main__':
+    parallel_repairer = Repairer(middle_debugger, workers=os.cpu_count() or 1,
+                                 test_timeout=1.0)
+    best_tree, fitness = parallel_repairer.repair()
+
+if __name__ == '__main__':
+    print_content(ast.unparse(best_tree), '.py')
+
+if __name__ == '__main__':
+    fitness
+
+## Structural Hashing and Shared Subtrees
+## --------------------------------------
+
+if __name__ == '__main__':
+    print('\n## Structural Hashing and Shared Subtrees')
+
+
+
+import hashlib
+
+def tree_digest(node: ast.AST) -> Tuple[bytes, int]:
+    """
+    Return a pair (`digest`, `size`) for `node`: a structural (Merkle) hash
+    that is equal for trees with equal `ast.dump()`, and the number of nodes.
+    Both are cached on each node, such that for a tree sharing subtrees
+    with trees seen before, only its new nodes are hashed.
+    """
+    cached = getattr(node, '_tree_digest', None)
+    # A copy (`copy.copy()`, `copy.deepcopy()`) may differ; it has to recompute
+    if cached is not None and cached[0] == id(node):
+        return cached[1], cached[2]
+
+    h = hashlib.blake2b(type(node).__name__.encode(), digest_size=16)
+    size = 1
+    for name, value in ast.iter_fields(node):
+        h.update(b'\0' + name.encode())
+        values = value if isinstance(value, list) else [value]
+        if isinstance(value, list):
+            h.update(b'[%d' % len(values))
+        for item in values:
+            if isinstance(item, ast.AST):
+                digest, item_size = tree_digest(item)
+                h.update(b'\1' + digest)
+                size += item_size
+            else:
+                h.update(b'\2' + repr(item).encode() + b'\0')
+
+    digest = h.digest()
+    node._tree_digest = (id(node), digest, size)  # type: ignore
+    return digest, size
+
+if __name__ == '__main__':
+    assert tree_digest(middle_tree()) == tree_digest(middle_tree())
+    assert tree_digest(middle_tree())[1] == len(list(ast.walk(middle_tree())))
+
+Path = List[Tuple[str, Optional[int]]]
+
+def node_path(tree: ast.AST, target: ast.AST) -> Optional[Path]:
+    """Return the (field, index) steps from `tree` to `target`; None if not found"""
+    if tree is target:
+        return []
+
+    for name, value in ast.iter_fields(tree):
+        if isinstance(value, list):
+            children = list(enumerate(value))
+        else:
+            children = [(None, value)]
+
+        for index, child in children:
+            # Statements are never found inside expressions
+            if isinstance(child, ast.AST) and not isinstance(child, ast.expr):
+                path = node_path(child, target)
+                if path is not None:
+                    return [(name, index)] + path
+
+    return None
+
+def copy_node(node: ast.AST) -> ast.AST:
+    """Return a shallow copy of `node`, with its own lists of children"""
+    new_node = copy.copy(node)
+    for name, value in ast.iter_fields(node):
+        if isinstance(value, list):
+            setattr(new_node, name, list(value))
+    return new_node
+
+def copy_path(tree: ast.AST, path: Path) -> List[ast.AST]:
+    """Copy the nodes along `path` (see `node_path()`); return the copies, starting with the new root"""
+    copies = [copy_node(tree)]
+    for name, index in path:
+        parent = copies[-1]
+        child = getattr(parent, name)
+        if index is None:
+            new_child = copy_node(child)
+            setattr(parent, name, new_child)
+        else:
+            new_child = copy_node(child[index])
+            child[index] = new_child
+        copies.append(new_child)
+    return copies
+
+class StatementMutator(StatementMutator):
+    def mutate(self, tree: ast.AST) -> ast.AST:
+        """
+        Return a mutated copy of the given AST `tree`.
+        Only the nodes on the path to the mutated statement are copied;
+        all other subtrees are shared between `tree` and the mutant.
+        """
+        assert isinstance(tree, ast.AST)
+
+        if not self.source:
+            self.source = all_statements(tree)
+
+        node = self.node_to_be_mutated(tree)
+        path = node_path(tree, node)
+        assert path, f"{self.format_node(node)}: not a statement in tree"
+
+        copies = copy_path(tree, path)
+        tree, parent, node = copies[0], copies[-2], copies[-1]
+
+        op = self.choose_op()
+        new_node = op(node)
+        self.mutations = 1
+
+        if self.log:
+            print(f"{node.lineno:4}:{op.__name__ + ':':7} "
+                  f"{self.format_node(node)} "
+                  f"becomes {self.format_node(new_node)}")
+
+        # Splice the result into the (copied) parent, like `NodeTransformer`
+        name, index = path[-1]
+        if new_node is None:
+            new_nodes = []
+        elif isinstance(new_node, ast.AST):
+            new_nodes = [new_node]
+        else:
+            new_nodes = list(new_node)
+
+        if index is None:
+            assert len(new_nodes) == 1
+            setattr(parent, name, new_nodes[0])
+        else:
+            getattr(parent, name)[index:index + 1] = new_nodes
+
+        for new_node in new_nodes:
+            if not hasattr(new_node, 'lineno'):
+                ast.copy_location(new_node, node)
+            ast.fix_missing_locations(new_node)
+
+        return tree
+
+# Have the condition mutator use the above `mutate()`, too
+class ConditionMutator(ConditionMutator, StatementMutator):
+    pass
+
+if __name__ == '__main__':
+    middle_original = middle_tree()
+    middle_dump = ast.dump(middle_original)
+    mutator = StatementMutator(log=True)
+    for i in range(10):
+        new_tree = mutator.mutate(middle_original)
+    assert ast.dump(middle_original) == middle_dump
+    print_content(ast.unparse(new_tree), '.py')
+
+class CrossoverOperator(CrossoverOperator):
+    def copy_parent(self, tree: ast.AST) -> ast.AST:
+        """Return a copy of `tree` that `crossover()` can change.
+        Subtrees are shared; `crossover_attr()` copies what it changes."""
+        return copy_node(tree)
+
+    def crossover_attr(self, t1: ast.AST, t2: ast.AST, body_attr: str) -> bool:
+        """
+        Crossover the bodies `body_attr` of two trees `t1` and `t2`,
+        which must be copies (`copy_parent()`, `copy_node()`).
+        Children are copied before descending into them.
+        Return True if successful.
+        """
+        assert isinstance(t1, ast.AST)
+        assert isinstance(t2, ast.AST)
+        assert isinstance(body_attr, str)
+
+        if not getattr(t1, body_attr, None) or not getattr(t2, body_attr, None):
+            return False
+
+        if self.crossover_branches(t1, t2):
+            return True
+
+        if self.log > 1:
+            print(f"Checking {t1}.{body_attr} x {t2}.{body_attr}")
+
+        body_1 = getattr(t1, body_attr)
+        body_2 = getattr(t2, body_attr)
+
+        # If both trees have the attribute, we can cross their bodies
+        if self.can_cross(t1, body_attr) and self.can_cross(t2, body_attr):
+            if self.log:
+                print(f"Crossing {t1}.{body_attr} x {t2}.{body_attr}")
+
+            new_body_1, new_body_2 = self.cross_bodies(body_1, body_2)
+            setattr(t1, body_attr, new_body_1)
+            setattr(t2, body_attr, new_body_2)
+            return True
+
+        def crossover_children(i: int, j: int) -> bool:
+            child_1, child_2 = copy_node(body_1[i]), copy_node(body_2[j])
+            if not self.crossover_attr(child_1, child_2, body_attr):
+                return False
+            body_1[i], body_2[j] = child_1, child_2
+            return True
+
+        # Strategy 1: Find matches in class/function of same name
+        for i, child_1 in enumerate(body_1):
+            if hasattr(child_1, 'name'):
+                for j, child_2 in enumerate(body_2):
+                    if (hasattr(child_2, 'name') and
+                           child_1.name == child_2.name):
+                        if crossover_children(i, j):
+                            return True
+
+        # Strategy 2: Find matches anywhere
+        for i in random.sample(range(len(body_1)), len(body_1)):
+            for j in random.sample(range(len(body_2)), len(body_2)):
+                if crossover_children(i, j):
+                    return True
+
+        return False
+
+class Repairer(Repairer):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Constructor. Arguments are as in `Repairer.__init__()`;
+        mutator and crossover default to the subtree-sharing ones above."""
+        kwargs.setdefault('mutator_class', StatementMutator)
+        kwargs.setdefault('crossover_class', CrossoverOperator)
+        super().__init__(*args, **kwargs)
+
+    def tree_key(self, tree: ast.AST) -> str:
+        return tree_digest(tree)[0].hex()
+
+    def fitness_key(self, tree: ast.AST) -> Tuple[float, int]:
+        """Key to be used for sorting the population"""
+        return (self.ranking_fitness(tree), -tree_digest(tree)[1])
+
+    def evolve(self, population: List[ast.AST]) -> List[ast.AST]:
+        """Evolve the candidate population by mutating and crossover,
+        sharing unchanged subtrees between parents and offspring."""
+        n = len(population)
+        # Crossover operators without `copy_parent()` change all of a tree
+        copy_parent = getattr(self.crossover, 'copy_parent', copy.deepcopy)
+
+        # Create offspring as crossover of parents
+        offspring: List[ast.AST] = []
+        while len(offspring) < n:
+            parent_1 = copy_parent(random.choice(population))
+            parent_2 = copy_parent(random.choice(population))
+            try:
+                self.crossover.crossover(parent_1, parent_2)
+            except CrossoverError:
+                pass  # Just keep parents
+            offspring += [parent_1, parent_2]
+
+        # Mutate offspring
+        offspring = [self.mutator.mutate(tree) for tree in offspring]
+
+        # Add it to population
+        population += offspring
+
+        # Keep the fitter part of the population
+        self.evaluate(offspring)
+        population.sort(key=self.fitness_key, reverse=True)
+        population = population[:n]
+
+        return population
+
+if __name__ == '__main__':
+    sharing_repairer = Repairer(middle_debugger)
+    best_tree, fitness = sharing_repairer.repair()
+
+if __name__ == '__main__':
+    print_content(ast.unparse(best_tree), '.py')
+
+if __name__ == '__main__':
+    fitness
+
 ## Limitations
 ## -----------
 
@@ -936,13 +936,15 @@ if __name__ == '__main__':
 
 from ast import NodeTransformer, NodeVisitor, Name, AST
 
+import builtins
 import typing
 
 DATA_TRACKER = '_data'
 
 def is_internal(id: str) -> bool:
     """Return True if `id` is a built-in function or type"""
-    return (id in dir(__builtins__) or id in dir(typing))
+    # Not `__builtins__`, which is a dict rather than a module when imported
+    return (id in dir(builtins) or id in dir(typing))
 
 if __name__ == '__main__':
     assert is_internal('int')
@@ -2667,6 +2669,478 @@ if __name__ == '__main__':
 if __name__ == '__main__':
     slicer
 
+### Compact Dependencies
+
+if __name__ == '__main__':
+    print('\n### Compact Dependencies')
+
+
+
+from array import array
+
+class CompactDependencies:
+    """
+    A dependency graph with integer node ids: symbol tables of variable
+    names and functions, one array entry per node, and CSR adjacency
+    (`indptr`, `indices`) for data and control edges. Pickles without
+    function objects, so it can be persisted or returned from a worker
+    process; slices are breadth-first searches over the arrays.
+    """
+
+    def __init__(self, names: List[str], functions: List[Tuple[str, str]],
+                 node_names: array, node_functions: array, node_linenos: array,
+                 data: Tuple[array, array], control: Tuple[array, array],
+                 function_objects: Optional[List[Callable]] = None) -> None:
+        """
+        `names` and `functions` (as (name, filename)) are the symbol tables
+        `node_names` and `node_functions` index into; `data` and `control`
+        are the CSR arrays (indptr, indices) of the dependencies of each node.
+        `function_objects` (parallel to `functions`) is not pickled.
+        """
+        self.names = names
+        self.functions = functions
+        self.node_names = node_names
+        self.node_functions = node_functions
+        self.node_linenos = node_linenos
+        self.data = data
+        self.control = control
+        self.function_objects = function_objects
+        self._reversed: Dict[str, Tuple[array, array]] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        state['function_objects'] = None
+        state['_reversed'] = {}
+        return state
+
+    def __len__(self) -> int:
+        """Number of nodes"""
+        return len(self.node_linenos)
+
+    def node(self, node_id: int) -> Tuple[str, Tuple[str, int]]:
+        """Node `node_id` as (var_name, (function_name, lineno))"""
+        function_name, _ = self.functions[self.node_functions[node_id]]
+        return (self.names[self.node_names[node_id]],
+                (function_name, self.node_linenos[node_id]))
+
+    def all_vars(self) -> Set[Tuple[str, Tuple[str, int]]]:
+        """All nodes, as (var_name, (function_name, lineno))"""
+        return {self.node(node_id) for node_id in range(len(self))}
+
+class CompactDependencies(CompactDependencies):
+    @classmethod
+    def from_dependencies(cls, data: Dependency,
+                          control: Dependency) -> 'CompactDependencies':
+        """Intern `data` and `control` (as in `Dependencies`)"""
+        names: List[str] = []
+        name_ids: Dict[str, int] = {}
+        functions: List[Tuple[str, str]] = []
+        function_objects: List[Callable] = []
+        function_ids: Dict[int, int] = {}  # id(function) -> function id
+        node_ids: Dict[Node, int] = {}
+        node_names = array('i')
+        node_functions = array('i')
+        node_linenos = array('i')
+
+        def intern(node: Node) -> int:
+            node_id = node_ids.get(node)
+            if node_id is not None:
+                return node_id
+
+            name, (func, lineno) = node
+            name_id = name_ids.get(name)
+            if name_id is None:
+                name_id = name_ids[name] = len(names)
+                names.append(name)
+
+            function_id = function_ids.get(id(func))
+            if function_id is None:
+                function_id = function_ids[id(func)] = len(functions)
+                code = getattr(func, '__code__', None)
+                functions.append((getattr(func, '__name__', repr(func)),
+                                  code.co_filename if code else ''))
+                function_objects.append(func)
+
+            node_id = node_ids[node] = len(node_linenos)
+            node_names.append(name_id)
+            node_functions.append(function_id)
+            node_linenos.append(lineno)
+            return node_id
+
+        for dependency in [data, control]:
+            for var, deps in dependency.items():
+                intern(var)
+                for dep in deps:
+                    intern(dep)
+
+        def csr(dependency: Dependency) -> Tuple[array, array]:
+            edges: List[List[int]] = [[] for _ in range(len(node_linenos))]
+            for var, deps in dependency.items():
+                edges[node_ids[var]] = sorted(node_ids[dep] for dep in deps)
+
+            indptr = array('i', [0])
+            indices = array('i')
+            for targets in edges:
+                indices.extend(targets)
+                indptr.append(len(indices))
+            return indptr, indices
+
+        return cls(names, functions, node_names, node_functions, node_linenos,
+                   csr(data), csr(control), function_objects)
+
+class CompactDependencies(CompactDependencies):
+    def edges(self, mode: str, forward: bool = False) -> List[Tuple[array, array]]:
+        """CSR arrays to follow for `mode` ('c', 'd'); `forward`: dependents instead of dependencies"""
+        adjacency = []
+        for kind, csr in [('d', self.data), ('c', self.control)]:
+            if kind not in mode:
+                continue
+            if forward:
+                if kind not in self._reversed:
+                    self._reversed[kind] = self.reverse(csr)
+                csr = self._reversed[kind]
+            adjacency.append(csr)
+        return adjacency
+
+    def reverse(self, csr: Tuple[array, array]) -> Tuple[array, array]:
+        """The transposed CSR arrays of `csr`"""
+        indptr, indices = csr
+        n = len(self)
+        counts = [0] * (n + 1)
+        for target in indices:
+            counts[target + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+
+        reverse_indptr = array('i', counts)
+        reverse_indices = array('i', [0]) * len(indices)
+        fill = counts[:-1]
+        for source in range(n):
+            for target in indices[indptr[source]:indptr[source + 1]]:
+                reverse_indices[fill[target]] = source
+                fill[target] += 1
+        return reverse_indptr, reverse_indices
+
+class CompactDependencies(CompactDependencies):
+    def find(self, *criteria: Any) -> List[int]:
+        """
+        Ids of the nodes matched by `criteria`, given as in `backward_slice()`:
+        `var_name`, `(func, lineno)`, or `(var_name, (func, lineno))`,
+        where `func` is a function or a function name.
+        """
+        found = []
+        for criterion in criteria:
+            criterion_var = None
+            criterion_func = None
+            criterion_lineno = None
+
+            if isinstance(criterion, str):
+                criterion_var = criterion
+            elif len(criterion) == 2 and isinstance(criterion[0], str) and \
+                    isinstance(criterion[1], tuple):
+                criterion_var = criterion[0]
+                criterion_func, criterion_lineno = criterion[1]
+            elif len(criterion) == 2:
+                criterion_func, criterion_lineno = criterion
+            else:
+                raise ValueError("Invalid argument")
+
+            if criterion_func is not None and not isinstance(criterion_func, str):
+                criterion_func = criterion_func.__name__
+
+            for node_id in range(len(self)):
+                name, (function_name, lineno) = self.node(node_id)
+                if ((criterion_var is None or criterion_var == name) and
+                    (criterion_func is None or criterion_func == function_name) and
+                    (criterion_lineno is None or criterion_lineno == lineno)):
+                    found.append(node_id)
+
+        return found
+
+    def search(self, start: List[int], adjacency: List[Tuple[array, array]],
+               depth: int = -1) -> List[int]:
+        """Ids of the nodes reachable from `start` in at most `depth` steps (-1: any)"""
+        seen = bytearray(len(self))
+        frontier = []
+        for node_id in start:
+            if not seen[node_id]:
+                seen[node_id] = 1
+                frontier.append(node_id)
+
+        while frontier and depth != 0:
+            next_frontier = []
+            for node_id in frontier:
+                for indptr, indices in adjacency:
+                    for next_id in indices[indptr[node_id]:indptr[node_id + 1]]:
+                        if not seen[next_id]:
+                            seen[next_id] = 1
+                            next_frontier.append(next_id)
+            frontier = next_frontier
+            depth -= 1
+
+        return [node_id for node_id in range(len(self)) if seen[node_id]]
+
+class CompactDependencies(CompactDependencies):
+    def backward_slice(self, *criteria: Any, mode: str = 'cd',
+                       depth: int = -1) -> 'CompactDependencies':
+        """
+        Create a backward slice from nodes `criteria` (see `find()`).
+        `mode` can contain 'c' (control dependencies) and 'd' (data dependencies);
+        `depth` limits the number of dependency steps (-1: no limit).
+        """
+        nodes = self.search(self.find(*criteria), self.edges(mode), depth)
+        return self.subgraph(nodes, mode)
+
+    def forward_slice(self, *criteria: Any, mode: str = 'cd',
+                      depth: int = -1) -> 'CompactDependencies':
+        """Create a forward slice from nodes `criteria`: the nodes depending on them"""
+        nodes = self.search(self.find(*criteria), self.edges(mode, forward=True), depth)
+        return self.subgraph(nodes, mode)
+
+    def subgraph(self, nodes: List[int], mode: str = 'cd') -> 'CompactDependencies':
+        """The graph of `nodes` (sorted ids) and the `mode` edges between them"""
+        new_ids = {node_id: new_id for new_id, node_id in enumerate(nodes)}
+
+        def sub_csr(kind: str, csr: Tuple[array, array]) -> Tuple[array, array]:
+            indptr, indices = csr
+            sub_indptr = array('i', [0])
+            sub_indices = array('i')
+            for node_id in nodes:
+                if kind in mode:
+                    sub_indices.extend(new_ids[target]
+                                       for target in indices[indptr[node_id]:indptr[node_id + 1]]
+                                       if target in new_ids)
+                sub_indptr.append(len(sub_indices))
+            return sub_indptr, sub_indices
+
+        return CompactDependencies(
+            self.names, self.functions,
+            array('i', (self.node_names[node_id] for node_id in nodes)),
+            array('i', (self.node_functions[node_id] for node_id in nodes)),
+            array('i', (self.node_linenos[node_id] for node_id in nodes)),
+            sub_csr('d', self.data), sub_csr('c', self.control),
+            self.function_objects)
+
+class CompactDependencies(CompactDependencies):
+    def dependencies(self) -> Dependencies:
+        """
+        Expand into `Dependencies`. Functions that did not come along
+        (e.g. after unpickling) are replaced by placeholders with their names.
+        """
+        function_objects = self.function_objects
+        if function_objects is None:
+            function_objects = []
+            for name, _ in self.functions:
+                def placeholder() -> None:
+                    pass
+                placeholder.__name__ = name
+                function_objects.append(placeholder)
+
+        nodes = [(self.names[self.node_names[node_id]],
+                  (function_objects[self.node_functions[node_id]],
+                   self.node_linenos[node_id]))
+                 for node_id in range(len(self))]
+
+        def expand(csr: Tuple[array, array]) -> Dependency:
+            indptr, indices = csr
+            return {nodes[node_id]: {nodes[target]
+                                     for target in indices[indptr[node_id]:indptr[node_id + 1]]}
+                    for node_id in range(len(self))}
+
+        return Dependencies(expand(self.data), expand(self.control))
+
+class Dependencies(Dependencies):
+    def compact(self) -> CompactDependencies:
+        """Return an interned, array-backed copy"""
+        return CompactDependencies.from_dependencies(self.data, self.control)
+
+class DependencyTracker(DependencyTracker):
+    def compact_dependencies(self) -> CompactDependencies:
+        """Return dependencies as `CompactDependencies` (without validating them)"""
+        return CompactDependencies.from_dependencies(self.data_dependencies,
+                                                     self.control_dependencies)
+
+class Slicer(Slicer):
+    def compact_dependencies(self) -> CompactDependencies:
+        """Return collected dependencies as `CompactDependencies`."""
+        if self.saved_dependencies is None:
+            return CompactDependencies.from_dependencies({}, {})
+        return self.saved_dependencies.compact_dependencies()
+
+import pickle
+
+if __name__ == '__main__':
+    compact_deps = middle_deps().compact()
+    compact_deps = pickle.loads(pickle.dumps(compact_deps))
+    compact_deps.backward_slice('<middle() return value>', mode='d').all_vars()
+
+if __name__ == '__main__':
+    compact_deps.forward_slice('x', mode='c').dependencies()
+
+### Static Locations
+
+if __name__ == '__main__':
+    print('\n### Static Locations')
+
+
+
+import sys
+
+class LocatedTracker:
+    """
+    `_data.at(lineno)`: forwards calls to the tracker, having it take
+    `lineno` as the line of the call instead of inspecting the stack.
+    """
+
+    def __init__(self, tracker: Any, lineno: Optional[int]) -> None:
+        self.tracker = tracker
+        self.lineno = lineno
+
+    def __getattr__(self, name: str) -> Callable:
+        located = self.tracker.located_method(name, self.lineno)
+        setattr(self, name, located)  # Skip `__getattr__()` from now on
+        return located
+
+class DependencyTracker(DependencyTracker):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.static_location: Optional[Location] = None
+        self.located_trackers: Dict[Optional[int], LocatedTracker] = {}
+
+    def at(self, lineno: Optional[int]) -> LocatedTracker:
+        """Return the tracker to use for calls in line `lineno` (None: unknown)"""
+        located = self.located_trackers.get(lineno)
+        if located is None:
+            located = LocatedTracker(self, lineno)
+            self.located_trackers[lineno] = located
+        return located
+
+    def located_method(self, name: str, lineno: Optional[int]) -> Callable:
+        """Return method `name`, taking `lineno` as the line of its caller"""
+        method = getattr(self, name)
+
+        def located(*args: Any, **kwargs: Any) -> Any:
+            # Set when the call happens, not when `_data.at()` is evaluated:
+            # `_data.at(1).set('x', _data.at(2).get('y', y))` reads `y` first.
+            # (Referring to `self` also makes `our_frame()` skip this frame.)
+            if lineno is None:
+                self.static_location = None
+            else:
+                frame = sys._getframe(1)
+                self.static_location = (self.resolve_function(frame), lineno)
+            return method(*args, **kwargs)
+
+        return located
+
+    def caller_location(self) -> Location:
+        """Return the location of the current `_data.at()` call, if any;
+        otherwise, inspect the stack."""
+        if self.static_location is not None:
+            return self.static_location
+        return super().caller_location()
+
+class TrackLocationTransformer(NodeTransformer):
+    """Turn `_data.method(...)` into `_data.at(LINENO).method(...)`.
+    To be applied last, after `ast.fix_missing_locations()`."""
+
+    def __init__(self) -> None:
+        # Whether we are in a function body (rather than a module or
+        # class body, a lambda, or a comprehension with its own frame)
+        self.in_function = [False]
+
+    def visit_FunctionDef(self, node: Union[ast.FunctionDef,
+                                            ast.AsyncFunctionDef]) -> AST:
+        # Decorators and defaults are evaluated outside of the function
+        for field in ['decorator_list', 'args', 'returns']:
+            value = getattr(node, field)
+            if isinstance(value, list):
+                setattr(node, field, [self.visit(item) for item in value])
+            elif value is not None:
+                setattr(node, field, self.visit(value))
+
+        self.in_function.append(True)
+        node.body = [self.visit(stmt) for stmt in node.body]
+        self.in_function.pop()
+        return node
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> AST:
+        return self.visit_FunctionDef(node)
+
+    def visit_outside_function(self, node: AST) -> AST:
+        self.in_function.append(False)
+        self.generic_visit(node)
+        self.in_function.pop()
+        return node
+
+    visit_ClassDef = visit_outside_function
+    visit_Lambda = visit_outside_function
+    visit_ListComp = visit_outside_function
+    visit_SetComp = visit_outside_function
+    visit_DictComp = visit_outside_function
+    visit_GeneratorExp = visit_outside_function
+
+    def visit_Call(self, node: Call) -> AST:
+        self.generic_visit(node)
+
+        func = node.func
+        if not (isinstance(func, Attribute) and
+                isinstance(func.value, Name) and
+                func.value.id == DATA_TRACKER):
+            return node
+
+        # This is the line `f_lineno` reports while the call executes
+        lineno = func.end_lineno if self.in_function[-1] else None
+        at = Call(func=Attribute(value=Name(id=DATA_TRACKER, ctx=Load()),
+                                 attr='at', ctx=Load()),
+                  args=[ast.Constant(value=lineno)],
+                  keywords=[])
+        func.value = ast.copy_location(at, func.value)
+        ast.fix_missing_locations(func)
+        return node
+
+class Slicer(Slicer):
+    def __init__(self, *items_to_instrument: Any,
+                 static_locations: bool = False,
+                 **kwargs: Any) -> None:
+        """Create a slicer. Other arguments are as in `Slicer.__init__()`.
+        `static_locations`=True has instrumented code pass the line of each
+        tracked access, saving the tracker from inspecting the stack.
+        Functions already instrumented are then not instrumented again
+        when called.
+        """
+        super().__init__(*items_to_instrument, **kwargs)
+        self.static_locations = static_locations
+        self.instrumented_functions: Set[Callable] = set()
+
+    def transformers(self) -> List[NodeTransformer]:
+        transformers = super().transformers()
+        if self.static_locations:
+            transformers.append(TrackLocationTransformer())
+        return transformers
+
+    def instrument(self, item: Any) -> Any:
+        if self.static_locations and item in self.instrumented_functions:
+            return item
+
+        new_item = super().instrument(item)
+        if self.static_locations:
+            self.instrumented_functions.add(new_item)
+        return new_item
+
+if __name__ == '__main__':
+    static_tree = ast.parse(inspect.getsource(middle))
+    for transformer in Slicer(middle, static_locations=True).transformers():
+        transformer.visit(static_tree)
+        ast.fix_missing_locations(static_tree)
+    dump_tree(static_tree)
+
+if __name__ == '__main__':
+    with Slicer(static_locations=True) as slicer:
+        m = middle(2, 1, 3)
+
+if __name__ == '__main__':
+    slicer
+
 ## More Applications
 ## -----------------
 
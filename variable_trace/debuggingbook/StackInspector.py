@@ -115,7 +115,7 @@ if __name__ == '__main__':
 import inspect
 import warnings
 
-from types import FunctionType, FrameType, TracebackType
+from types import CodeType, FunctionType, FrameType, TracebackType
 
 from typing import cast, Dict, Any, Tuple, Callable, Optional, Type
 
@@ -135,8 +135,18 @@ class StackInspector:
 
     def our_frame(self, frame: FrameType) -> bool:
         """Return true if `frame` is in the current (inspecting) class."""
+        if not may_have_self(frame.f_code):
+            # Avoid building `f_locals` on every traced event
+            return False
         return isinstance(frame.f_locals.get('self'), self.__class__)
 
+def may_have_self(code: CodeType) -> bool:
+    """False if frames of `code` can never have a local named `self`."""
+    if not code.co_flags & inspect.CO_OPTIMIZED:
+        return True  # module and class bodies: locals are a plain dict
+    return ('self' in code.co_varnames or 'self' in code.co_cellvars
+            or 'self' in code.co_freevars)
+
 class StackInspector(StackInspector):
     def caller_globals(self) -> Dict[str, Any]:
         """Return the globals() environment of the caller."""
@@ -213,6 +223,28 @@ class StackInspector(StackInspector):
         self._generated_function_cache[cache_key] = generated_function
         return generated_function
 
+class StackInspector(StackInspector):
+    def resolve_function(self, frame: FrameType) -> Callable:
+        """
+        Return the function executing in `frame`, as found by `search_func()`
+        (or else `create_function()`). Cached by code object on first sight,
+        so later events from the same code cost one dict lookup.
+        """
+        cache = self.__dict__.get('_resolved_functions')
+        if cache is None:
+            cache = {}
+            self._resolved_functions: Dict[int, Tuple[CodeType, Callable]] = cache
+        # Keyed by id(): hashing a code object hashes all of its bytecode.
+        # The entry keeps the code alive, so its id cannot be reused.
+        code = frame.f_code
+        entry = cache.get(id(code))
+        if entry is None:
+            function = self.search_func(code.co_name, frame)
+            if function is None:
+                function = self.create_function(frame)
+            entry = cache[id(code)] = (code, function)
+        return entry[1]
+
 class StackInspector(StackInspector):
     def caller_function(self) -> Callable:
         """Return the calling function"""
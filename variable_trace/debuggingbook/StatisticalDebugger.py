@@ -204,11 +204,12 @@ if __name__ == '__main__':
 
 
 from .Tracer import Tracer
+from .StackInspector import may_have_self
 
 from typing import Any, Callable, Optional, Type, Tuple
 from typing import Dict, Set, List, TypeVar, Union
 
-from types import FrameType, TracebackType
+from types import CodeType, FrameType, TracebackType
 
 class Collector(Tracer):
     """A class to record events during execution."""
@@ -256,20 +257,43 @@ class Collector(Collector):
         self._argstring: Optional[str] = None
         self._exception: Optional[Type] = None
         self.items_to_ignore: List[Union[Type, Callable]] = [self.__class__]
+        self._ignore_verdicts: Dict[int, Tuple[CodeType, int]] = {}
+
+    # Verdicts of `ignore_verdict()`
+    KEEP, IGNORE, CHECK_SELF = 0, 1, 2
+
+    def ignore_verdict(self, code: CodeType) -> int:
+        """
+        Whether events from `code` are ignored (IGNORE), collected (KEEP),
+        or depend on the class of `self` in the frame (CHECK_SELF).
+        """
+        if any(item.__name__ == code.co_name for item in self.items_to_ignore):
+            return self.IGNORE
+        if may_have_self(code) and any(isinstance(item, type) for item in self.items_to_ignore):
+            return self.CHECK_SELF
+        return self.KEEP
 
     def traceit(self, frame: FrameType, event: str, arg: Any) -> None:
         """
         Tracing function.
         Saves the first function and calls collect().
         """
-        for item in self.items_to_ignore:
-            if (isinstance(item, type) and 'self' in frame.f_locals and
-                isinstance(frame.f_locals['self'], item)):
+        # Decided once per code object (keyed by id(), see resolve_function());
+        # only frames that may have a `self` still look at it
+        code = frame.f_code
+        entry = self._ignore_verdicts.get(id(code))
+        if entry is None:
+            entry = self._ignore_verdicts[id(code)] = (code, self.ignore_verdict(code))
+        verdict = entry[1]
+        if verdict == self.IGNORE:
+            # Ignore this function
+            return
+        if verdict == self.CHECK_SELF:
+            frame_self = frame.f_locals.get('self')
+            if any(isinstance(item, type) and isinstance(frame_self, item)
+                   for item in self.items_to_ignore):
                 # Ignore this class
                 return
-            if item.__name__ == frame.f_code.co_name:
-                # Ignore this function
-                return
 
         if self._function is None and event == 'call':
             # Save function
@@ -363,6 +387,7 @@ class Collector(Collector):
         (typically `Debugger` classes using these collectors).
         """
         self.items_to_ignore += items_to_ignore
+        self._ignore_verdicts = {}
 
 class Collector(Collector):
     def __exit__(self, exc_tp: Type, exc_value: BaseException,
@@ -402,12 +427,7 @@ class CoverageCollector(Collector, StackInspector):
         """
         Save coverage for an observed event.
         """
-        name = frame.f_code.co_name
-        function = self.search_func(name, frame)
-
-        if function is None:
-            function = self.create_function(frame)
-
+        function = self.resolve_function(frame)
         location = (function, frame.f_lineno)
         self._coverage.add(location)
 
@@ -417,7 +437,13 @@ class CoverageCollector(CoverageCollector):
         Return the set of locations covered.
         Each location comes as a pair (`function_name`, `lineno`).
         """
-        return {(func.__name__, lineno) for func, lineno in self._coverage}
+        # coverage only grows, so an unchanged size means unchanged events
+        cached = getattr(self, '_events', None)
+        if cached is None or self._events_size != len(self._coverage):
+            cached = {(func.__name__, lineno) for func, lineno in self._coverage}
+            self._events = cached
+            self._events_size = len(self._coverage)
+        return cached
 
 class CoverageCollector(CoverageCollector):
     def covered_functions(self) -> Set[Callable]:
@@ -1282,6 +1308,170 @@ class RankingDebugger(DiscreteSpectrumDebugger):
     def __repr__(self) -> str:
         return repr(self.rank())
 
+### A Spectrum Matrix
+
+if __name__ == '__main__':
+    print('\n### A Spectrum Matrix')
+
+
+
+import numpy as np
+
+class SpectrumMatrix:
+    """
+    Events x runs spectrum of a set of collectors. Each outcome becomes
+    a NumPy bool array (events x runs), built once, so counting the runs
+    that observed an event no longer scans all collectors.
+    """
+
+    def __init__(self, collectors: Dict[str, List[Collector]],
+                 events: Optional[List[Any]] = None) -> None:
+        """Constructor. `events` fixes the event order (default: first seen)."""
+        self.collectors = {outcome: list(runs) for outcome, runs in collectors.items()}
+        run_events = {outcome: [collector.events() for collector in runs]
+                      for outcome, runs in self.collectors.items()}
+
+        if events is None:
+            seen: Dict[Any, None] = {}
+            for per_run in run_events.values():
+                for observed in per_run:
+                    seen.update(dict.fromkeys(observed))
+            events = list(seen)
+        self.events: List[Any] = list(events)
+        self.index: Dict[Any, int] = {event: i for i, event in enumerate(self.events)}
+
+        self.matrix: Dict[str, np.ndarray] = {}
+        self.counts: Dict[str, np.ndarray] = {}
+        for outcome, per_run in run_events.items():
+            matrix = np.zeros((len(self.events), len(per_run)), dtype=bool)
+            for run, observed in enumerate(per_run):
+                rows = [self.index[event] for event in observed if event in self.index]
+                matrix[rows, run] = True
+            self.matrix[outcome] = matrix
+            self.counts[outcome] = matrix.sum(axis=1)
+
+    def runs(self, outcome: str) -> int:
+        """Number of runs with the given outcome."""
+        return len(self.collectors.get(outcome, []))
+
+    def count(self, event: Any, outcome: str) -> int:
+        """Number of runs with the given outcome that observed `event`."""
+        if outcome not in self.counts or event not in self.index:
+            return 0
+        return int(self.counts[outcome][self.index[event]])
+
+    def count_vector(self, outcome: str) -> np.ndarray:
+        """`count()` for all events, in `events` order."""
+        if outcome not in self.counts:
+            return np.zeros(len(self.events), dtype=np.int64)
+        return self.counts[outcome]
+
+    def collectors_with(self, event: Any, outcome: str) -> List[Collector]:
+        """Collectors with the given outcome that observed `event`."""
+        if outcome not in self.matrix or event not in self.index:
+            return []
+        runs = np.flatnonzero(self.matrix[outcome][self.index[event]])
+        return [self.collectors[outcome][run] for run in runs]
+
+    def collectors_without(self, event: Any, outcome: str) -> List[Collector]:
+        """Collectors with the given outcome that did not observe `event`."""
+        if outcome not in self.matrix:
+            return []
+        if event not in self.index:
+            return list(self.collectors[outcome])
+        runs = np.flatnonzero(~self.matrix[outcome][self.index[event]])
+        return [self.collectors[outcome][run] for run in runs]
+
+# The metrics below take, for all events at once, the number of failing
+# and passing runs observing each event plus the total number of failing
+# and passing runs. Undefined values come out as NaN.
+
+def tarantula_metric(failed: np.ndarray, passed: np.ndarray,
+                     total_failed: int, total_passed: int) -> np.ndarray:
+    failed_fraction = failed / total_failed if total_failed else np.zeros(len(failed))
+    passed_fraction = passed / total_passed if total_passed else np.zeros(len(passed))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # same operations as ContinuousSpectrumDebugger: 1 - hue
+        return 1 - passed_fraction / (passed_fraction + failed_fraction)
+
+def ochiai_metric(failed: np.ndarray, passed: np.ndarray,
+                  total_failed: int, total_passed: int) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return failed / np.sqrt(total_failed * (failed + passed))
+
+def dstar_metric(failed: np.ndarray, passed: np.ndarray,
+                 total_failed: int, total_passed: int, star: int = 2) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return failed.astype(float) ** star / (passed + (total_failed - failed))
+
+def jaccard_metric(failed: np.ndarray, passed: np.ndarray,
+                   total_failed: int, total_passed: int) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return failed / (total_failed + passed)
+
+SPECTRUM_METRICS: Dict[str, Callable[..., np.ndarray]] = {
+    'tarantula': tarantula_metric,
+    'ochiai': ochiai_metric,
+    'dstar': dstar_metric,
+    'jaccard': jaccard_metric,
+}
+
+class SpectrumMatrixDebugger(DifferenceDebugger):
+    """Keep a `SpectrumMatrix` of the runs collected so far"""
+
+    def spectrum(self) -> SpectrumMatrix:
+        """The spectrum matrix; rebuilt only when runs were added.
+        (Query it once the runs are done: events are read when it is built.)"""
+        key = tuple((outcome, len(runs)) for outcome, runs in self.collectors.items())
+        if getattr(self, '_spectrum_key', None) != key:
+            self._spectrum = SpectrumMatrix(self.collectors, events=list(self.all_events()))
+            self._spectrum_key = key
+        return self._spectrum
+
+    def metric_scores(self, *metrics: str) -> Dict[str, np.ndarray]:
+        """
+        Scores of all events (in `spectrum().events` order) for the given
+        metrics (default: all of `SPECTRUM_METRICS`), in one pass.
+        """
+        spectrum = self.spectrum()
+        counts = (spectrum.count_vector(self.FAIL), spectrum.count_vector(self.PASS),
+                  spectrum.runs(self.FAIL), spectrum.runs(self.PASS))
+        return {metric: SPECTRUM_METRICS[metric](*counts)
+                for metric in (metrics or SPECTRUM_METRICS)}
+
+class ContinuousSpectrumDebugger(ContinuousSpectrumDebugger, SpectrumMatrixDebugger):
+    def event_count(self, event: Any, category: str) -> int:
+        """Number of runs in a category that observed the given event."""
+        return self.spectrum().count(event, category)
+
+    def collectors_with_event(self, event: Any, category: str) -> Set[Collector]:
+        return set(self.spectrum().collectors_with(event, category))
+
+    def collectors_without_event(self, event: Any, category: str) -> Set[Collector]:
+        return set(self.spectrum().collectors_without(event, category))
+
+    def event_fraction(self, event: Any, category: str) -> float:
+        if category not in self.collectors:
+            return 0.0
+        return self.event_count(event, category) / len(self.collectors[category])
+
+class RankingDebugger(RankingDebugger, SpectrumMatrixDebugger):
+    # Name in SPECTRUM_METRICS that computes `suspiciousness()` for all
+    # events at once; subclasses changing `suspiciousness()` reset it to None
+    METRIC: Optional[str] = None
+
+    def rank(self) -> List[Any]:
+        """Return a list of events, sorted by suspiciousness, highest first."""
+        if self.METRIC is None:
+            return super().rank()
+
+        scores = self.metric_scores(self.METRIC)[self.METRIC]
+        # undefined scores go last; stable, so ties keep `all_events()` order
+        scores = np.where(np.isnan(scores), -np.inf, scores)
+        order = np.argsort(-scores, kind='stable')
+        events = self.spectrum().events
+        return [events[i] for i in order]
+
 ### The Tarantula Metric
 
 if __name__ == '__main__':
@@ -1291,7 +1481,8 @@ if __name__ == '__main__':
 
 class TarantulaDebugger(ContinuousSpectrumDebugger, RankingDebugger):
     """Spectrum-based Debugger using the Tarantula metric for suspiciousness"""
-    pass
+
+    METRIC = 'tarantula'
 
 if __name__ == '__main__':
     tarantula_html = test_debugger_html(TarantulaDebugger())
@@ -1329,10 +1520,12 @@ import math
 class OchiaiDebugger(ContinuousSpectrumDebugger, RankingDebugger):
     """Spectrum-based Debugger using the Ochiai metric for suspiciousness"""
 
+    METRIC = 'ochiai'
+
     def suspiciousness(self, event: Any) -> Optional[float]:
-        failed = len(self.collectors_with_event(event, self.FAIL))
-        not_in_failed = len(self.collectors_without_event(event, self.FAIL))
-        passed = len(self.collectors_with_event(event, self.PASS))
+        failed = self.event_count(event, self.FAIL)
+        not_in_failed = len(self.collectors.get(self.FAIL, [])) - failed
+        passed = self.event_count(event, self.PASS)
 
         try:
             return failed / math.sqrt((failed + not_in_failed) * (failed + passed))
@@ -1369,6 +1562,62 @@ if __name__ == '__main__':
 if __name__ == '__main__':
     ochiai_middle.suspiciousness(ochiai_middle.rank()[0])
 
+### The DStar and Jaccard Metrics
+
+if __name__ == '__main__':
+    print('\n### The DStar and Jaccard Metrics')
+
+
+
+class DStarDebugger(ContinuousSpectrumDebugger, RankingDebugger):
+    """Spectrum-based Debugger using the DStar (D*, * = 2) metric for suspiciousness"""
+
+    METRIC = 'dstar'
+
+    def suspiciousness(self, event: Any) -> Optional[float]:
+        failed = self.event_count(event, self.FAIL)
+        not_in_failed = len(self.collectors.get(self.FAIL, [])) - failed
+        passed = self.event_count(event, self.PASS)
+
+        if passed + not_in_failed == 0:
+            return math.inf if failed > 0 else None
+        return failed ** 2 / (passed + not_in_failed)
+
+    def hue(self, event: Any) -> Optional[float]:
+        # D* is unbounded; map [0, inf] onto [1.0, 0.0]
+        suspiciousness = self.suspiciousness(event)
+        if suspiciousness is None:
+            return None
+        return 1 / (1 + suspiciousness)
+
+class JaccardDebugger(ContinuousSpectrumDebugger, RankingDebugger):
+    """Spectrum-based Debugger using the Jaccard metric for suspiciousness"""
+
+    METRIC = 'jaccard'
+
+    def suspiciousness(self, event: Any) -> Optional[float]:
+        failed = self.event_count(event, self.FAIL)
+        passed = self.event_count(event, self.PASS)
+
+        try:
+            return failed / (len(self.collectors.get(self.FAIL, [])) + passed)
+        except ZeroDivisionError:
+            return None
+
+    def hue(self, event: Any) -> Optional[float]:
+        suspiciousness = self.suspiciousness(event)
+        if suspiciousness is None:
+            return None
+        return 1 - suspiciousness
+
+if __name__ == '__main__':
+    dstar_middle = test_debugger_middle(DStarDebugger())
+    dstar_middle.rank()
+
+if __name__ == '__main__':
+    # all metrics for all events in one pass over the spectrum matrix
+    dstar_middle.metric_scores()
+
 ### How Useful is Ranking?
 
 if __name__ == '__main__':
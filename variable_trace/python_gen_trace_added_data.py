@@ -1,4 +1,5 @@
 import os
+import time
 import json
 import gzip
 import shutil
@@ -6,8 +7,12 @@ import random
 import argparse
 import copy
 from multiprocessing import Pool, cpu_count
-from transformers import AutoTokenizer
 from tqdm import tqdm
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipeline_utils.jsonl_io import JsonlWriter, iter_jsonl
+from pipeline_utils.metrics import build_report, format_report, get_metrics, reset_metrics, stamped, timed_task
 
 
 def read_json(path):
@@ -227,6 +232,7 @@ def process_code(args):
     trace_added_code = full_data['incorrect_code'] + full_comment
     full_data['trace_code'] = trace_added_code
     full_data['code_index'] = int(code_index)
+    full_data['case_index'] = int(case_index)
     full_data['coverage_data'] = coverage_data
     
     if 'def main' in full_data['incorrect_code']:
@@ -235,21 +241,6 @@ def process_code(args):
     # Save the full data
     return copy.deepcopy(full_data)
 
-def read_jsonl_gz_to_list(jsonl_file):
-    """Read a gzipped JSONL file and return a list of dictionaries."""
-    data_list = []
-    with gzip.open(jsonl_file, 'rt', encoding='utf-8') as file:
-        for line in file:
-            data_list.append(json.loads(line))
-    return data_list
-
-def save_dict_list_to_jsonl_gz(data_list, filename):
-    """Save a list of dictionaries to a gzipped JSONL file."""
-    with gzip.open(filename, 'wt', encoding='utf-8') as file:
-        for entry in data_list:
-            json_line = json.dumps(entry)
-            file.write(json_line + '\n')
-            
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--level", default = 'very_hard', type=str)
@@ -259,17 +250,19 @@ def main():
     
     base_path = os.getcwd()
     trace_path = os.path.join(base_path, 'python_trace')
+
+    stage = f'trace_added_{level}'
+    stage_start = time.perf_counter()
+    reset_metrics(stage)
+    metrics = get_metrics(stage)
     
     pid_split_dict = {}
-    all_trace_added_list = []
     
     trace_type_path = os.path.join(trace_path, f'{level}', 'python_incorrect')
     data_list = os.listdir(trace_type_path)
     json_file_path = os.path.join(base_path, 'python_data', f'{level}_filtered.jsonl.gz')
-    raw_json = read_jsonl_gz_to_list(json_file_path)
-    
     # Split the data based on problem id
-    for single_storage in raw_json:
+    for single_storage in iter_jsonl(json_file_path):
         pid_index = single_storage['pid']
         if pid_index in pid_split_dict.keys():
             pid_split_dict[pid_index].append((len(pid_split_dict[pid_index]), single_storage))
@@ -283,29 +276,30 @@ def main():
         incorrect_list = os.listdir(pid_path)
 
         for single_incorrect in incorrect_list:
+            # only the traces (profiler summaries may sit beside them)
+            if not single_incorrect.endswith('.json.gz'):
+                continue
             incorrect_data = os.path.join(pid_path, single_incorrect)
             args_list.append((pid_index, incorrect_data, pid_split_dict))
 
-    # Use multiprocessing Pool
-    with Pool(120) as pool:  # Use one less CPU than available
-        results = list(
-            tqdm(pool.imap_unordered(process_code, args_list, chunksize=1), 
-                total=len(args_list), 
-                desc="Processing Codes")
-        )
-    
-    # Add results to the list
-    for result in results:
-        if result is not None:
-            all_trace_added_list.append(result)
-            
-    # Save the results
-    save_dict_list_to_jsonl_gz(
-        all_trace_added_list, 
-        os.path.join(
-            base_path, 
-            'python_data', 
-            f'{level}_filtered_tc_cov.jsonl.gz'))
+    output_path = os.path.join(
+        base_path, 
+        'python_data', 
+        f'{level}_filtered_tc_cov.jsonl.gz')
+
+    # Use multiprocessing Pool and stream results straight into the output file
+    with Pool(120) as pool, JsonlWriter(output_path) as writer:  # Use one less CPU than available
+        for result in tqdm(pool.imap_unordered(timed_task(process_code, stage, 'code'), stamped(args_list), chunksize=1),
+                           total=len(args_list), 
+                           desc="Processing Codes"):
+            if result is not None:
+                writer.write(result)
+        # clean worker exit so their metrics snapshots are flushed
+        pool.close()
+        pool.join()
+
+    metrics.add('bytes_written', os.path.getsize(output_path))
+    print(format_report(build_report(stage, wall=time.perf_counter() - stage_start)))
 
 if __name__ == '__main__':
     main()
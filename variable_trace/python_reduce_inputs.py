@@ -0,0 +1,287 @@
+"""
+Failing test inputs shrunk with delta debugging.
+
+Every failing input of an incorrect program (labels from
+`test_case.incorrect_result`) is reduced with debuggingbook's `ddmin`,
+first by lines, then by tokens. A candidate input still fails if the
+correct program runs it cleanly and the incorrect program fails it the
+same way as the original input (wrong output, crash or timeout). Both
+programs run as subprocesses; outcomes are cached per input. The reduced
+input replaces the original, with the correct program's output on it as
+the expected output, so the records can be traced as they are.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import resource
+import tempfile
+import subprocess
+from multiprocessing import Pool
+from tqdm import tqdm
+
+from debuggingbook.DeltaDebugger import ddmin, PASS, FAIL, UNRESOLVED
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code_pair_gen'))
+from pipeline_utils.jsonl_io import JsonlWriter, iter_jsonl
+from pipeline_utils.metrics import active_metrics, build_report, format_report, get_metrics, reset_metrics, stamped, timed_task
+from dataset_filter import compare_outputs
+
+# set in main(); module globals so Pool workers inherit them on fork
+run_timeout = 5.0
+memory_mb = 2048
+max_tests = 500
+tmp_root = None
+
+# a token with the spaces before it, or a line break; joining them gives back the input
+TOKEN = re.compile(r'[^\S\n]*\S+|\n')
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+def as_stdin(text):
+    """`text` as the runners feed it to a program: ending in a line break"""
+    return text if text.endswith('\n') else text + '\n'
+
+
+def _limit_memory():
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def run_program(path, stdin):
+    """Run `python path` on `stdin`; returns (status, stdout) with status 'ok', 'error' or 'timeout'"""
+    metrics = active_metrics()
+    metrics.add('subprocesses')
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run([sys.executable, path], input=stdin, text=True, capture_output=True,
+                              errors='replace', timeout=run_timeout, preexec_fn=_limit_memory)
+        metrics.observe('subprocess', time.perf_counter() - start)
+        return ('ok' if proc.returncode == 0 else 'error'), proc.stdout
+    except subprocess.TimeoutExpired as e:
+        metrics.observe('subprocess', time.perf_counter() - start)
+        metrics.add('timeouts')
+        out = e.stdout or ''
+        if isinstance(out, bytes):
+            out = out.decode('utf-8', 'replace')
+        return 'timeout', out
+
+
+class InputOracle:
+    """
+    `ddmin` test: FAIL if the joined pieces make the incorrect program fail
+    as on the original input while the correct program runs cleanly.
+    Inputs run as the runners run them (see `as_stdin`), so whatever fails
+    here fails in later stages too. Outcomes (and the correct program's
+    output) are cached by input digest.
+    """
+
+    def __init__(self, correct_path, incorrect_path):
+        self.correct_path = correct_path
+        self.incorrect_path = incorrect_path
+        self.cache = {}
+        self.failure = None
+        self.tests = 0
+
+    def run(self, text):
+        """(outcome, failure kind, expected output) of `text`; outcome is PASS if the programs agree"""
+        text = as_stdin(text)
+        key = _digest(text)
+        if key in self.cache:
+            active_metrics().add('cache_hits')
+            return self.cache[key]
+
+        self.tests += 1
+        status, expected = run_program(self.correct_path, text)
+        if status != 'ok':
+            result = (UNRESOLVED, None, None)
+        else:
+            status, actual = run_program(self.incorrect_path, text)
+            if status == 'ok':
+                kind = None if compare_outputs(actual, expected) else 'wrong_output'
+            else:
+                kind = status
+            result = (PASS if kind is None else FAIL, kind, expected)
+        self.cache[key] = result
+        return result
+
+    def __call__(self, pieces):
+        text = as_stdin(''.join(pieces))
+        if _digest(text) not in self.cache and self.tests >= max_tests:
+            # out of budget: nothing smaller is accepted any more
+            return UNRESOLVED
+        outcome, kind, _ = self.run(text)
+        if outcome == FAIL and kind != self.failure:
+            return UNRESOLVED
+        return outcome
+
+
+def reduce_input(oracle, test_input):
+    """Minimize `test_input` by lines, then by tokens; None if it does not fail"""
+    test_input = as_stdin(test_input)
+    outcome, kind, _ = oracle.run(test_input)
+    if outcome != FAIL:
+        return None
+    oracle.failure = kind
+
+    lines = ddmin(oracle, test_input.splitlines(keepends=True))
+    tokens = ddmin(oracle, TOKEN.findall(''.join(lines)))
+    return as_stdin(''.join(tokens))
+
+
+def reduce_record(args):
+    record_index, single_data = args
+    metrics = active_metrics()
+    test_case = single_data.get('test_case', {})
+    inputs = test_case.get('input', [])
+    outputs = test_case.get('output', [])
+    labels = test_case.get('incorrect_result') or []
+
+    new_data = dict(single_data)
+    new_data['reduce_status'] = 'ok'
+    new_data['reduced_inputs'] = []
+    if len(labels) != len(inputs):
+        new_data['reduce_status'] = 'no_labels'
+        return new_data
+
+    workdir = tempfile.mkdtemp(dir=tmp_root)
+    try:
+        paths = {}
+        for name in ['raw_correct', 'raw_incorrect']:
+            paths[name] = os.path.join(workdir, f'{name}.py')
+            with open(paths[name], 'w', encoding='utf-8') as f:
+                f.write(single_data[name])
+        oracle = InputOracle(paths['raw_correct'], paths['raw_incorrect'])
+
+        new_inputs, new_outputs = list(inputs), list(outputs)
+        statuses = []
+        for index, (test_input, expected, label) in enumerate(zip(inputs, outputs, labels)):
+            if label != 'fail':
+                continue
+            oracle.tests = 0
+            outcome, _, oracle_output = oracle.run(test_input)
+            # the correct program's output is the expected output of reduced inputs; it has to agree here
+            if outcome == UNRESOLVED or not compare_outputs(
+                    oracle_output.strip().replace('\\n', ' ').replace('\\t', ' '),
+                    expected.strip().replace('\\n', ' ').replace('\\t', ' ')):
+                statuses.append('oracle_mismatch')
+                continue
+
+            with metrics.timer('reduce'):
+                reduced = reduce_input(oracle, test_input)
+            metrics.add('tests', oracle.tests)
+            if reduced is None:
+                statuses.append('not_failing')
+                continue
+
+            reduced_output = oracle.run(reduced)[2]
+            if not test_input.endswith('\n'):
+                # stored inputs and outputs have no trailing line break; runners add it back
+                reduced = reduced[:-1] if reduced.endswith('\n') else reduced
+            new_inputs[index] = reduced
+            new_outputs[index] = reduced_output.rstrip('\n')
+            statuses.append('ok')
+            metrics.add('reduced')
+            metrics.add('chars_before', len(test_input))
+            metrics.add('chars_after', len(reduced))
+            new_data['reduced_inputs'].append({
+                'index': index,
+                'lines': [len(test_input.splitlines()), len(reduced.splitlines())],
+                'chars': [len(test_input), len(reduced)],
+                'tests': oracle.tests,
+                'budget_exhausted': oracle.tests >= max_tests,
+            })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    new_data['test_case'] = dict(test_case, input=new_inputs, output=new_outputs)
+    new_data['reduce_status'] = next((status for status in statuses if status != 'ok'), 'ok')
+    return new_data
+
+
+def reduction_summary(records):
+    """How far the failing inputs shrank, over the inputs that could be reduced"""
+    summary = {'records': 0, 'status': {}, 'inputs': 0, 'chars_before': 0, 'chars_after': 0,
+               'lines_before': 0, 'lines_after': 0, 'budget_exhausted': 0}
+    for status, reduced in records:
+        summary['records'] += 1
+        summary['status'][status] = summary['status'].get(status, 0) + 1
+        for entry in reduced:
+            summary['inputs'] += 1
+            summary['chars_before'] += entry['chars'][0]
+            summary['chars_after'] += entry['chars'][1]
+            summary['lines_before'] += entry['lines'][0]
+            summary['lines_after'] += entry['lines'][1]
+            summary['budget_exhausted'] += entry['budget_exhausted']
+    summary['char_ratio'] = (summary['chars_after'] / summary['chars_before']) if summary['chars_before'] else None
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--level', default='very_hard', type=str)
+    parser.add_argument('--data_path', default=None,
+                        help='default: ./python_data/<level>_filtered.jsonl.gz')
+    parser.add_argument('--out', default=None,
+                        help='default: ./python_data/<level>_filtered_reduced.jsonl.gz')
+    parser.add_argument('--timeout', default=5, type=float, help='seconds per program run')
+    parser.add_argument('--max_tests', default=500, type=int, help='candidate inputs tried per failing input')
+    parser.add_argument('--memory_mb', default=2048, type=int, help='address space cap per program run (0: none)')
+    parser.add_argument('--workers', default=os.cpu_count(), type=int)
+    args = parser.parse_args()
+
+    global run_timeout, memory_mb, max_tests, tmp_root
+    run_timeout = args.timeout
+    memory_mb = args.memory_mb
+    max_tests = args.max_tests
+    tmp_root = tempfile.mkdtemp(prefix='reduce_tmp_')
+
+    data_path = args.data_path or f'./python_data/{args.level}_filtered.jsonl.gz'
+    out_path = args.out or f'./python_data/{args.level}_filtered_reduced.jsonl.gz'
+
+    stage = f'reduce_inputs_{args.level}'
+    stage_start = time.perf_counter()
+    reset_metrics(stage)
+    get_metrics(stage).add('bytes_read', os.path.getsize(data_path))
+
+    stats = []
+    try:
+        # records stay in order: later stages pair traces with records by position
+        with Pool(args.workers) as pool, JsonlWriter(out_path) as writer:
+            tasks = stamped(enumerate(iter_jsonl(data_path)))
+            for record in tqdm(pool.imap(timed_task(reduce_record, stage, 'record'), tasks, chunksize=1),
+                               desc='Reducing'):
+                writer.write(record)
+                stats.append((record['reduce_status'], record['reduced_inputs']))
+            # clean worker exit so their metrics snapshots are flushed
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+    summary = reduction_summary(stats)
+    summary_path = f'{out_path.split(".jsonl")[0]}.summary.json'
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    get_metrics(stage).add('bytes_written', os.path.getsize(out_path))
+
+    print(format_report(build_report(stage, wall=time.perf_counter() - stage_start)))
+    print(f'Saved {writer.count} records => {out_path}')
+    print(f'Reduced {summary["inputs"]} failing inputs  status: {summary["status"]}')
+    print(f'Chars {summary["chars_before"]} => {summary["chars_after"]}  '
+          f'lines {summary["lines_before"]} => {summary["lines_after"]}  '
+          f'budget exhausted: {summary["budget_exhausted"]}')
+
+
+if __name__ == '__main__':
+    main()
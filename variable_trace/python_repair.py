@@ -0,0 +1,321 @@
+"""
+Automated program repair benchmark over a filtered level.
+
+Every incorrect program is wrapped as `def trace_func():` and driven by a
+test function that feeds it one stdin input and compares its output with
+the expected one (the `compare_outputs` of dataset_filter). The test runs
+are collected by an OchiaiDebugger, and debuggingbook's Repairer evolves
+the program under a per-program time budget until all tests pass.
+Per record: whether a plausible patch (all tests pass) was found, the time
+to the first one, and its size in changed lines next to the size of the
+`raw_correct` reference fix.
+"""
+
+import io
+import os
+import ast
+import sys
+import json
+import time
+import random
+import signal
+import difflib
+import argparse
+import builtins
+import resource
+import warnings
+from multiprocessing import Pool
+from tqdm import tqdm
+
+from debuggingbook.Repairer import (Repairer, ConditionMutator, FailureNotReproducedError, StatementMutator,
+                                   TestTimeoutError)
+from debuggingbook.StatisticalDebugger import OchiaiDebugger
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code_pair_gen'))
+from pipeline_utils.jsonl_io import JsonlWriter, iter_jsonl
+from pipeline_utils.metrics import active_metrics, build_report, format_report, get_metrics, reset_metrics, stamped, timed_task
+from dataset_filter import compare_outputs
+
+from python_slice import RECURSION_CAP, wrap_program
+
+# test function around the wrapped program; compiled into the program's namespace
+HARNESS = '''
+def run_submission(test_input):
+    stdout = io.StringIO()
+    original_stdin = sys.stdin
+    sys.stdin = io.TextIOWrapper(io.BytesIO(test_input.encode()), encoding='utf-8')
+    try:
+        with redirect_stdout(stdout), redirect_stderr(io.StringIO()):
+            try:
+                trace_func()
+            except SystemExit:
+                pass
+    finally:
+        sys.stdin = original_stdin
+    return stdout.getvalue()
+
+
+def submission_test(test_input, expected):
+    assert compare_outputs(run_submission(test_input), expected)
+'''
+
+MUTATORS = {'statement': StatementMutator, 'condition': ConditionMutator}
+
+# set in main(); module globals so Pool workers inherit them on fork
+repair_budget = 60.0
+test_timeout = 2.0
+population_size = 40
+iterations = 100
+mutator_class = StatementMutator
+
+
+class BudgetRepairer(Repairer):
+    """Repairer that stops evolving after `budget` seconds and notes when it first saw a plausible patch"""
+
+    def __init__(self, *args, budget, **kwargs):
+        self.start = time.perf_counter()
+        self.deadline = self.start + budget
+        self.first_plausible = None
+        super().__init__(*args, **kwargs)
+
+    def record_fitness(self, key, fitness):
+        if fitness >= 1.0 and self.first_plausible is None:
+            self.first_plausible = time.perf_counter() - self.start
+        return super().record_fitness(key, fitness)
+
+    def evolve(self, population):
+        if time.perf_counter() >= self.deadline:
+            # out of budget: the remaining iterations keep the best population so far
+            return population
+        return super().evolve(population)
+
+
+def _init_worker(memory_mb):
+    # the Repairer warns about every candidate it cannot parse or define
+    warnings.simplefilter('ignore')
+    # programs raising the limit for deep recursion would overflow the C stack and kill the worker
+    original_setrecursionlimit = sys.setrecursionlimit
+    sys.setrecursionlimit = lambda limit: original_setrecursionlimit(min(limit, RECURSION_CAP))
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _timeout_handler(signum, frame):
+    raise TestTimeoutError()
+
+
+def program_namespace(definition):
+    """Namespace with the wrapped program (`trace_func`) and its test function (`submission_test`)"""
+
+    def _open(file, *args, **kwargs):
+        # `open(0)` reads stdin
+        return sys.stdin if file == 0 else builtins.open(file, *args, **kwargs)
+
+    namespace = {'__name__': '__main__', '__builtins__': builtins, 'open': _open,
+                 'io': io, 'sys': sys, 'compare_outputs': compare_outputs}
+    exec('from contextlib import redirect_stdout, redirect_stderr', namespace)
+    exec(definition, namespace)
+    exec(compile(HARNESS, '<repair_harness>', 'exec'), namespace)
+    return namespace
+
+
+def collect_tests(namespace, inputs, outputs):
+    """OchiaiDebugger with one run of `submission_test` per test; a run out of time fails"""
+    debugger = OchiaiDebugger()
+    for test_input, expected in zip(inputs, outputs):
+        if not test_input.endswith('\n'):
+            test_input += '\n'
+        signal.signal(signal.SIGALRM, _timeout_handler)
+        signal.setitimer(signal.ITIMER_REAL, test_timeout)
+        try:
+            with debugger:
+                namespace['submission_test'](test_input, expected)
+        except TestTimeoutError:
+            # raised inside the collector's own tracing, which re-raises it as an internal error
+            debugger.add_collector(debugger.FAIL, debugger.collector)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return debugger
+
+
+def program_body(tree):
+    """Source of the program inside the `def trace_func():` wrapper, as normalized by ast.unparse"""
+    return ast.unparse(ast.Module(body=tree.body[0].body, type_ignores=[]))
+
+
+def patch_size(before, after):
+    """Changed lines between two versions of a program (a replaced line counts once)"""
+    matcher = difflib.SequenceMatcher(None, before.splitlines(), after.splitlines(), autojunk=False)
+    return sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal')
+
+
+def reference_size(single_data):
+    """patch_size of the `raw_correct` fix, both sides normalized like the repair"""
+    try:
+        before = ast.unparse(ast.parse(single_data['raw_incorrect']))
+        after = ast.unparse(ast.parse(single_data['raw_correct']))
+    except (SyntaxError, ValueError):
+        return None
+    return patch_size(before, after)
+
+
+def repair_record(args):
+    record_index, single_data = args
+    metrics = active_metrics()
+    code = single_data['raw_incorrect']
+    test_case = single_data.get('test_case', {})
+    inputs = test_case.get('input', [])
+    outputs = test_case.get('output', [])
+
+    row = {
+        'record': record_index,
+        'pid': str(single_data.get('pid')),
+        'status': 'ok',
+        'n_pass': 0,
+        'n_fail': 0,
+        'fitness': None,
+        'plausible': False,
+        'time_to_plausible': None,
+        'time': None,
+        'evaluations': 0,
+        'patch_size': None,
+        'reference_size': reference_size(single_data),
+        'patch': None,
+    }
+
+    wrapped, filename = wrap_program(code)
+    try:
+        definition = compile(wrapped, filename, 'exec')
+    except (SyntaxError, ValueError):
+        row['status'] = 'syntax_error'
+        return row
+
+    namespace = program_namespace(definition)
+    with metrics.timer('collect'):
+        debugger = collect_tests(namespace, inputs, outputs)
+    # outcomes as observed here; `incorrect_result` may disagree for flaky or timing-dependent programs
+    row['n_pass'] = len(debugger.collectors[debugger.PASS])
+    row['n_fail'] = len(debugger.collectors[debugger.FAIL])
+    labels = test_case.get('incorrect_result') or []
+    if labels.count('fail') != row['n_fail']:
+        metrics.add('label_mismatch')
+    if not row['n_fail']:
+        row['status'] = 'no_fail'
+        return row
+    if not row['n_pass']:
+        # fitness weighs the passing tests by their share, so there must be some
+        row['status'] = 'no_pass'
+        return row
+
+    random.seed(record_index)
+    try:
+        with metrics.timer('repair'):
+            repairer = BudgetRepairer(debugger, targets=[namespace['trace_func']], sources=[namespace['trace_func']],
+                                      globals=namespace, mutator_class=mutator_class,
+                                      test_timeout=test_timeout, budget=repair_budget)
+            best_tree, fitness = repairer.repair(population_size=population_size, iterations=iterations)
+    except (AssertionError, FailureNotReproducedError):
+        # validate(): the original program did not reproduce its own outcomes
+        row['status'] = 'flaky'
+        return row
+    except Exception:
+        row['status'] = 'error'
+        return row
+
+    metrics.add('repairs')
+    row['time'] = time.perf_counter() - repairer.start
+    row['fitness'] = fitness
+    row['evaluations'] = len(repairer.fitness_cache) + len(repairer.fitness_bounds)
+    row['plausible'] = fitness >= 1.0
+    row['time_to_plausible'] = repairer.first_plausible
+    if row['plausible']:
+        metrics.add('plausible')
+        patch = program_body(best_tree)
+        row['patch'] = patch
+        row['patch_size'] = patch_size(program_body(repairer.target_tree), patch)
+    return row
+
+
+def repair_summary(rows):
+    """Repair rate over the records a repair was attempted on, time to the first plausible patch and patch sizes"""
+    attempted = [row for row in rows if row['fitness'] is not None]
+    plausible = [row for row in attempted if row['plausible']]
+    summary = {'records': len(rows), 'attempted': len(attempted), 'plausible': len(plausible),
+               'repair_rate': (len(plausible) / len(attempted)) if attempted else 0.0, 'status': {}}
+    for row in rows:
+        summary['status'][row['status']] = summary['status'].get(row['status'], 0) + 1
+
+    def mean(values):
+        values = [value for value in values if value is not None]
+        return (sum(values) / len(values)) if values else None
+
+    summary['mean_time_to_plausible'] = mean(row['time_to_plausible'] for row in plausible)
+    summary['mean_time'] = mean(row['time'] for row in attempted)
+    summary['mean_patch_size'] = mean(row['patch_size'] for row in plausible)
+    summary['mean_reference_size'] = mean(row['reference_size'] for row in plausible)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--level', default='very_hard', type=str)
+    parser.add_argument('--data_path', default=None,
+                        help='default: ./python_data/<level>_filtered.jsonl.gz')
+    parser.add_argument('--out', default=None,
+                        help='default: ./python_repair/<level>_repair.jsonl.gz')
+    parser.add_argument('--budget', default=60, type=float, help='seconds of evolution per program')
+    parser.add_argument('--test_timeout', default=2, type=float, help='seconds per test run')
+    parser.add_argument('--population', default=40, type=int)
+    parser.add_argument('--iterations', default=100, type=int)
+    parser.add_argument('--mutator', default='statement', choices=sorted(MUTATORS))
+    parser.add_argument('--memory_mb', default=2048, type=int, help='address space cap per worker (0: none)')
+    parser.add_argument('--workers', default=os.cpu_count(), type=int)
+    args = parser.parse_args()
+
+    global repair_budget, test_timeout, population_size, iterations, mutator_class
+    repair_budget = args.budget
+    test_timeout = args.test_timeout
+    population_size = args.population
+    iterations = args.iterations
+    mutator_class = MUTATORS[args.mutator]
+
+    data_path = args.data_path or f'./python_data/{args.level}_filtered.jsonl.gz'
+    out_path = args.out or f'./python_repair/{args.level}_repair.jsonl.gz'
+
+    stage = f'repair_{args.level}'
+    stage_start = time.perf_counter()
+    reset_metrics(stage)
+    get_metrics(stage).add('bytes_read', os.path.getsize(data_path))
+
+    rows = []
+    # one repair per task and unordered results: repair times vary by orders of magnitude;
+    # recycle workers, since the programs run in the worker itself
+    with Pool(args.workers, initializer=_init_worker, initargs=(args.memory_mb,), maxtasksperchild=20) as pool, \
+            JsonlWriter(out_path) as writer:
+        tasks = stamped(enumerate(iter_jsonl(data_path)))
+        for row in tqdm(pool.imap_unordered(timed_task(repair_record, stage, 'record'), tasks, chunksize=1),
+                        desc='Repairing'):
+            writer.write(row)
+            rows.append(row)
+        # clean worker exit so their metrics snapshots are flushed
+        pool.close()
+        pool.join()
+
+    summary = repair_summary(rows)
+    summary_path = f'{out_path.split(".jsonl")[0]}.summary.json'
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    get_metrics(stage).add('bytes_written', os.path.getsize(out_path))
+
+    print(format_report(build_report(stage, wall=time.perf_counter() - stage_start)))
+    print(f'Saved {writer.count} rows => {out_path}')
+    print(f'Repaired {summary["plausible"]}/{summary["attempted"]} '
+          f'(rate {summary["repair_rate"]:.3f})  status: {summary["status"]}')
+    print(f'Mean time to plausible patch: {summary["mean_time_to_plausible"]}  '
+          f'mean patch size: {summary["mean_patch_size"]} (reference: {summary["mean_reference_size"]})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""
+Spectrum-based fault localization baseline over a filtered level.
+
+Every incorrect program runs on its passing and failing tests (labels from
+`test_case.incorrect_result`) under a CoverageCollector; the runs become a
+spectrum matrix whose metrics rank the program lines in one vectorized pass.
+Ranks of the gold (`statement`) lines are written as one row per record to a
+columnar file (Parquet when pyarrow is installed, else .npz) plus top-k hit rates.
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import signal
+import argparse
+import builtins
+import threading
+from multiprocessing import Pool
+from contextlib import redirect_stdout, redirect_stderr
+from tqdm import tqdm
+
+import numpy as np
+
+from debuggingbook.StatisticalDebugger import CoverageCollector, RankingDebugger, SPECTRUM_METRICS
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipeline_utils.jsonl_io import iter_jsonl
+from pipeline_utils.metrics import active_metrics, build_report, format_report, get_metrics, reset_metrics, stamped, timed_task
+
+# filename the submissions are compiled under, so their frames can be told apart
+SUBMISSION = '<submission>'
+
+# set in main(); module globals so Pool workers inherit them on fork
+localize_metrics = ['ochiai', 'tarantula']
+run_timeout = 10.0
+
+
+class TimeoutException(Exception):
+    pass
+
+
+class SubmissionCoverageCollector(CoverageCollector):
+    """CoverageCollector restricted to lines of the submission itself"""
+
+    def collect(self, frame, event, arg):
+        # line 0 is the module frame's 'call' event
+        if frame.f_code.co_filename == SUBMISSION and frame.f_lineno > 0:
+            super().collect(frame, event, arg)
+
+
+def gold_lines(statement, n_lines):
+    """build_item's diff lines ("12 x = y") => sorted line numbers inside the incorrect program"""
+    lines = {int(m) for m in re.findall(r'^\d+', '\n'.join(statement), flags=re.M)}
+    return sorted(line for line in lines if 1 <= line <= n_lines)
+
+
+def _timeout_handler(signum, frame):
+    raise TimeoutException('The submission took too long to execute.')
+
+
+def run_with_coverage(code_obj, test_input, timeout):
+    """
+    Run the compiled submission on one input; returns (collector, status).
+    sys.settrace does not follow threads, so a run that starts one (a common
+    way to raise the stack size) is joined but reported as 'thread'.
+    """
+    if not test_input.endswith('\n'):
+        test_input += '\n'
+    stdin = io.TextIOWrapper(io.BytesIO(test_input.encode()), encoding='utf-8')
+
+    def _open(file, *args, **kwargs):
+        # `open(0)` reads stdin
+        return stdin if file == 0 else builtins.open(file, *args, **kwargs)
+
+    namespace = {'__name__': '__main__', '__builtins__': builtins, 'open': _open}
+    collector = SubmissionCoverageCollector()
+    original_stdin = sys.stdin
+    original_start = threading.Thread.start
+    threads = []
+
+    def _start(thread):
+        threads.append(thread)
+        original_start(thread)
+
+    status = 'ok'
+    sys.stdin = stdin
+    threading.Thread.start = _start
+    signal.signal(signal.SIGALRM, _timeout_handler)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with open(os.devnull, 'w') as dn, redirect_stdout(dn), redirect_stderr(dn):
+            with collector:
+                exec(code_obj, namespace)
+                # the interpreter would wait for them at exit; they still read the redirected stdin
+                for thread in threads:
+                    thread.join()
+    except TimeoutException:
+        status = 'timeout'
+    except SystemExit:
+        pass
+    except Exception:
+        status = 'error'
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        threading.Thread.start = original_start
+        sys.stdin = original_stdin
+    if threads and status == 'ok':
+        status = 'thread'
+    return collector, status
+
+
+def line_scores(debugger, metrics):
+    """{metric: {line: score}}; a line covered in several functions keeps its best score"""
+    events = debugger.spectrum().events
+    scores = {}
+    for metric, values in debugger.metric_scores(*metrics).items():
+        per_line = {}
+        for (_, line), value in zip(events, values):
+            value = -np.inf if np.isnan(value) else float(value)
+            if value > per_line.get(line, -np.inf):
+                per_line[line] = value
+        scores[metric] = per_line
+    return scores
+
+
+def gold_rank(per_line, gold):
+    """
+    1-based rank of the best-ranked gold line, counting every line with an
+    equal score as ranked before it (pessimistic ties); -1 if no gold line ran.
+    """
+    covered = [per_line[line] for line in gold if line in per_line]
+    if not covered:
+        return -1
+    best = max(covered)
+    return sum(1 for value in per_line.values() if value >= best)
+
+
+def localize(args):
+    record_index, single_data = args
+    metrics = active_metrics()
+    code = single_data['raw_incorrect']
+    n_lines = len(code.splitlines())
+    gold = gold_lines(single_data.get('statement', []), n_lines)
+    test_case = single_data.get('test_case', {})
+    inputs = test_case.get('input', [])
+    labels = test_case.get('incorrect_result') or []
+
+    row = {
+        'record': record_index,
+        'pid': str(single_data.get('pid')),
+        'n_lines': n_lines,
+        'gold_lines': ','.join(map(str, gold)),
+        'n_pass': 0,
+        'n_fail': 0,
+        'n_timeouts': 0,
+        'n_covered': 0,
+        'status': 'ok',
+    }
+    for metric in localize_metrics:
+        row[f'{metric}_rank'] = -1
+        row[f'{metric}_top'] = ''
+
+    if len(labels) != len(inputs):
+        row['status'] = 'no_labels'
+        return row
+    if not gold:
+        row['status'] = 'no_gold'
+        return row
+    try:
+        code_obj = compile(code, SUBMISSION, 'exec')
+    except (SyntaxError, ValueError):
+        row['status'] = 'syntax_error'
+        return row
+
+    debugger = RankingDebugger()
+    for test_input, label in zip(inputs, labels):
+        collector, status = run_with_coverage(code_obj, test_input, run_timeout)
+        metrics.add('runs')
+        if status == 'timeout':
+            row['n_timeouts'] += 1
+            metrics.add('timeouts')
+        elif status == 'error':
+            metrics.add('run_errors')
+        elif status == 'thread':
+            metrics.add('thread_runs')
+            row['status'] = 'no_coverage'
+        # a run that timed out still contributes the coverage it reached
+        outcome = debugger.FAIL if label == 'fail' else debugger.PASS
+        debugger.add_collector(outcome, collector)
+        row['n_fail' if label == 'fail' else 'n_pass'] += 1
+
+    if not row['n_fail']:
+        row['status'] = 'no_fail'
+        return row
+    if row['status'] == 'no_coverage':
+        # the spectrum misses whatever ran in the threads; ranking it would read as gold not covered
+        return row
+
+    scores = line_scores(debugger, localize_metrics)
+    row['n_covered'] = len(next(iter(scores.values()))) if scores else 0
+    for metric, per_line in scores.items():
+        row[f'{metric}_rank'] = gold_rank(per_line, gold)
+        ranked = sorted(per_line, key=lambda line: (-per_line[line], line))
+        row[f'{metric}_top'] = ','.join(map(str, ranked[:10]))
+    return row
+
+
+def write_columns(path, rows):
+    """One column per row key; Parquet via pyarrow if available, else a NumPy .npz"""
+    columns = {key: [row[key] for row in rows] for key in (rows[0] if rows else {})}
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.table(columns), path)
+    else:
+        np.savez_compressed(path, **{key: np.asarray(values) for key, values in columns.items()})
+
+
+def default_output(level):
+    try:
+        import pyarrow.parquet  # noqa: F401
+        ext = 'parquet'
+    except ImportError:
+        ext = 'npz'
+    return f'./python_sbfl/{level}_sbfl.{ext}'
+
+
+def hit_rates(rows, metrics, top_k):
+    """top-k hit rate of each metric over the records that could be localized"""
+    ranked = [row for row in rows if row['status'] == 'ok']
+    summary = {'records': len(rows), 'localized': len(ranked), 'status': {}}
+    for row in rows:
+        summary['status'][row['status']] = summary['status'].get(row['status'], 0) + 1
+    for metric in metrics:
+        ranks = [row[f'{metric}_rank'] for row in ranked]
+        summary[metric] = {
+            f'top_{k}': (sum(1 for r in ranks if 0 < r <= k) / len(ranks)) if ranks else 0.0
+            for k in top_k
+        }
+        found = [r for r in ranks if r > 0]
+        summary[metric]['mean_rank'] = (sum(found) / len(found)) if found else None
+        summary[metric]['gold_not_covered'] = len(ranks) - len(found)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--level', default='very_hard', type=str)
+    parser.add_argument('--data_path', default=None,
+                        help='default: ./python_data/<level>_filtered.jsonl.gz')
+    parser.add_argument('--out', default=None,
+                        help='.parquet or .npz (default: ./python_sbfl/<level>_sbfl.parquet, .npz without pyarrow)')
+    parser.add_argument('--metrics', default='ochiai,tarantula',
+                        help=f'comma separated, from {",".join(SPECTRUM_METRICS)}')
+    parser.add_argument('--top_k', default='1,3,5,10')
+    parser.add_argument('--timeout', default=10, type=float, help='seconds per run')
+    parser.add_argument('--workers', default=os.cpu_count(), type=int)
+    args = parser.parse_args()
+
+    global localize_metrics, run_timeout
+    localize_metrics = [m for m in args.metrics.split(',') if m]
+    unknown = [m for m in localize_metrics if m not in SPECTRUM_METRICS]
+    if unknown:
+        parser.error(f'unknown metrics: {unknown}')
+    run_timeout = args.timeout
+    top_k = [int(k) for k in args.top_k.split(',') if k]
+
+    data_path = args.data_path or f'./python_data/{args.level}_filtered.jsonl.gz'
+    out_path = args.out or default_output(args.level)
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+
+    stage = f'sbfl_{args.level}'
+    stage_start = time.perf_counter()
+    reset_metrics(stage)
+    get_metrics(stage).add('bytes_read', os.path.getsize(data_path))
+
+    with Pool(args.workers) as pool:
+        tasks = stamped(enumerate(iter_jsonl(data_path)))
+        rows = list(tqdm(pool.imap(timed_task(localize, stage, 'record'), tasks, chunksize=4),
+                         desc='Localizing'))
+        # clean worker exit so their metrics snapshots are flushed
+        pool.close()
+        pool.join()
+
+    write_columns(out_path, rows)
+    summary = hit_rates(rows, localize_metrics, top_k)
+    summary_path = f'{os.path.splitext(out_path)[0]}.summary.json'
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    get_metrics(stage).add('bytes_written', os.path.getsize(out_path))
+
+    print(format_report(build_report(stage, wall=time.perf_counter() - stage_start)))
+    print(f'Saved {len(rows)} rows => {out_path}')
+    print(f'Localized {summary["localized"]}/{summary["records"]}  status: {summary["status"]}')
+    for metric in localize_metrics:
+        rates = '  '.join(f'top-{k} {summary[metric][f"top_{k}"]:.3f}' for k in top_k)
+        print(f'  {metric:<10} {rates}  mean rank {summary[metric]["mean_rank"]}')
+
+
+if __name__ == '__main__':
+    main()
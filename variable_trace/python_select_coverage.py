@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+import argparse
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipeline_utils.jsonl_io import JsonlWriter, iter_jsonl
+
+
+def lines_to_bitset(lines):
+    """[3, 5, 5, 9] => int with bits 3, 5 and 9 set"""
+    mask = 0
+    for line in lines:
+        if line >= 0:
+            mask |= 1 << line
+    return mask
+
+
+def statement_bitset(statement):
+    """build_item's diff lines ("12 x = y") => bitset of their line numbers"""
+    return lines_to_bitset(int(m) for m in re.findall(r'^\d+', '\n'.join(statement), flags=re.M))
+
+
+def record_outcome(single_data):
+    """'pass' / 'fail' of the incorrect program on this record's test, if known"""
+    results = single_data.get('test_case', {}).get('incorrect_result')
+    case_index = single_data.get('case_index')
+    if results is None or case_index is None or case_index >= len(results):
+        return None
+    return results[case_index]
+
+
+def select_tests(candidates, target, k, min_pass, min_fail):
+    """
+    Greedy weighted set cover over one code pair, at most k tests.
+
+    candidates = [(ordinal, coverage bitset, trace size, outcome)]
+    Repeatedly take the test that covers the most still-uncovered target
+    (diff) lines per character of trace, keeping enough of the k slots free
+    for min_fail failing and min_pass passing tests (the quotas count
+    against k). Picks made redundant by later picks are dropped, then the
+    quotas are filled with the smallest traces of each outcome.
+    """
+    reachable = 0
+    for _, mask, _, _ in candidates:
+        reachable |= mask
+    uncovered = target & reachable
+
+    # quotas are capped by the tests there are and by k, failing tests first
+    quota = {}
+    for outcome, wanted in (('fail', min_fail), ('pass', min_pass)):
+        available = sum(1 for c in candidates if c[3] == outcome)
+        quota[outcome] = min(wanted, available, k - sum(quota.values()))
+
+    def open_slots(selected):
+        """Slots still reserved for the quotas"""
+        return sum(max(0, n - sum(1 for c in selected if c[3] == outcome)) for outcome, n in quota.items())
+
+    selected = []
+    left = list(candidates)
+    while uncovered and left:
+        fits = [c for c in left if len(selected) + 1 + open_slots(selected + [c]) <= k]
+        if not fits:
+            break
+        best = max(fits, key=lambda c: (bin(c[1] & uncovered).count('1') / max(c[2], 1), -c[2]))
+        if not best[1] & uncovered:
+            break
+        selected.append(best)
+        left.remove(best)
+        uncovered &= ~best[1]
+
+    # drop picks whose diff lines the other picks cover, largest traces first
+    covered = target & reachable & ~uncovered
+    for cand in sorted(selected, key=lambda c: -c[2]):
+        rest = [c for c in selected if c is not cand]
+        others = 0
+        for c in rest:
+            others |= c[1]
+        if covered & ~others == 0:
+            selected = rest
+            left.append(cand)
+
+    for outcome, n in quota.items():
+        have = sum(1 for c in selected if c[3] == outcome)
+        for cand in sorted((c for c in left if c[3] == outcome), key=lambda c: c[2])[:max(0, n - have)]:
+            selected.append(cand)
+            left.remove(cand)
+            uncovered &= ~cand[1]
+
+    if not selected and candidates:
+        # no diff line is reachable: keep the cheapest trace
+        selected.append(min(candidates, key=lambda c: c[2]))
+    return [c[0] for c in selected], bin(target & reachable).count('1'), bin(uncovered).count('1')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--level", default='very_hard', type=str)
+    parser.add_argument("--k", default=6, type=int, help='max tests kept per code pair')
+    parser.add_argument("--min_pass", default=1, type=int, help='keep at least this many passing tests (counts against k)')
+    parser.add_argument("--min_fail", default=1, type=int, help='keep at least this many failing tests (counts against k)')
+    args = parser.parse_args()
+
+    base_path = os.getcwd()
+    src = os.path.join(base_path, 'python_data', f'{args.level}_filtered_tc_cov.jsonl.gz')
+    dst = os.path.join(base_path, 'python_data', f'{args.level}_filtered_tc_cov_selected.jsonl.gz')
+
+    # 1st pass: only (coverage bitset, trace size, outcome) per record
+    groups = {}
+    targets = {}
+    total_size = 0
+    for ordinal, single_data in enumerate(tqdm(iter_jsonl(src), desc='coverage')):
+        key = (single_data['pid'], single_data['code_index'])
+        size = len(single_data['trace_code'])
+        total_size += size
+        groups.setdefault(key, []).append((
+            ordinal,
+            lines_to_bitset(single_data.get('coverage_data') or []),
+            size,
+            record_outcome(single_data),
+        ))
+        if key not in targets:
+            targets[key] = statement_bitset(single_data['statement'])
+
+    keep = set()
+    target_lines = covered_lines = 0
+    for key, candidates in groups.items():
+        chosen, reachable, missed = select_tests(candidates, targets[key], args.k, args.min_pass, args.min_fail)
+        keep.update(chosen)
+        target_lines += reachable
+        covered_lines += reachable - missed
+
+    # 2nd pass: copy the selected records
+    kept_size = 0
+    with JsonlWriter(dst) as writer:
+        for ordinal, single_data in enumerate(tqdm(iter_jsonl(src), desc='select')):
+            if ordinal in keep:
+                kept_size += len(single_data['trace_code'])
+                writer.write(single_data)
+
+    print(f'code pairs: {len(groups)}')
+    print(f'records: {sum(len(c) for c in groups.values())} -> {writer.count}')
+    print(f'trace chars: {total_size} -> {kept_size}')
+    print(f'reachable diff lines covered: {covered_lines} / {target_lines}')
+    print(f'Saved => {dst}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+"""
+Gold fault locations from dynamic backward slices.
+
+Every incorrect program is instrumented with debuggingbook's Slicer
+(static-location mode), run on its failing inputs (labels from
+`test_case.incorrect_result`), and sliced backward from what it printed
+(plus the line that raised, if it crashed). The slice lines are written
+into the record as `slice_lines`, next to the `statement` diff lines.
+"""
+
+import io
+import os
+import ast
+import sys
+import json
+import time
+import signal
+import inspect
+import hashlib
+import argparse
+import builtins
+import linecache
+import resource
+import warnings
+from multiprocessing import Pool
+from contextlib import redirect_stdout, redirect_stderr
+from tqdm import tqdm
+
+from debuggingbook.Slicer import Slicer, DATA_TRACKER
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipeline_utils.jsonl_io import JsonlWriter, iter_jsonl
+from pipeline_utils.metrics import active_metrics, build_report, format_report, get_metrics, reset_metrics, stamped, timed_task
+
+from python_sbfl import gold_lines
+
+# variable the output statements are assigned to, so they become slicing criteria
+OUTPUT = '_output'
+# deep recursion through instrumented calls can overflow the C stack and kill the worker
+RECURSION_CAP = 10000
+
+# set in main(); module globals so Pool workers inherit them on fork
+run_timeout = 30.0
+max_inputs = 1
+
+# source digest => compiled instrumented code; per worker process
+_instrumented_code = {}
+
+
+class SliceTimeout(BaseException):
+    """Raised in the sliced program when its time is up (BaseException: not caught by `except Exception`)."""
+
+
+class TrackOutputTransformer(ast.NodeTransformer):
+    """`print(...)` / `<stream>.write(...)` statements => `_output = ...`"""
+
+    def visit_Expr(self, node):
+        call = node.value
+        if isinstance(call, ast.Call) and (
+                (isinstance(call.func, ast.Name) and call.func.id == 'print') or
+                (isinstance(call.func, ast.Attribute) and call.func.attr == 'write')):
+            assign = ast.Assign(targets=[ast.Name(id=OUTPUT, ctx=ast.Store())], value=call)
+            return ast.copy_location(assign, node)
+        return node
+
+
+class CachingSlicer(Slicer):
+    """Slicer that instruments each distinct source once per process"""
+
+    def transformers(self):
+        return [TrackOutputTransformer()] + super().transformers()
+
+    def parse(self, item):
+        source_lines, lineno = inspect.getsourcelines(item)
+        self.source_key = hashlib.blake2b(f'{lineno}:{"".join(source_lines)}'.encode(),
+                                          digest_size=16).hexdigest()
+        if self.source_key in _instrumented_code:
+            active_metrics().add('instrument_cache_hits')
+            return ast.Module(body=[], type_ignores=[])
+        return super().parse(item)
+
+    def transform(self, tree):
+        if self.source_key in _instrumented_code:
+            return tree
+        return super().transform(tree)
+
+    def execute(self, tree, item):
+        code = _instrumented_code.get(self.source_key)
+        if code is None:
+            code = compile(tree, inspect.getsourcefile(item), 'exec')
+            _instrumented_code[self.source_key] = code
+        self.globals[DATA_TRACKER] = self.dependency_tracker
+        exec(code, self.globals)
+
+
+def wrap_program(code):
+    """
+    The program as the body of `def trace_func():` (as python_variable_trace
+    wraps it), registered in linecache so the Slicer can read its source.
+    Line k of the program is line k + 1 of the wrapper.
+    """
+    wrapped = 'def trace_func():\n' + ''.join(f'    {line}\n' for line in code.splitlines())
+    filename = f'<slice_{hashlib.blake2b(wrapped.encode(), digest_size=16).hexdigest()}>'
+    linecache.cache[filename] = (len(wrapped), None, wrapped.splitlines(True), filename)
+    return wrapped, filename
+
+
+def _init_worker(memory_mb):
+    # the Slicer warns about functions and sources it cannot find, once per dependency
+    warnings.simplefilter('ignore')
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _timeout_handler(signum, frame):
+    raise SliceTimeout()
+
+
+def run_sliced(definition, filename, test_input, timeout):
+    """
+    Run the instrumented program on one input.
+    Returns (dependencies, stop, status); if the run did not finish, `stop`
+    is (line it stopped in, variables read there as dependency nodes).
+    """
+    if not test_input.endswith('\n'):
+        test_input += '\n'
+    stdin = io.TextIOWrapper(io.BytesIO(test_input.encode()), encoding='utf-8')
+
+    def _open(file, *args, **kwargs):
+        # `open(0)` reads stdin
+        return stdin if file == 0 else builtins.open(file, *args, **kwargs)
+
+    original_setrecursionlimit = sys.setrecursionlimit
+
+    def _setrecursionlimit(limit):
+        original_setrecursionlimit(min(limit, RECURSION_CAP))
+
+    namespace = {'__name__': '__main__', '__builtins__': builtins, 'open': _open}
+    exec(definition, namespace)
+    slicer = CachingSlicer(namespace['trace_func'], globals=namespace, static_locations=True)
+
+    original_stdin, original_limit = sys.stdin, sys.getrecursionlimit()
+    stop = None
+    status = 'ok'
+    sys.stdin = stdin
+    sys.setrecursionlimit = _setrecursionlimit
+    signal.signal(signal.SIGALRM, _timeout_handler)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with open(os.devnull, 'w') as dn, redirect_stdout(dn), redirect_stderr(dn):
+            with slicer:
+                namespace['trace_func']()
+    except SystemExit:
+        pass
+    except (SliceTimeout, Exception) as e:
+        status = 'timeout' if isinstance(e, SliceTimeout) else 'memory' if isinstance(e, MemoryError) else 'error'
+        stop_line = None
+        tb = e.__traceback__
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == filename:
+                stop_line = tb.tb_lineno
+            tb = tb.tb_next
+        tracker = slicer.dependency_tracker
+        read = [(name, tracker.origins[name]) for name in tracker.last_read if name in tracker.origins]
+        stop = (stop_line, read)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        sys.stdin = original_stdin
+        sys.setrecursionlimit = original_setrecursionlimit
+        sys.setrecursionlimit(original_limit)
+    # compact: no validation against the source, which costs more than the slice
+    return slicer.compact_dependencies(), stop, status
+
+
+def slice_lines(dependencies, stop, n_lines):
+    """
+    Program lines in the backward slice from the output; for a run that
+    did not finish, also from the variables read where it stopped.
+    """
+    criteria = [OUTPUT]
+    lines = set()
+    if stop is not None:
+        stop_line, read = stop
+        criteria += read
+        if stop_line is not None:
+            lines.add(stop_line - 1)
+    sliced = dependencies.backward_slice(*criteria)
+    lines.update(lineno - 1 for _, (_, lineno) in sliced.all_vars())
+    if not lines:
+        return None
+    return sorted(line for line in lines if 1 <= line <= n_lines)
+
+
+def slice_record(args):
+    record_index, single_data = args
+    metrics = active_metrics()
+    code = single_data['raw_incorrect']
+    n_lines = len(code.splitlines())
+    test_case = single_data.get('test_case', {})
+    inputs = test_case.get('input', [])
+    labels = test_case.get('incorrect_result') or []
+
+    new_data = dict(single_data)
+    new_data['slice_lines'] = []
+    new_data['slice_status'] = 'ok'
+
+    failing = [test_input for test_input, label in zip(inputs, labels) if label == 'fail'][:max_inputs]
+    if len(labels) != len(inputs):
+        new_data['slice_status'] = 'no_labels'
+        return new_data
+    if not failing:
+        new_data['slice_status'] = 'no_fail'
+        return new_data
+
+    wrapped, filename = wrap_program(code)
+    try:
+        definition = compile(wrapped, filename, 'exec')
+    except (SyntaxError, ValueError):
+        new_data['slice_status'] = 'syntax_error'
+        return new_data
+
+    lines = set()
+    statuses = []
+    for test_input in failing:
+        try:
+            dependencies, stop, status = run_sliced(definition, filename, test_input, run_timeout)
+            sliced = slice_lines(dependencies, stop, n_lines)
+        except MemoryError:
+            sliced, status = None, 'memory'
+        metrics.add('runs')
+        if status != 'ok':
+            metrics.add(f'run_{status}')
+        if sliced is None and status == 'ok':
+            status = 'no_output'
+        statuses.append(status)
+        lines.update(sliced or [])
+
+    # a run that timed out or crashed still contributes its slice; the status says it did not finish
+    new_data['slice_lines'] = sorted(lines)
+    new_data['slice_status'] = next((status for status in statuses if status != 'ok'), 'ok')
+    return new_data
+
+
+def slice_stats(record):
+    """(status, slice size, whether the slice contains a diff line) of one sliced record"""
+    gold = gold_lines(record.get('statement', []), len(record['raw_incorrect'].splitlines()))
+    return record['slice_status'], len(record['slice_lines']), bool(set(gold) & set(record['slice_lines']))
+
+
+def agreement(stats):
+    """How often the slice contains a diff (gold) line, over the records that could be sliced"""
+    summary = {'records': len(stats), 'sliced': 0, 'status': {}, 'contains_gold': 0, 'mean_slice_size': None}
+    sizes = []
+    for status, size, contains_gold in stats:
+        summary['status'][status] = summary['status'].get(status, 0) + 1
+        if size:
+            summary['sliced'] += 1
+            summary['contains_gold'] += contains_gold
+            sizes.append(size)
+    if sizes:
+        summary['mean_slice_size'] = sum(sizes) / len(sizes)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--level', default='very_hard', type=str)
+    parser.add_argument('--data_path', default=None,
+                        help='default: ./python_data/<level>_filtered.jsonl.gz')
+    parser.add_argument('--out', default=None,
+                        help='default: ./python_data/<level>_filtered_sliced.jsonl.gz')
+    parser.add_argument('--max_inputs', default=1, type=int, help='failing inputs to slice per program')
+    parser.add_argument('--timeout', default=30, type=float, help='seconds per run')
+    parser.add_argument('--memory_mb', default=2048, type=int, help='address space cap per worker (0: none)')
+    parser.add_argument('--workers', default=os.cpu_count(), type=int)
+    args = parser.parse_args()
+
+    global run_timeout, max_inputs
+    run_timeout = args.timeout
+    max_inputs = args.max_inputs
+
+    data_path = args.data_path or f'./python_data/{args.level}_filtered.jsonl.gz'
+    out_path = args.out or f'./python_data/{args.level}_filtered_sliced.jsonl.gz'
+
+    stage = f'slice_{args.level}'
+    stage_start = time.perf_counter()
+    reset_metrics(stage)
+    get_metrics(stage).add('bytes_read', os.path.getsize(data_path))
+
+    stats = []
+    # recycle workers: a program that hit the memory cap may leave its worker fragmented
+    with Pool(args.workers, initializer=_init_worker, initargs=(args.memory_mb,), maxtasksperchild=50) as pool, \
+            JsonlWriter(out_path) as writer:
+        tasks = stamped(enumerate(iter_jsonl(data_path)))
+        records = pool.imap(timed_task(slice_record, stage, 'record'), tasks, chunksize=4)
+        for record in tqdm(records, desc='Slicing'):
+            writer.write(record)
+            stats.append(slice_stats(record))
+        # clean worker exit so their metrics snapshots are flushed
+        pool.close()
+        pool.join()
+
+    summary = agreement(stats)
+    summary_path = f'{out_path.split(".jsonl")[0]}.summary.json'
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    get_metrics(stage).add('bytes_written', os.path.getsize(out_path))
+
+    print(format_report(build_report(stage, wall=time.perf_counter() - stage_start)))
+    print(f'Saved {writer.count} records => {out_path}')
+    print(f'Sliced {summary["sliced"]}/{summary["records"]}  status: {summary["status"]}')
+    print(f'Slice contains a diff line: {summary["contains_gold"]}/{summary["sliced"]}  '
+          f'mean slice size: {summary["mean_slice_size"]}')
+
+
+if __name__ == '__main__':
+    main()
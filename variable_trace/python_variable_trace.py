@@ -5,7 +5,7 @@ from tqdm import tqdm
 from datetime import datetime
 from multiprocessing import Pool
 from typing import Callable, Optional, TextIO, Any
-from contextlib import redirect_stdout, redirect_stderr
+from contextlib import nullcontext, redirect_stdout, redirect_stderr
 
 import threading
 import re
@@ -19,8 +19,18 @@ import io
 import gzip
 import ast
 import signal
+import time
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipeline_utils.diagnostics import get_sink, merge_diagnostics, summarize_diagnostics
+from pipeline_utils.jsonl_io import iter_jsonl
+from pipeline_utils.metrics import active_metrics, build_report, format_report, get_metrics, reset_metrics, stamped, timed_task
+from pipeline_utils.sampling_profiler import SamplingProfiler, profile_path, summarize_profiles
+
+# seconds between profiler samples; 0 disables profiling (set by --profile)
+profile_interval = 0.0
+
 
 class MaxTraceOrderExceededException(Exception):
     """Exception raised when the trace order exceeds the maximum allowed."""
@@ -45,7 +55,7 @@ class Tracer:
         if self.trace_order >= self.max_trace_order:
             self.save_json()
             self.compress_json_file()
-            raise Exception(f"Trace order exceeded the maximum limit of {self.max_trace_order}.")
+            raise MaxTraceOrderExceededException(f"Trace order exceeded the maximum limit of {self.max_trace_order}.")
 
         self.user_def_function.append("trace_func")
         # self.user_def_function.append("<lambda>")
@@ -79,6 +89,7 @@ class Tracer:
             f_out.writelines(f_in)
 
         os.remove(self.file_path)
+        active_metrics().add('bytes_written', os.path.getsize(compressed_file_path))
         print(f"Compressed {self.file_path} to {compressed_file_path} and removed the original file.")
 
     def save_json(self):
@@ -189,6 +200,11 @@ def extract_definitions(code):
     return user_def
 
 
+def _is_submission(code):
+    """Code objects compiled by create_function_from_file (exec of the wrapped submission)"""
+    return code.co_filename == '<string>'
+
+
 def trace_variable(inputs, function_curated, file_path, read_line, user_def_function):
     original_input = builtins.input
 
@@ -204,48 +220,41 @@ def trace_variable(inputs, function_curated, file_path, read_line, user_def_func
             mock_input = MockInput(inputs, read_line)
             builtins.input = mock_input.input
 
+        # line_offset=-1: the submission is wrapped in `def trace_func():`
+        profiler = SamplingProfiler(_is_submission, profile_interval, line_offset=-1) if profile_interval else None
+        outcome = 'ok'
+        tracer = None
+
+        start = time.perf_counter()
+        active_metrics().add('traces')
         try:
-            with Tracer(path=file_path, user_def_function=user_def_function, timeout=50):
+            with Tracer(path=file_path, user_def_function=user_def_function, timeout=50) as tracer, \
+                    (profiler or nullcontext()):
                 function_curated()
 
-        except MaxTraceOrderExceededException as e:
-
-            file_name = file_path.split('/')[3]
-            split_list = file_path.split('.json')[0].split('_')
-
-            try:
-                os.makedirs(f'./python_error/{data_type}/{file_name}', exist_ok=True)
-            except FileExistsError:
-                pass
-            with open(f"./python_error/{data_type}/{file_name}/{split_list[-4]}_error_{split_list[-3]}_{split_list[-2]}_{split_list[-1]}.txt",
-                      'a') as total_txt:
-                total_txt.write(f'{file_path} : MaxTraceOrderExceededException\n')
-
         except Exception as e:
-
-            file_name = file_path.split('/')[3]
-            split_list = file_path.split('.json')[0].split('_')
-            try:
-                os.makedirs(f'./python_error/{data_type}/{file_name}', exist_ok=True)
-            except FileExistsError:
-                pass
-            with open(f"./python_error/{data_type}/{file_name}/{split_list[-4]}_error_{split_list[-3]}_{split_list[-2]}_{split_list[-1]}.txt",
-                      'a') as total_txt:
-                total_txt.write(f'{file_path} : {e}\n')
+            if isinstance(e, TimeoutException):
+                outcome = 'timeout'
+            elif isinstance(e, MaxTraceOrderExceededException):
+                outcome = 'max_trace_order'
+            elif isinstance(e, RecursionError):
+                outcome = 'recursion_error'
+            else:
+                outcome = 'error'
+            active_metrics().add('timeouts' if isinstance(e, TimeoutException) else 'trace_errors')
+            # One append-only NDJSON line per failure instead of a makedirs + open per error file
+            get_sink(f'./python_error/{data_type}', 'trace').error(
+                'trace', e, file=file_path, elapsed=time.perf_counter() - start)
 
         finally:
             # Restore stdout, stderr, and input
             sys.stdout, sys.stderr = original_stdout, original_stderr
             sys.stdin = original_input
             builtins.input = original_input
-
-
-def read_jsonl_gz_to_list(jsonl_file):
-    data_list = []
-    with gzip.open(jsonl_file, 'rt', encoding='utf-8') as file:
-        for line in file:
-            data_list.append(json.loads(line))
-    return data_list
+            if profiler is not None:
+                # saved beside the trace (<trace>.json.profile.json)
+                profiler.save(profile_path(file_path), outcome=outcome,
+                              trace_order=tracer.trace_order if tracer else 0)
 
 
 def trace_code_pair(args):
@@ -310,28 +319,52 @@ def make_folders():
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--data_type", default='very_hard', type=str)
+    parser.add_argument("--profile", action='store_true',
+                        help='sample each traced program and save <trace>.profile.json beside its trace')
+    parser.add_argument("--profile_interval", default=5.0, type=float, help='ms of CPU time between samples')
     args = parser.parse_args()
     dt = args.data_type
 
-    global data_type
+    global data_type, profile_interval
     data_type = dt
+    profile_interval = args.profile_interval / 1000 if args.profile else 0.0
 
     data_path = f'./python_data/{data_type}_filtered.jsonl.gz'
-    input_data = read_jsonl_gz_to_list(data_path)
-
-    print(len(input_data))
     make_folders()
 
+    stage = f'variable_trace_{data_type}'
+    stage_start = time.perf_counter()
+    reset_metrics(stage)
+    get_metrics(stage).add('bytes_read', os.path.getsize(data_path))
+
     with Pool(120) as pool:
-        # correct_tasks = list(setup_tracing(input_data, is_correct=True))
-        incorrect_tasks = list(setup_tracing(input_data, is_correct=False))
+        # correct_tasks = setup_tracing(iter_jsonl(data_path), is_correct=True)
+        incorrect_tasks = setup_tracing(iter_jsonl(data_path), is_correct=False)
 
-        # Flatten task list
-        # all_tasks = [task for sublist in (correct_tasks + incorrect_tasks) for task in sublist]
-        all_tasks = [task for sublist in incorrect_tasks for task in sublist]
+        # Flatten task list lazily so records are traced as they are read
+        # all_tasks = (task for sublist in (correct_tasks + incorrect_tasks) for task in sublist)
+        all_tasks = (task for sublist in incorrect_tasks for task in sublist)
 
         # Process tasks
-        list(tqdm(pool.imap_unordered(trace_code_pair, all_tasks), total=len(all_tasks)))
+        for _ in tqdm(pool.imap_unordered(timed_task(trace_code_pair, stage, 'code_pair'), stamped(all_tasks))):
+            pass
+        # clean worker exit so their metrics snapshots are flushed
+        pool.close()
+        pool.join()
+
+    print(format_report(build_report(stage, wall=time.perf_counter() - stage_start)))
+
+    if profile_interval:
+        profiles = summarize_profiles(f'./python_trace/{data_type}')
+        print(f'Profiles: {profiles["profiles"]}  outcomes: {profiles["outcomes"]}  flags: {profiles["flags"]}')
+        for entry in profiles['costliest'][:10]:
+            print(f'  {entry["cpu"]:8.2f}s cpu  {entry["outcome"]:<16} {entry["path"]}  hot: {entry["hot_line"]}')
+
+    merged = merge_diagnostics(f'./python_error/{data_type}', 'trace')
+    if merged is not None:
+        print(f'Trace diagnostics => {merged}')
+        for name, entry in sorted(summarize_diagnostics(merged).items()):
+            print(f'  {name:<32} {entry["count"]:>8,}  {entry["elapsed"]:10.1f}s')
 
 
 if __name__ == '__main__':